@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+genotype_memory.py
+
+Measure how much memory the Genotype objects use.
+
+A typical genotype call is created a number of times and the memory that
+is allocated is measured with tracemalloc. The numeric fields are read
+afterwards to show the memory that is used when all fields are converted.
+
+The slotted Genotype is compared with DictGenotype, a copy of the old
+Genotype that had a __dict__ and converted all fields when it was created.
+
+    python benchmarks/genotype_memory.py [number_of_genotypes]
+"""
+
+from __future__ import print_function
+
+import sys
+import tracemalloc
+
+from vcf_parser import Genotype
+
+GT_FORMAT = 'GT:AD:DP:GQ:PL'
+GT_CALLS = [
+    '0/1:10,12:22:99:250,0,300',
+    '0/0:20,0:20:60:0,60,900',
+    '1/1:0,18:18:54:700,54,0',
+    './.:.:.:.:.',
+]
+
+
+class DictGenotype(object):
+    """
+    The Genotype before it had __slots__, all fields are converted at once.
+
+    Only GT, AD, DP, GQ and PL are handled since the benchmark does not use
+    the other keys.
+    """
+    def __init__(self, **kwargs):
+        super(DictGenotype, self).__init__()
+        GT = kwargs.get('GT', './.')
+        AD = kwargs.get('AD', '.,.')
+        DP = kwargs.get('DP', '0')
+        GQ = kwargs.get('GQ', '0')
+        PL = kwargs.get('PL', None)
+
+        self.heterozygote = False
+        self.allele_depth = False
+        self.homo_alt = False
+        self.homo_ref = False
+        self.has_variant = False
+        self.genotyped = False
+        self.phased = False
+        self.depth_of_coverage = 0
+        self.genotype_quality = 0
+        self.ref_depth = None
+        self.alt_depth = None
+        self.quality_depth = None
+
+        if '|' in GT:
+            self.phased = True
+        if len(GT) < 3:
+            self.allele_1 = GT
+            self.allele_2 = '.'
+        else:
+            self.allele_1 = GT[0]
+            self.allele_2 = GT[-1]
+        self.genotype = self.allele_1 + '/' + self.allele_2
+
+        if self.genotype != './.':
+            self.genotyped = True
+            if self.genotype == '0/0':
+                self.homo_ref = True
+            elif self.allele_1 == self.allele_2:
+                self.homo_alt = True
+                self.has_variant = True
+            else:
+                self.heterozygote = True
+                self.has_variant = True
+
+        allele_depths = AD.split(',')
+        if len(allele_depths) > 1 and allele_depths[0] != '.':
+            if allele_depths[0].isdigit():
+                self.ref_depth = int(allele_depths[0])
+            if allele_depths[1].isdigit():
+                self.alt_depth = int(allele_depths[1])
+        if self.ref_depth:
+            self.quality_depth = self.ref_depth
+        if self.alt_depth:
+            if self.quality_depth:
+                self.quality_depth += self.alt_depth
+            else:
+                self.quality_depth = self.alt_depth
+
+        try:
+            self.depth_of_coverage = int(DP)
+        except ValueError:
+            pass
+        try:
+            self.genotype_quality = float(GQ)
+        except ValueError:
+            pass
+
+        self.phred_likelihoods = []
+        if PL:
+            try:
+                self.phred_likelihoods = [float(score) for score in
+                                          PL.split(',')]
+            except ValueError:
+                pass
+
+
+def measure(number_of_genotypes, genotype_class=Genotype):
+    """
+    Create genotypes and return the number of bytes used per genotype.
+
+    Arguments:
+        number_of_genotypes (int): Number of Genotype objects to create
+        genotype_class (class): Genotype or DictGenotype
+
+    Returns:
+        result (tuple): (bytes per genotype after creation,
+                         bytes per genotype after reading all fields)
+    """
+    gt_format = GT_FORMAT.split(':')
+    gt_calls = [dict(zip(gt_format, call.split(':'))) for call in GT_CALLS]
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    genotypes = [
+        genotype_class(**gt_calls[i % len(gt_calls)])
+        for i in range(number_of_genotypes)
+    ]
+    created = tracemalloc.get_traced_memory()[0] - start
+
+    for genotype in genotypes:
+        genotype.ref_depth
+        genotype.alt_depth
+        genotype.quality_depth
+        genotype.depth_of_coverage
+        genotype.genotype_quality
+        genotype.phred_likelihoods
+    converted = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    return (created / float(number_of_genotypes),
+            converted / float(number_of_genotypes))
+
+
+if __name__ == '__main__':
+    number_of_genotypes = 100000
+    if len(sys.argv) > 1:
+        number_of_genotypes = int(sys.argv[1])
+
+    print("Genotypes: {0}".format(number_of_genotypes))
+    for name, genotype_class in (('before (dict)', DictGenotype),
+                                 ('after (slots)', Genotype)):
+        created, converted = measure(number_of_genotypes, genotype_class)
+        print("{0}: {1:.0f} bytes per genotype after creation, {2:.0f} with "
+              "all fields read".format(name, created, converted))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+header_parsing.py
+
+Measure how many vcf headers can be parsed per second.
+
+The header of a vcf is read many times, both with read_header and by
+opening a VCFParser, and the number of headers per second is printed.
+
+    python benchmarks/header_parsing.py [vcf_file] [number_of_headers]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+from vcf_parser import (HeaderParser, VCFParser, read_header)
+
+EXAMPLE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'examples',
+    'region_test.vcf.gz'
+)
+
+
+def measure(function, number_of_headers):
+    """
+    Call a function many times and return the number of calls per second.
+
+    Arguments:
+        function (callable): The function to measure
+        number_of_headers (int): Number of times to call the function
+
+    Returns:
+        headers_per_second (float)
+    """
+    seconds = min(timeit.repeat(function, number=number_of_headers, repeat=3))
+    return number_of_headers / seconds
+
+
+if __name__ == '__main__':
+    vcf_file = EXAMPLE
+    number_of_headers = 2000
+    if len(sys.argv) > 1:
+        vcf_file = sys.argv[1]
+    if len(sys.argv) > 2:
+        number_of_headers = int(sys.argv[2])
+
+    print("Vcf: {0}".format(vcf_file))
+    print("Headers: {0}".format(number_of_headers))
+    print("HeaderParser(): {0:.0f} objects per second".format(
+        measure(HeaderParser, number_of_headers)))
+    print("read_header: {0:.0f} headers per second".format(
+        measure(lambda: read_header(vcf_file), number_of_headers)))
+    print("VCFParser: {0:.0f} headers per second".format(
+        measure(lambda: VCFParser(infile=vcf_file).vcf.close(),
+                number_of_headers)))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+parallel_parsing.py
+
+Compare parsing a vcf in one process with parsing it with workers.
+
+The vcf is parsed in one process and with a pool of workers, first all 
+variants and then only the variants that matches a filter. The best of 
+three runs is printed. Workers only pays off with more than one CPU, the 
+number of CPUs is printed as well.
+
+    python benchmarks/parallel_parsing.py vcf_file [workers] [filter]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import multiprocessing
+
+from vcf_parser import VCFParser
+
+FILTER = 'QUAL > 1000'
+
+
+def measure(vcf_file, repeat=3, **options):
+    """
+    Parse a vcf and return the best time and the number of variants.
+
+    Arguments:
+        vcf_file (str): Path to a vcf or bgzipped vcf
+        repeat (int): Number of times the file is parsed
+        options: Options for VCFParser
+
+    Returns:
+        seconds (float), number_of_variants (int)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        number_of_variants = 0
+        for variant in VCFParser(infile=vcf_file, **options):
+            number_of_variants += 1
+        seconds = time.time() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best, number_of_variants
+
+
+if __name__ == '__main__':
+    vcf_file = sys.argv[1]
+    workers = 4
+    expression = FILTER
+    if len(sys.argv) > 2:
+        workers = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        expression = sys.argv[3]
+
+    print("Vcf: {0}".format(vcf_file))
+    print("CPUs: {0}".format(multiprocessing.cpu_count()))
+    for title, options in (('All variants', {}), 
+                           ('Filter {0}'.format(expression), 
+                            {'filter': expression})):
+        serial, number_of_variants = measure(vcf_file, **options)
+        parallel, _ = measure(vcf_file, workers=workers, **options)
+        print("{0} ({1} variants): {2:.2f} s in one process, {3:.2f} s with "
+              "{4} workers".format(title, number_of_variants, serial, 
+                                   parallel, workers))
@@ -22,6 +22,9 @@ setup(name='vcf_parser',
         'pytest', 
         'click'
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     packages = [
         'vcf_parser',
         'vcf_parser.utils',
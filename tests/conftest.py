@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+collect_ignore = []
+if sys.version_info < (3, 7):
+    # The tests use async syntax and asyncio.run
+    collect_ignore.append('test_async_parser.py')
+
+EXAMPLES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'examples'
+)
+
+@pytest.fixture(scope='session')
+def examples():
+    """Return the path to the examples directory"""
+    return EXAMPLES
+
+@pytest.fixture(scope='session')
+def region_file(examples):
+    """Return the path to the bgzipped and indexed example with 3000 variants"""
+    return os.path.join(examples, 'region_test.vcf.gz')
+
+@pytest.fixture(scope='session')
+def example_vcf(examples):
+    """Return the path to the small uncompressed example"""
+    return os.path.join(examples, 'test_vcf.vcf')
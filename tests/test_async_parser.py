@@ -0,0 +1,119 @@
+import gzip
+import asyncio
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from vcf_parser import VCFParser, AsyncVCFParser
+
+def read_lines(path):
+    """Return the lines of a vcf as bytes"""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as vcf:
+            return vcf.readlines()
+    with open(path, 'rb') as vcf:
+        return vcf.readlines()
+
+def stream_reader(lines):
+    """Return a asyncio.StreamReader with some lines, must run in a loop"""
+    reader = asyncio.StreamReader()
+    reader.feed_data(b''.join(lines))
+    reader.feed_eof()
+    return reader
+
+def summarize(variants):
+    """Return the parts of the variants that are compared"""
+    return [
+        (variant['variant_id'], dict(variant['info_dict']),
+         dict((individual, genotype.genotype) for individual, genotype in
+              variant['genotypes'].items()))
+        for variant in variants
+    ]
+
+async def collect(parser):
+    """Return all variants of an AsyncVCFParser"""
+    return [variant async for variant in parser]
+
+def test_stream_reader(region_file):
+    """Test to parse a vcf from a StreamReader"""
+    async def main():
+        parser = AsyncVCFParser(
+            stream=stream_reader(read_lines(region_file)), batch_size=100)
+        await parser.open()
+        assert parser.individuals == ['father', 'mother', 'proband']
+        return await collect(parser)
+    
+    variants = asyncio.run(main())
+    assert summarize(variants) == summarize(VCFParser(infile=region_file))
+
+def test_async_iterable(example_vcf):
+    """Test to parse a vcf from an async iterable with strings"""
+    lines = [line.decode('utf-8') for line in read_lines(example_vcf)]
+    
+    async def stream():
+        for line in lines:
+            yield line
+    
+    async def main():
+        return await collect(
+            AsyncVCFParser(stream=stream(), split_variants=True, batch_size=2))
+    
+    variants = asyncio.run(main())
+    assert summarize(variants) == summarize(
+        VCFParser(infile=example_vcf, split_variants=True))
+
+def test_infile(region_file):
+    """Test to parse a file in an executor"""
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parser = AsyncVCFParser(infile=region_file, batch_size=500,
+                                    executor=executor, samples=['proband'])
+            return await collect(parser)
+    
+    variants = asyncio.run(main())
+    assert summarize(variants) == summarize(
+        VCFParser(infile=region_file, samples=['proband']))
+
+def test_batches(region_file):
+    """Test that the variants are parsed in batches"""
+    async def main():
+        parser = AsyncVCFParser(infile=region_file, batch_size=1000)
+        return [len(variants) async for variants in parser.batches()]
+    
+    assert asyncio.run(main()) == [1000, 1000, 1000]
+
+def test_backpressure(region_file):
+    """Test that the stream is not read before the variants are consumed"""
+    async def main():
+        lines = read_lines(region_file)
+        header = [line for line in lines if line.startswith(b'#')]
+        variant_lines = [line for line in lines if not line.startswith(b'#')]
+        read = []
+        
+        async def stream():
+            for line in header + variant_lines:
+                read.append(line)
+                yield line
+        
+        parser = AsyncVCFParser(stream=stream(), batch_size=10)
+        iterator = parser.__aiter__()
+        await iterator.__anext__()
+        # One batch and the first line of the next one
+        assert len(read) <= len(header) + 11
+        await iterator.aclose()
+    
+    asyncio.run(main())
+
+def test_no_metadata():
+    """Test that a stream without meta data lines raises IOError"""
+    async def main():
+        parser = AsyncVCFParser(stream=stream_reader([b'1\t1\t.\tA\tC\n']))
+        await parser.open()
+    
+    with pytest.raises(IOError):
+        asyncio.run(main())
+
+def test_no_input():
+    """Test that a stream or a file is needed"""
+    with pytest.raises(IOError):
+        AsyncVCFParser()
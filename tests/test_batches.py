@@ -0,0 +1,105 @@
+import pytest
+
+from vcf_parser import VCFParser
+
+from .test_readers import VCF_LINES
+from .test_vcf_parser import get_vcf_file
+
+np = pytest.importorskip('numpy')
+
+from vcf_parser.batches import (parse_alleles, parse_depths)
+
+def test_parse_alleles():
+    """
+    Test to parse different GT calls
+    """
+    assert parse_alleles('0/1') == (0, 1)
+    assert parse_alleles('1|0') == (1, 0)
+    assert parse_alleles('./.') == (-1, -1)
+    assert parse_alleles('1') == (1, -2)
+    assert parse_alleles('.') == (-1, -2)
+    assert parse_alleles('1/.') == (1, -1)
+    assert parse_alleles('10/12') == (10, 12)
+    assert parse_alleles('0/300') == (0, 300)
+    with pytest.raises(SyntaxError):
+        parse_alleles('0/40000')
+
+def test_parse_depths():
+    """
+    Test to parse AD calls
+    """
+    assert parse_depths('10,12') == (10, 12)
+    assert parse_depths('.') == (-1, -1)
+    # The depths of all alternatives are summed
+    assert parse_depths('0,5,7') == (0, 12)
+    assert parse_depths('3,.,7') == (3, 7)
+
+def test_iter_batches():
+    """
+    Test that the batches holds the same information as the variants
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    batches = list(VCFParser(infile=vcf_file).iter_batches(size=3, 
+                                                           fields=['GQ']))
+    
+    assert [len(batch) for batch in batches] == [3, 1]
+    batch = batches[0]
+    assert batch.samples == ['father', 'mother', 'proband']
+    assert list(batch.chrom) == ['1', '1', '1']
+    assert list(batch.pos) == [11900, 879585, 879586]
+    assert list(batch.alt) == ['T', 'T', 'T,C']
+    assert batch.alleles.dtype == np.int16
+    assert batch.alleles.shape == (3, 3, 2)
+    assert batch.alleles[2].tolist() == [[0, 0], [0, 1], [0, 2]]
+    assert batch.gq.tolist()[0] == [60, 60, 60]
+    assert batch.dp is None
+    assert batch.ad is None
+    
+    assert batch.heterozygote_count().tolist() == [2, 2, 2]
+    assert batch.call_rate().tolist() == [1.0, 1.0, 1.0]
+    assert batch.alt_allele_frequency()[0] == pytest.approx(4 / 6.0)
+
+def test_haploid_batch():
+    """
+    Test that haploid calls are counted as called
+    """
+    from vcf_parser import HeaderParser
+    from vcf_parser.batches import build_batch
+    header_parser = HeaderParser()
+    header_parser.parse_header_line(
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t'\
+        'first\tsecond\tthird')
+    variant_lines = [
+        ['Y', '100', '.', 'A', 'T', '50', 'PASS', '.', 'GT', '1', '0', '.'],
+        ['Y', '200', '.', 'A', 'T', '50', 'PASS', '.', 'GT', '1', '0', '1/.'],
+    ]
+    batch = build_batch(variant_lines, header_parser)
+    
+    assert batch.alleles[0].tolist() == [[1, -2], [0, -2], [-1, -2]]
+    assert batch.called().tolist() == [[True, True, False], 
+                                       [True, True, False]]
+    assert batch.call_rate().tolist() == pytest.approx([2 / 3.0, 2 / 3.0])
+    assert batch.heterozygote_count().tolist() == [0, 0]
+    assert batch.alt_allele_frequency().tolist() == pytest.approx(
+        [0.5, 2 / 3.0])
+
+def test_batches_with_samples(region_file):
+    """
+    Test that the batches only holds the choosen samples
+    """
+    parser = VCFParser(infile=region_file, samples=['proband'])
+    batches = list(parser.iter_batches(size=1000, fields=['DP', 'AD']))
+    
+    assert sum(len(batch) for batch in batches) == 3000
+    assert batches[0].alleles.shape == (1000, 1, 2)
+    assert batches[0].dp.shape == (1000, 1)
+    # There is no AD in the file
+    assert (batches[0].ad == -1).all()
+
+def test_wrong_batch_field():
+    """
+    Test that only the supported fields can be choosen
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    with pytest.raises(ValueError):
+        list(VCFParser(infile=vcf_file).iter_batches(fields=['PL']))
@@ -0,0 +1,151 @@
+import os
+import struct
+import zlib
+import pytest
+
+from vcf_parser import VCFParser
+from vcf_parser.bgzf import (BgzfReader, BgzfWriter, is_bgzf, BGZF_EOF,
+    BGZF_BLOCK_SIZE, compress_block, make_virtual_offset)
+
+def make_block(data):
+    """Compress data into one BGZF block"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    header = struct.pack(
+        '<4BIBBHBBHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2,
+        len(compressed) + 25
+    )
+    trailer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+    return header + compressed + trailer
+
+def get_bgzf_file(directory, data, block_size=50):
+    """
+    Write data to a BGZF file with small blocks.
+
+    Arguments:
+        directory (str): The directory to write the file to
+        data (bytes): The data to compress
+        block_size (int): The size of the uncompressed blocks
+
+    Returns:
+        filename (str): The path to the compressed file
+    """
+    filename = os.path.join(str(directory), 'test.vcf.gz')
+    with open(filename, 'wb') as bgzf_file:
+        for start in range(0, len(data), block_size):
+            bgzf_file.write(make_block(data[start:start+block_size]))
+        bgzf_file.write(BGZF_EOF)
+
+    return filename
+
+def get_lines(number_of_lines=200):
+    """Return a list with test lines as bytes"""
+    return [
+        "line number {0}\n".format(number).encode('utf-8')
+        for number in range(number_of_lines)
+    ]
+
+def test_is_bgzf(examples):
+    """
+    Test to recognize a BGZF file
+    """
+    assert is_bgzf(os.path.join(examples, 'test_vcf.vcf.gz'))
+    assert not is_bgzf(__file__)
+
+def test_read_lines(tmpdir):
+    """
+    Test that lines that span several blocks are read in the right order
+    """
+    lines = get_lines()
+    bgzf_file = get_bgzf_file(tmpdir, b''.join(lines))
+
+    with BgzfReader(bgzf_file, threads=1) as reader:
+        assert list(reader) == lines
+
+def test_read_lines_threads(tmpdir):
+    """
+    Test that the lines come in order when blocks are decompressed in parallel
+    """
+    lines = get_lines(1000)
+    bgzf_file = get_bgzf_file(tmpdir, b''.join(lines), block_size=33)
+
+    with BgzfReader(bgzf_file, threads=4) as reader:
+        assert list(reader) == lines
+
+def test_read_decoded(tmpdir):
+    """
+    Test to get the lines as text
+    """
+    lines = get_lines(10)
+    bgzf_file = get_bgzf_file(tmpdir, b''.join(lines))
+
+    with BgzfReader(bgzf_file, encoding='utf-8') as reader:
+        assert reader.readline() == u"line number 0\n"
+
+def test_tell_and_seek(tmpdir):
+    """
+    Test that we can go back to a line with the virtual offset
+    """
+    lines = get_lines()
+    bgzf_file = get_bgzf_file(tmpdir, b''.join(lines))
+
+    with BgzfReader(bgzf_file, threads=2) as reader:
+        offsets = []
+        for line in lines:
+            offsets.append(reader.tell())
+            assert reader.readline() == line
+
+        reader.seek(offsets[100])
+        assert reader.readline() == lines[100]
+        reader.seek(offsets[3])
+        assert reader.readline() == lines[3]
+        assert reader.readline() == lines[4]
+        reader.seek(make_virtual_offset(0, 0))
+        assert reader.readline() == lines[0]
+
+def test_read(tmpdir):
+    """
+    Test to read all data at once
+    """
+    lines = get_lines()
+    bgzf_file = get_bgzf_file(tmpdir, b''.join(lines))
+
+    with BgzfReader(bgzf_file) as reader:
+        assert reader.read(5) == b'line '
+        assert reader.read() == b''.join(lines)[5:]
+
+def test_parse_bgzf_vcf(examples):
+    """
+    Test to parse a vcf compressed with bgzip
+    """
+    variants = list(VCFParser(infile=os.path.join(examples, 'test_vcf.vcf.gz'),
+                              threads=2))
+
+    assert len(variants) == 9
+    assert variants[0]['POS'] == '11900'
+    assert variants[-1]['POS'] == '973348'
+
+def test_compress_block():
+    """Test that compress_block gives the same block as bgzip"""
+    assert compress_block(b'') == BGZF_EOF
+    assert compress_block(b'line\n') == make_block(b'line\n')
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_write(threads, tmpdir):
+    """Test to write a BGZF file and read it back"""
+    data = b''.join(get_lines(20000))
+    bgzf_file = tmpdir.join('test.gz')
+    with BgzfWriter(str(bgzf_file), threads=threads) as writer:
+        for start in range(0, len(data), 1000):
+            writer.write(data[start:start+1000])
+
+    assert is_bgzf(str(bgzf_file))
+    assert writer.offset == len(data)
+    with BgzfReader(str(bgzf_file), threads=1) as reader:
+        assert reader.read() == data
+        # Every block except the last is full
+        position = 3 * BGZF_BLOCK_SIZE + 10
+        reader.seek(writer.virtual_offset(position))
+        assert reader.read(100) == data[position:position+100]
+    with open(str(bgzf_file), 'rb') as handle:
+        assert handle.read()[-len(BGZF_EOF):] == BGZF_EOF
@@ -41,4 +41,17 @@ def test_build_simple_info_dict():
     info_dict['DP_HIST'] = ['12','43','22']
     info_dict['RS'] = []
     
-    assert build_info_dict(info_string) == info_dict
\ No newline at end of file
+    assert build_info_dict(info_string) == info_dict
+
+
+def test_build_projected_info_dict():
+    """
+    Test to build a info dict with only some of the info keys
+    """
+    
+    info_string = "MQ=1;CNT=5,8;DP_HIST=12,43,22;RS"
+    info_dict = OrderedDict()
+    info_dict['CNT']= ['5','8']
+    info_dict['RS'] = []
+    
+    assert build_info_dict(info_string, set(['CNT', 'RS', 'AF'])) == info_dict
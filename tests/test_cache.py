@@ -0,0 +1,128 @@
+import os
+import shutil
+import pytest
+
+from vcf_parser import VCFParser
+from vcf_parser.cache import VariantCache, CACHE_SUFFIX
+
+@pytest.fixture
+def vcf_copy(tmpdir, example_vcf):
+    """Copy the example vcf to a temporary directory"""
+    vcf_file = str(tmpdir.join('test_vcf.vcf'))
+    shutil.copy(example_vcf, vcf_file)
+    return vcf_file
+
+def get_entries(cache_dir):
+    """Return the entries in a cache directory"""
+    return sorted(name for name in os.listdir(cache_dir) 
+                  if name.endswith(CACHE_SUFFIX))
+
+def summarize(variants):
+    """Return the parts of the variants that are compared"""
+    return [
+        (variant['variant_id'], dict(variant['info_dict']), 
+         dict((individual, genotype.genotype) for individual, genotype in
+              variant['genotypes'].items()))
+        for variant in variants
+    ]
+
+def test_cached_variants(vcf_copy, tmpdir):
+    """
+    Test that the cached variants are the same as the parsed variants
+    """
+    vcf_file = vcf_copy
+    cache_dir = str(tmpdir.mkdir('cache'))
+    parsed = list(VCFParser(infile=vcf_file, split_variants=True))
+    stored = list(VCFParser(infile=vcf_file, split_variants=True,
+                            cache_dir=cache_dir))
+    
+    assert len(get_entries(cache_dir)) == 1
+    
+    loaded = list(VCFParser(infile=vcf_file, split_variants=True,
+                            cache_dir=cache_dir))
+    
+    assert summarize(parsed) == summarize(stored) == summarize(loaded)
+    
+    # Other options gives a new entry
+    list(VCFParser(infile=vcf_file, cache_dir=cache_dir))
+    assert len(get_entries(cache_dir)) == 2
+
+def test_cached_genotypes_are_frozen(vcf_copy, tmpdir):
+    """
+    Test that the shared genotypes from the cache can not be changed
+    """
+    vcf_file = vcf_copy
+    cache_dir = str(tmpdir.mkdir('cache'))
+    list(VCFParser(infile=vcf_file, cache_dir=cache_dir))
+    loaded = list(VCFParser(infile=vcf_file, cache_dir=cache_dir))
+    
+    genotypes = [genotype for variant in loaded 
+                 for genotype in variant['genotypes'].values()]
+    genotype = genotypes[0]
+    shared = [other for other in genotypes[1:] if other is genotype]
+    assert shared
+    ref_depth = genotype.ref_depth
+    with pytest.raises(AttributeError):
+        genotype.ref_depth = 999
+    assert all(other.ref_depth == ref_depth for other in shared)
+    
+    # A fresh parse still gives genotypes that can be changed
+    parsed = next(iter(VCFParser(infile=vcf_file)))
+    parsed_genotype = list(parsed['genotypes'].values())[0]
+    parsed_genotype.ref_depth = 999
+    assert parsed_genotype.ref_depth == 999
+
+def test_changed_file(vcf_copy, tmpdir):
+    """
+    Test that a changed vcf is parsed again and the old entry is removed
+    """
+    vcf_file = vcf_copy
+    cache_dir = str(tmpdir.mkdir('cache'))
+    list(VCFParser(infile=vcf_file, cache_dir=cache_dir))
+    entries = get_entries(cache_dir)
+    
+    with open(vcf_file, 'r') as vcf:
+        lines = vcf.readlines()
+    # Change the first alternative of the first variant
+    first_variant = [line.startswith('#') for line in lines].index(False)
+    columns = lines[first_variant].split('\t')
+    columns[4] = 'T' if columns[4] != 'T' else 'G'
+    lines[first_variant] = '\t'.join(columns)
+    with open(vcf_file, 'w') as vcf:
+        vcf.writelines(lines)
+    
+    variants = list(VCFParser(infile=vcf_file, cache_dir=cache_dir))
+    
+    assert variants[0]['ALT'] == columns[4]
+    assert len(get_entries(cache_dir)) == 1
+    assert get_entries(cache_dir) != entries
+
+def test_interrupted_parsing(example_vcf, tmpdir):
+    """
+    Test that no entry is stored if all variants was not read
+    """
+    cache_dir = str(tmpdir.mkdir('cache'))
+    cache = VariantCache(cache_dir)
+    parsed = list(VCFParser(infile=example_vcf))
+    variants = cache.store('a_b_c', iter(parsed), batch_size=1)
+    next(variants)
+    variants.close()
+    
+    assert get_entries(cache_dir) == []
+    assert os.listdir(cache_dir) == []
+
+def test_evict(tmpdir):
+    """
+    Test that the least recently used entries are removed
+    """
+    cache_dir = str(tmpdir.mkdir('cache'))
+    cache = VariantCache(cache_dir, max_size=25)
+    for name, mtime in (('a', 100), ('b', 300), ('c', 200)):
+        path = os.path.join(cache_dir, name + CACHE_SUFFIX)
+        with open(path, 'w') as entry:
+            entry.write('x' * 10)
+        os.utime(path, (mtime, mtime))
+    cache.evict()
+    
+    assert get_entries(cache_dir) == ['b' + CACHE_SUFFIX, 'c' + CACHE_SUFFIX]
+    assert cache.size() == 20
@@ -0,0 +1,287 @@
+import os
+import pytest
+
+from click.testing import CliRunner
+
+from vcf_parser import VCFParser
+from vcf_parser.cache import genotype_key
+from vcf_parser.cli.command_line import cli
+
+np = pytest.importorskip('numpy')
+
+from vcf_parser.columnar import (convert_to_columnar, ColumnarReader,
+                                 MISSING_INTEGER, StringColumn,
+                                 CompressedStringColumn,
+                                 CompressedStringColumnWriter)
+
+
+def get_converted(directory, vcf_file, chunk_size=1000):
+    """Convert a vcf to a directory and return the path to the columns"""
+    outdir = os.path.join(str(directory), 'region_test.columnar')
+    return convert_to_columnar(vcf_file, outdir, chunk_size=chunk_size)
+
+@pytest.fixture(scope='module')
+def converted(tmpdir_factory, region_file):
+    """Convert the example file once for the tests that only read it"""
+    return get_converted(tmpdir_factory.mktemp('columnar'), region_file)
+
+def test_string_column():
+    """
+    Test to read strings from a string column
+    """
+    data = np.frombuffer(b'AAGTCC', dtype=np.uint8)
+    offsets = np.array([0, 2, 3, 3, 6])
+    strings = StringColumn(data, offsets)
+    
+    assert len(strings) == 4
+    assert strings[0] == 'AA'
+    assert strings[2] == ''
+    assert strings.slice(1, 10) == ['G', '', 'TCC']
+    assert strings.lengths().tolist() == [2, 1, 0, 3]
+
+def test_compressed_string_column(tmpdir):
+    """
+    Test to write and read a compressed string column
+    """
+    path = str(tmpdir.join('calls'))
+    strings = ['GT\t0/{0}'.format(number) for number in range(10)] + ['']
+    writer = CompressedStringColumnWriter(path, block_size=4)
+    writer.append(strings[:3])
+    writer.append(strings[3:])
+    writer.close()
+    column = CompressedStringColumn(np.load(path + '.blocks.npy'),
+                                    np.load(path + '.block_offsets.npy'),
+                                    4, len(strings))
+    
+    assert len(column) == 11
+    assert column[5] == 'GT\t0/5'
+    assert column[10] == ''
+    assert column.slice(2, 20) == strings[2:]
+    assert column.take([1, 2, 9]) == [strings[1], strings[2], strings[9]]
+    assert column.take([4, 5, 6]) == strings[4:7]
+    assert column.lengths().tolist() == [len(string) for string in strings]
+
+def summarize(variant):
+    """Return the fields of a variant with the genotypes as strings"""
+    summary = dict(variant)
+    summary['genotypes'] = dict(
+        (individual, genotype_key(genotype)) 
+        for individual, genotype in variant['genotypes'].items())
+    return summary
+
+def test_convert_and_iterate(converted, region_file):
+    """
+    Test that the reader gives the same variants as the parser
+    """
+    reader = ColumnarReader(converted)
+    parser = VCFParser(infile=region_file)
+    
+    assert reader.individuals == parser.individuals
+    assert reader.header_lines == parser.header_lines
+    assert len(reader) == 3000
+    # The variant lines are not stored
+    assert not [name for name in os.listdir(converted) 
+                if name.startswith('records')]
+    
+    variants = list(parser)
+    columnar_variants = list(reader)
+    assert len(columnar_variants) == 3000
+    for variant, columnar_variant in zip(variants, columnar_variants):
+        assert summarize(columnar_variant) == summarize(variant)
+
+@pytest.mark.parametrize("options", [
+    {'samples': ['proband', 'father']},
+    {'split_variants': True, 'format_fields': ['GT', 'DP']},
+    {'lazy': True, 'samples': ['mother']},
+])
+def test_iterate_with_options(options, converted, region_file):
+    """
+    Test that the parser options are used when building the variants
+    """
+    reader = ColumnarReader(converted, **options)
+    parser = VCFParser(infile=region_file, **options)
+    
+    assert ([summarize(variant) for variant in reader] == 
+            [summarize(variant) for variant in parser])
+
+def test_columns(converted, region_file):
+    """
+    Test the content of the columns
+    """
+    reader = ColumnarReader(converted)
+    variants = list(VCFParser(infile=region_file))
+    
+    assert reader.meta['contigs'] == ['1', '2', 'X']
+    assert reader.column('pos').tolist() == [int(variant['POS']) 
+                                            for variant in variants]
+    assert reader.strings('alt').slice(0, 5) == [variant['ALT'] 
+                                                 for variant in variants[:5]]
+    assert reader.column('gt').shape == (3000, 3, 2)
+    # The first proband genotype is ./.
+    assert reader.column('gt')[0, 2].tolist() == [-1, -1]
+    assert reader.column('gt')[0, 0].tolist() == [1, 1]
+    depths = reader.info('DP')
+    assert depths[0] == int(variants[0]['info_dict']['DP'][0])
+    assert reader.info('AF').dtype == np.float32
+    with pytest.raises(KeyError):
+        reader.info('CSQ')
+
+def test_columnar_fetch(converted, region_file):
+    """
+    Test that region queries gives the same result as the indexed file
+    """
+    reader = ColumnarReader(converted)
+    parser = VCFParser(infile=region_file)
+    
+    for region in [('1', 10000, 200000), ('X', None, None), ('3', 1, 10)]:
+        assert ([variant['variant_id'] for variant in reader.fetch(*region)] ==
+                [variant['variant_id'] for variant in parser.fetch(*region)])
+
+@pytest.mark.parametrize("sorted_rows", [True, False])
+def test_region_rows(sorted_rows, converted, region_file):
+    """
+    Test that the rows in a region are the rows that overlap the region
+    """
+    reader = ColumnarReader(converted)
+    if not sorted_rows:
+        reader.meta['contig_rows'] = None
+    variants = list(VCFParser(infile=region_file))
+    
+    for chrom, start, end in [('1', 10000, 200000), ('2', None, 500000),
+                              ('X', 1500000, None), ('X', None, None), 
+                              ('2', 35791, 35791), ('1', 10, 5)]:
+        expected = [
+            row for row, variant in enumerate(variants)
+            if variant['CHROM'] == chrom and 
+            (end is None or int(variant['POS']) <= end) and 
+            (start is None or 
+             int(variant['POS']) + len(variant['REF']) - 1 >= start)
+        ]
+        assert reader.region_rows(chrom, start, end).tolist() == expected
+
+def test_columnar_batches(converted, region_file):
+    """
+    Test that the batches from the columns are the same as from the parser
+    """
+    reader = ColumnarReader(converted, samples=['proband', 'father'])
+    parser = VCFParser(infile=region_file, samples=['proband', 'father'])
+    
+    for batch, parsed_batch in zip(reader.iter_batches(size=700, fields=['DP']),
+                                   parser.iter_batches(size=700, fields=['DP'])):
+        assert batch.samples == ['proband', 'father']
+        assert batch.chrom.tolist() == parsed_batch.chrom.tolist()
+        assert batch.pos.tolist() == parsed_batch.pos.tolist()
+        assert batch.alt.tolist() == parsed_batch.alt.tolist()
+        assert (batch.alleles == parsed_batch.alleles).all()
+        assert (batch.dp == parsed_batch.dp).all()
+        assert batch.gq is None
+
+def test_not_converted(tmpdir):
+    """
+    Test to open a directory that is not a converted vcf
+    """
+    with pytest.raises(IOError):
+        ColumnarReader(str(tmpdir))
+
+def test_convert_command(tmpdir, region_file):
+    """
+    Test the convert command
+    """
+    outdir = str(tmpdir.join('converted'))
+    runner = CliRunner()
+    result = runner.invoke(cli, ['convert', region_file, '--to', 
+                                 'columnar', '-o', outdir])
+    
+    assert result.exit_code == 0
+    assert len(ColumnarReader(outdir)) == 3000
+    
+    result = runner.invoke(cli, ['convert', region_file, '-o', outdir])
+    assert result.exit_code == 1
+    
+    result = runner.invoke(cli, ['convert', region_file, '-o', outdir, 
+                                 '--force'])
+    assert result.exit_code == 0
+
+def brute_force(variants, predicate):
+    """Filter parsed variants with a python function"""
+    return [variant['variant_id'] for variant in variants if predicate(variant)]
+
+def test_zone_maps(converted):
+    """
+    Test that the zone maps describe the chunks
+    """
+    reader = ColumnarReader(converted)
+    chunks = reader.chunks
+    
+    assert [(chunk['start'], chunk['end']) for chunk in chunks] == [
+        (0, 1000), (1000, 2000), (2000, 3000)]
+    positions = reader.column('pos')[:1000]
+    assert chunks[0]['pos'] == [positions.min(), positions.max()]
+    assert chunks[0]['contigs'] == [0]
+    assert set(chunks[0]['info']) == set(['AF', 'DP'])
+
+def test_query_skips_chunks(tmpdir, region_file):
+    """
+    Test that chunks that can not match are skipped
+    """
+    reader = ColumnarReader(get_converted(tmpdir, region_file, chunk_size=100))
+    
+    assert len(reader.matching_chunks([('CHROM', '==', 'X')])) < 15
+    assert len(reader.matching_chunks([('CHROM', '==', '3')])) == 0
+    last_position = int(reader.column('pos')[-1])
+    assert len(reader.matching_chunks([('CHROM', '==', 'X'),
+                                       ('POS', '>=', last_position)])) == 1
+
+def test_query(tmpdir, region_file):
+    """
+    Test that queries gives the same variants as filtering the parsed variants
+    """
+    reader = ColumnarReader(get_converted(tmpdir, region_file, chunk_size=250))
+    variants = list(VCFParser(infile=region_file))
+    
+    def af(variant):
+        return [float(value) for value in variant['info_dict']['AF']]
+    
+    queries = [
+        ([('CHROM', '==', '2'), ('POS', '<', 500000)],
+         lambda variant: variant['CHROM'] == '2' and int(variant['POS']) < 500000),
+        ([('FILTER', '==', 'PASS'), ('QUAL', '>=', 50)],
+         lambda variant: (variant['FILTER'] == 'PASS' and 
+                          float(variant['QUAL']) >= 50)),
+        ([('DP', '<=', 20)],
+         lambda variant: int(variant['info_dict']['DP'][0]) <= 20),
+        ([('AF', '>', 0.9)],
+         lambda variant: any(value > 0.9 for value in af(variant))),
+        ([('NON_REF', '==', False)],
+         lambda variant: not any(genotype.has_variant for genotype in 
+                                 variant['genotypes'].values())),
+        ([('CHROM', '!=', '1'), ('FILTER', '!=', 'LowQual')],
+         lambda variant: (variant['CHROM'] != '1' and 
+                          variant['FILTER'] != 'LowQual')),
+    ]
+    for predicates, predicate in queries:
+        assert ([variant['variant_id'] for variant in reader.query(predicates)] ==
+                brute_force(variants, predicate))
+
+def test_query_without_zone_maps(converted):
+    """
+    Test that a directory without zone maps can be queried
+    """
+    reader = ColumnarReader(converted)
+    del reader.meta['chunks']
+    rows = reader.query_rows([('POS', '<', 100000)])
+    
+    assert rows.tolist() == np.flatnonzero(reader.column('pos') < 100000).tolist()
+
+def test_wrong_predicate(converted):
+    """
+    Test that malformed predicates raises ValueError
+    """
+    reader = ColumnarReader(converted)
+    
+    with pytest.raises(ValueError):
+        reader.query_rows([('POS', '~', 10)])
+    with pytest.raises(ValueError):
+        reader.query_rows([('CHROM', '<', '2')])
+    with pytest.raises(ValueError):
+        reader.query_rows([('POS', 10)])
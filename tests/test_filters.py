@@ -0,0 +1,159 @@
+import pytest
+
+from click.testing import CliRunner
+
+from vcf_parser import HeaderParser, VCFParser
+from vcf_parser.cli.command_line import cli
+from vcf_parser.filters import VariantFilter
+
+def qual(variant):
+    """Return the QUAL of a variant as a float, None if it is missing"""
+    if variant['QUAL'] == '.':
+        return None
+    return float(variant['QUAL'])
+
+def allele_frequencies(variant):
+    """Return the AF values of a variant as floats"""
+    return [float(value) for value in variant['info_dict'].get('AF', [])
+            if value != '.']
+
+# Expressions and the same check done on the parsed variants
+EXPRESSIONS = [
+    ('QUAL > 30 and FILTER == "PASS" and INFO.AF < 0.1 and '\
+     'any(GT.has_variant)',
+     lambda variant: (qual(variant) is not None and qual(variant) > 30 and
+                      variant['FILTER'] == 'PASS' and
+                      any(value < 0.1 for value in allele_frequencies(variant))
+                      and any(genotype.has_variant for genotype in
+                              variant['genotypes'].values()))),
+    ('CHROM == "X" or INFO["DP"] >= 100',
+     lambda variant: (variant['CHROM'] == 'X' or
+                      int(variant['info_dict']['DP'][0]) >= 100)),
+    ('"LowQual" not in FILTER and 10000 < POS <= 2000000',
+     lambda variant: ('LowQual' not in variant['FILTER'].split(';') and
+                      10000 < int(variant['POS']) <= 2000000)),
+    ('sum(GT.has_variant) >= 2 and not all(GT.genotyped)',
+     lambda variant: (sum(genotype.has_variant for genotype in
+                          variant['genotypes'].values()) >= 2 and
+                      not all(genotype.genotyped for genotype in
+                              variant['genotypes'].values()))),
+    ('INFO.AF[0] > 0.5 or REF == "A"',
+     lambda variant: (allele_frequencies(variant)[0] > 0.5 or
+                      variant['REF'] == 'A')),
+]
+
+@pytest.mark.parametrize("expression, check", EXPRESSIONS)
+def test_filter(expression, check, region_file):
+    """Test that the filter gives the same variants as a check on the dicts"""
+    expected = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file) if check(variant)]
+    filtered = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file, filter=expression)]
+
+    assert expected
+    assert filtered == expected
+
+def test_prefilter(region_file):
+    """Test the text that has to be in the lines"""
+    parser = VCFParser(infile=region_file)
+    variant_filter = VariantFilter(
+        'FILTER == "PASS" and (CHROM == "X" or INFO.AF > 0.5)',
+        parser.metadata)
+    assert variant_filter.prefilter_source == (
+        "'\\tPASS\\t' in line and "\
+        "(line.startswith('X\\t') or 'AF=' in line)")
+    assert not variant_filter.prefilter("1\t10\t.\tA\tC\t.\tLowQual\tAF=1")
+
+    # Missing values do not match, except for 'not in'
+    assert VariantFilter('INFO.AF != 0.5', parser.metadata).prefilter_source
+    assert VariantFilter('"AF" not in INFO', parser.metadata).prefilter is None
+    assert VariantFilter('not INFO.AF < 0.5', parser.metadata).prefilter is None
+
+def test_info_types():
+    """Test that the INFO values gets the type from the header"""
+    header_parser = HeaderParser()
+    for info_line in [
+            '##INFO=<ID=MQ,Number=1,Type=Float,Description="MQ">',
+            '##INFO=<ID=DP,Number=1,Type=Integer,Description="DP">',
+            '##INFO=<ID=DB,Number=0,Type=Flag,Description="DB">',
+            '##INFO=<ID=H2,Number=0,Type=Flag,Description="H2">',
+            '##INFO=<ID=CNT,Number=A,Type=Integer,Description="CNT">']:
+        header_parser.parse_meta_data(info_line)
+    header_parser.parse_header_line(
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO')
+    line = "1\t10\t.\tA\tC,T\t.\tPASS\tMQ=1;DP=.;DB;CNT=5,8;Unknown=2"
+    assert VariantFilter('INFO.MQ == 1', header_parser)(line)
+    assert not VariantFilter('INFO.DP >= 0', header_parser)(line)
+    assert not VariantFilter('INFO.DP < 0', header_parser)(line)
+    assert VariantFilter('INFO.DB', header_parser)(line)
+    assert VariantFilter('not INFO.H2', header_parser)(line)
+    assert VariantFilter('INFO.CNT == 8', header_parser)(line)
+    assert VariantFilter('max(INFO.CNT) == 8', header_parser)(line)
+    assert VariantFilter('INFO.Unknown > 1.5', header_parser)(line)
+    assert VariantFilter('QUAL < 10', header_parser)(line) is False
+
+@pytest.mark.parametrize("expression", [
+    'QUAL >',
+    'INFO.AF.x > 1',
+    'open("file")',
+    'DEPTH > 10',
+    'GT.allele_1 == "1"',
+    'QUAL is None',
+    '[value for value in GT.has_variant]',
+    'INFO.AF < -"x"',
+    'POS in (1, -None)',
+])
+def test_malformed_filter(expression, example_vcf):
+    """Test that expressions that can not be used raises SyntaxError"""
+    parser = VCFParser(infile=example_vcf)
+    with pytest.raises(SyntaxError):
+        VariantFilter(expression, parser.metadata)
+
+def test_filter_samples(region_file):
+    """Test that only the choosen individuals are used for GT"""
+    expression = 'any(GT.has_variant)'
+    expected = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file, samples=['mother'])
+                if variant['genotypes']['mother'].has_variant]
+    filtered = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file, samples=['mother'],
+                          filter=expression)]
+    assert filtered == expected
+
+def test_filter_split_and_fetch(region_file, example_vcf):
+    """Test that the filter works with split variants and fetch"""
+    expression = 'INFO.AF > 0.5'
+    parser = VCFParser(infile=region_file, filter=expression)
+    fetched = [variant['variant_id'] for variant in parser.fetch('2')]
+    assert fetched == [variant['variant_id'] for variant in
+                       VCFParser(infile=region_file, filter=expression)
+                       if variant['CHROM'] == '2']
+
+    split_parser = VCFParser(infile=example_vcf, split_variants=True, lazy=True,
+                             filter='"PASS" in FILTER')
+    assert len(list(split_parser)) == len(
+        [variant for variant in
+         VCFParser(infile=example_vcf, split_variants=True)
+         if variant['FILTER'] == 'PASS'])
+
+def test_filter_workers(region_file):
+    """Test that the filter is used by the workers"""
+    expression = 'QUAL > 50 and INFO.DP < 120'
+    expected = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file, filter=expression)]
+    parser = VCFParser(infile=region_file, filter=expression, workers=2)
+    assert [variant['variant_id'] for variant in parser] == expected
+
+def test_filter_command(region_file):
+    """Test the --filter option"""
+    runner = CliRunner()
+    result = runner.invoke(cli, [region_file, '--filter',
+                                 'CHROM == "2" and INFO.AF > 0.5'])
+    assert result.exit_code == 0
+    lines = [line for line in result.output.split('\n')
+             if line and not line.startswith('#')]
+    assert lines
+    assert all(line.startswith('2\t') for line in lines)
+
+    result = runner.invoke(cli, [region_file, '--filter', 'QUAL >'])
+    assert result.exit_code == 1
@@ -189,3 +189,142 @@ def test_sv_sr_pr_no_sr():
     assert my_genotype.ref_depth == 0
     assert my_genotype.alt_depth == 4
     assert my_genotype.quality_depth == 4
+
+def test_lazy_fields():
+    """
+    Test that the numeric fields are converted when they are read
+    """
+    my_genotype = Genotype(**{'GT':'0/1', 'AD':'10,12', 'DP':'22', 'GQ':'99'})
+    assert not hasattr(my_genotype, '__dict__')
+    assert my_genotype.ref_depth == 10
+    assert my_genotype.alt_depth == 12
+    assert my_genotype.quality_depth == 22
+    assert my_genotype.depth_of_coverage == 22
+    assert my_genotype.genotype_quality == 99.0
+    assert my_genotype.phred_likelihoods == []
+
+def test_set_fields():
+    """
+    Test that values that are set are kept
+    """
+    my_genotype = Genotype(**{'GT':'0/1', 'AD':'10,12', 'PL':'60,0,80'})
+    my_genotype.ref_depth = 5
+    my_genotype.genotype_quality = 30
+    my_genotype.phred_likelihoods.append(90)
+    assert my_genotype.ref_depth == 5
+    assert my_genotype.alt_depth == 12
+    assert my_genotype.genotype_quality == 30
+    assert my_genotype.phred_likelihoods == [60, 0, 80, 90]
+
+def test_pickle_genotype():
+    """
+    Test that a genotype can be pickled, they are sent between processes
+    """
+    import pickle
+    my_genotype = Genotype(**{'GT':'1|1', 'AD':'0,7', 'DP':'7'})
+    assert my_genotype.depth_of_coverage == 7
+    
+    copied_genotype = pickle.loads(pickle.dumps(my_genotype))
+    assert copied_genotype.genotype == '1/1'
+    assert copied_genotype.phased
+    assert copied_genotype.depth_of_coverage == 7
+    assert copied_genotype.alt_depth == 7
+
+def test_genotype_cache():
+    """
+    Test that the cache keeps the most recently used genotypes
+    """
+    from vcf_parser import GenotypeCache
+    genotype_cache = GenotypeCache(maxsize=2)
+    first = Genotype(**{'GT':'0/0'})
+    second = Genotype(**{'GT':'0/1'})
+    
+    assert genotype_cache.get('first') is None
+    genotype_cache.add('first', first)
+    genotype_cache.add('second', second)
+    assert genotype_cache.get('first') is first
+    # 'second' is now the least recently used
+    genotype_cache.add('third', Genotype(**{'GT':'1/1'}))
+    
+    assert len(genotype_cache) == 2
+    assert genotype_cache.get('second') is None
+    assert genotype_cache.get('first') is first
+    assert genotype_cache.hits == 2
+    assert genotype_cache.misses == 2
+    assert genotype_cache.hit_rate == 0.5
+    
+    genotype_cache.clear()
+    assert len(genotype_cache) == 0
+    assert genotype_cache.hit_rate == 0.0
+
+def test_cached_genotypes_are_frozen():
+    """
+    Test that the genotypes from the cache can not be modified
+    """
+    import copy
+    import pickle
+    import pytest
+    from vcf_parser import FrozenGenotype, GenotypeCache
+    from vcf_parser.utils import build_genotype
+    genotype_cache = GenotypeCache()
+    gt_format = 'GT:AD:DP'
+    genotype = build_genotype(gt_format, '0/1:10,12:22', 
+                              genotype_cache=genotype_cache)
+    
+    assert build_genotype(gt_format, '0/1:10,12:22', 
+                          genotype_cache=genotype_cache) is genotype
+    assert isinstance(genotype, FrozenGenotype)
+    # The numeric fields are still converted when they are read
+    assert genotype.ref_depth == 10
+    assert genotype.depth_of_coverage == 22
+    for attribute, value in [('phased', True), ('ref_depth', 5), 
+                             ('_ref_depth', 5), ('genotype', '1/1')]:
+        with pytest.raises(AttributeError):
+            setattr(genotype, attribute, value)
+    with pytest.raises(AttributeError):
+        del genotype.heterozygote
+    assert not genotype.phased
+    assert genotype.ref_depth == 10
+    
+    for copied in [copy.copy(genotype), 
+                   pickle.loads(pickle.dumps(genotype, 2))]:
+        assert copied.genotype == '0/1'
+        assert copied.alt_depth == 12
+        with pytest.raises(AttributeError):
+            copied.phased = True
+    
+    # Genotypes that are not from a cache can be changed
+    genotype = build_genotype(gt_format, '0/1:10,12:22')
+    genotype.ref_depth = 5
+    assert genotype.ref_depth == 5
+
+def test_genotype_decoder():
+    """
+    Test that the decoder gives the same genotypes as the keyword arguments
+    """
+    from vcf_parser import GenotypeDecoder
+    gt_format = 'GT:AD:DP:GQ:PL'
+    decoder = GenotypeDecoder(gt_format)
+    
+    for gt_info in ['0/1:10,12:22:99:250,0,300', '1|1:0,7', './.']:
+        genotype = decoder.decode(gt_info)
+        expected = Genotype(**dict(zip(gt_format.split(':'), gt_info.split(':'))))
+        assert genotype.genotype == expected.genotype
+        assert genotype.phased == expected.phased
+        assert genotype.ref_depth == expected.ref_depth
+        assert genotype.alt_depth == expected.alt_depth
+        assert genotype.depth_of_coverage == expected.depth_of_coverage
+        assert genotype.genotype_quality == expected.genotype_quality
+        assert genotype.phred_likelihoods == expected.phred_likelihoods
+
+def test_genotype_decoder_format_fields():
+    """
+    Test that the decoder only uses the choosen FORMAT keys
+    """
+    from vcf_parser import get_genotype_decoder
+    decoder = get_genotype_decoder('GT:GQ', set(['GT']))
+    
+    assert get_genotype_decoder('GT:GQ', frozenset(['GT'])) is decoder
+    genotype = decoder.decode('0/1:60')
+    assert genotype.heterozygote
+    assert genotype.genotype_quality == 0
@@ -88,4 +88,64 @@ def test_vep_columns():
     
 
 
-    
\ No newline at end of file
+    
+def test_header_line_with_samples():
+    """
+    Test that the choosen samples are resolved to column indexes
+    """
+    header_parser = HeaderParser()
+    header_parser.samples = ['proband', 'father']
+    
+    header_parser.parse_header_line('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER'\
+        '\tINFO\tFORMAT\tfather\tmother\tproband')
+    
+    assert header_parser.individuals == ['proband', 'father']
+    assert header_parser.header[9:] == ['proband', 'father']
+    assert header_parser.columns == [0, 1, 2, 3, 4, 5, 6, 7, 8, 11, 9]
+    assert header_parser.number_of_columns == 12
+
+def test_header_line_with_missing_sample():
+    """
+    Test that a sample that is not in the vcf raises an error
+    """
+    header_parser = HeaderParser()
+    header_parser.samples = ['sister']
+    
+    with pytest.raises(SyntaxError):
+        header_parser.parse_header_line('#CHROM\tPOS\tID\tREF\tALT\tQUAL\t'\
+            'FILTER\tINFO\tFORMAT\tfather\tmother\tproband')
+
+def test_read_header(examples):
+    """
+    Test to read only the header of a vcf
+    """
+    import os
+    from vcf_parser import VCFParser, read_header
+    for name in ('test_vcf.vcf', 'test_vcf.vcf.gz', 'region_test.vcf.gz'):
+        path = os.path.join(examples, name)
+        header_parser = read_header(path)
+        parser = VCFParser(infile=path)
+        
+        assert header_parser.fileformat == parser.metadata.fileformat
+        assert header_parser.individuals == parser.individuals
+        assert header_parser.print_header() == parser.metadata.print_header()
+    
+    header_parser = read_header(path, samples=['proband'])
+    assert header_parser.individuals == ['proband']
+
+def test_read_header_without_metadata(tmpdir):
+    """
+    Test to read the header of a file that is not a vcf
+    """
+    from vcf_parser import read_header
+    vcf_file = tmpdir.join('no_metadata.vcf')
+    vcf_file.write('1\t100\t.\tA\tT\t.\t.\t.\n')
+    
+    with pytest.raises(IOError):
+        read_header(str(vcf_file))
+
+def test_shared_patterns():
+    """
+    Test that the patterns are compiled once for all header parsers
+    """
+    assert HeaderParser().info_pattern is HeaderParser().info_pattern
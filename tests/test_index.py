@@ -0,0 +1,156 @@
+import os
+import gzip
+import shutil
+import pytest
+
+from click.testing import CliRunner
+
+from vcf_parser import VCFParser
+from vcf_parser.cli.command_line import cli
+from vcf_parser.index import (build_index, find_index, get_index_path,
+                              VariantIndex)
+from vcf_parser.tabix import TabixIndex
+
+def get_copy(directory, vcf_file, uncompressed=False):
+    """
+    Copy a bgzipped vcf to a directory.
+
+    Arguments:
+        directory (str): The directory to copy the vcf to
+        vcf_file (str): Path to the bgzipped vcf
+        uncompressed (bool): If the copy should be uncompressed
+
+    Returns:
+        filename (str): Path to the copy, without any index
+    """
+    if uncompressed:
+        filename = os.path.join(str(directory), 'region_test.vcf')
+        with gzip.open(vcf_file, 'rb') as compressed:
+            with open(filename, 'wb') as uncompressed_file:
+                shutil.copyfileobj(compressed, uncompressed_file)
+    else:
+        filename = os.path.join(str(directory), 'region_test.vcf.gz')
+        shutil.copy(vcf_file, filename)
+
+    return filename
+
+def overlapping(variants, chrom, start, end):
+    """Return the ids of the variants that overlap a region"""
+    return [
+        variant['variant_id'] for variant in variants
+        if variant['CHROM'] == chrom and int(variant['POS']) <= end and
+        int(variant['POS']) + len(variant['REF']) - 1 >= start
+    ]
+
+REGIONS = [
+    ('1', 100000, 200000),
+    ('2', 1, 20000),
+    ('X', 1500000, 3000000),
+    ('X', 2999000, 2999100),
+    ('2', 35791, 35791),
+    ('2', 100000000, 100000010),
+]
+
+@pytest.mark.parametrize("uncompressed", [True, False])
+def test_fetch_with_index(uncompressed, tmpdir, region_file):
+    """
+    Test that region queries with the index give the same result as a scan
+    """
+    vcf_file = get_copy(tmpdir, region_file, uncompressed)
+    index_file = build_index(vcf_file)
+
+    assert index_file == get_index_path(vcf_file)
+    index = find_index(vcf_file)
+    assert isinstance(index, VariantIndex)
+    assert index.compression == ('plain' if uncompressed else 'bgzf')
+
+    all_variants = list(VCFParser(infile=vcf_file))
+    parser = VCFParser(infile=vcf_file)
+    for chrom, start, end in REGIONS:
+        fetched = [variant['variant_id'] for variant in
+                   parser.fetch(chrom, start, end)]
+        assert fetched == overlapping(all_variants, chrom, start, end)
+
+    assert len(list(parser.fetch('2'))) == 1000
+
+def test_index_prefered_over_tabix(tmpdir, region_file):
+    """
+    Test that the tabix index is used if there is no vcf_parser index
+    """
+    vcf_file = get_copy(tmpdir, region_file)
+    shutil.copy(region_file + '.tbi', vcf_file + '.tbi')
+    assert isinstance(find_index(vcf_file), TabixIndex)
+
+    build_index(vcf_file)
+    assert isinstance(find_index(vcf_file), VariantIndex)
+
+def test_outdated_index(tmpdir, region_file):
+    """
+    Test that an index for an other version of the file is not used
+    """
+    vcf_file = get_copy(tmpdir, region_file, uncompressed=True)
+    build_index(vcf_file)
+    with open(vcf_file, 'a') as f:
+        f.write('X\t160000000\t.\tA\tC\t50\tPASS\tAF=0.1\tGT:DP\t0/1:10'\
+                '\t0/0:10\t0/0:10\n')
+
+    assert find_index(vcf_file) is None
+
+def test_rewritten_index(tmpdir, region_file):
+    """
+    Test that an index is not used for a file rewritten with the same size
+    """
+    vcf_file = get_copy(tmpdir, region_file, uncompressed=True)
+    build_index(vcf_file)
+    with open(vcf_file) as f:
+        content = f.read()
+    with open(vcf_file, 'w') as f:
+        f.write(content.replace('\t0/1:', '\t1/0:'))
+    stat = os.stat(vcf_file)
+    os.utime(vcf_file, (stat.st_atime, stat.st_mtime + 10))
+
+    assert os.path.getsize(vcf_file) == len(content)
+    assert find_index(vcf_file) is None
+
+def test_index_unsorted(tmpdir):
+    """
+    Test that unsorted files can not be indexed
+    """
+    vcf_file = str(tmpdir.join('unsorted.vcf'))
+    with open(vcf_file, 'w') as f:
+        f.write('##fileformat=VCFv4.1\n')
+        f.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+        f.write('1\t200\t.\tA\tT\t100\tPASS\t.\n')
+        f.write('1\t100\t.\tA\tT\t100\tPASS\t.\n')
+
+    with pytest.raises(SyntaxError):
+        build_index(vcf_file)
+
+def test_index_command(tmpdir, region_file):
+    """
+    Test to build the index from the command line
+    """
+    vcf_file = get_copy(tmpdir, region_file, uncompressed=True)
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ['index', vcf_file])
+    assert result.exit_code == 0
+    assert os.path.exists(get_index_path(vcf_file))
+
+    # The index already exists
+    result = runner.invoke(cli, ['index', vcf_file])
+    assert result.exit_code == 1
+
+    result = runner.invoke(cli, ['index', '--force', vcf_file])
+    assert result.exit_code == 0
+
+def test_parse_command(examples):
+    """
+    Test that the vcf is parsed if no subcommand is given
+    """
+    runner = CliRunner()
+    result = runner.invoke(cli, [os.path.join(examples, 'test_vcf.vcf.gz')])
+
+    assert result.exit_code == 0
+    assert result.output.startswith('##fileformat=VCFv4.1')
+    assert len(result.output.rstrip().split('\n')) == 13
@@ -0,0 +1,165 @@
+import os
+import gzip
+import pytest
+
+from vcf_parser import VCFParser, CohortJoiner
+from vcf_parser.index import build_index, get_index_path
+from vcf_parser.join import join_records
+
+INDIVIDUALS = ['father', 'mother', 'proband']
+
+def write_single_sample_files(directory, vcf_file, indexed=False):
+    """
+    Write one vcf per individual in a bgzipped vcf.
+    
+    Only the records where the individual has a call are written.
+    """
+    with gzip.open(vcf_file, 'rt') as vcf:
+        lines = [line.rstrip('\n') for line in vcf]
+    paths = []
+    for number, individual in enumerate(INDIVIDUALS):
+        path = os.path.join(str(directory), individual + '.vcf')
+        with open(path, 'w') as vcf:
+            for line in lines:
+                columns = line.split('\t')
+                if line.startswith('##'):
+                    vcf.write(line + '\n')
+                elif not columns[9 + number].startswith('./.'):
+                    vcf.write('\t'.join(columns[:9] + [columns[9 + number]]) 
+                              + '\n')
+        if indexed:
+            build_index(path, outfile=get_index_path(path))
+        paths.append(path)
+    return paths
+
+def get_expected(vcf_file):
+    """Return the variant ids and genotypes of the records with a call"""
+    expected = []
+    for variant in VCFParser(infile=vcf_file):
+        genotypes = [variant['genotypes'][individual].genotype 
+                     for individual in INDIVIDUALS]
+        if any(genotype != './.' for genotype in genotypes):
+            expected.append((variant['variant_id'], genotypes))
+    return expected
+
+def summarize(variants):
+    """Return the variant ids and genotypes of joined variants"""
+    return [
+        (variant['variant_id'], [variant['genotypes'][individual].genotype
+                                 for individual in INDIVIDUALS])
+        for variant in variants
+    ]
+
+def test_join_records():
+    """
+    Test to join records with different FORMAT
+    """
+    records = [
+        ['1', '10', '.', 'A', 'T', '50', 'PASS', 'DP=10', 'GT:DP', '0/1:10'],
+        None,
+        ['1', '10', 'rs1', 'A', 'T', '30', 'PASS', 'DP=5', 'GT:GQ', '1/1:40'],
+    ]
+    assert join_records(records, [1, 2, 1]) == [
+        '1', '10', 'rs1', 'A', 'T', '50', 'PASS', 'DP=10', 'GT:DP:GQ', 
+        '0/1:10:.', './.:.:.', './.:.:.', '1/1:.:40'
+    ]
+
+def test_join_single_sample_files(tmpdir, region_file):
+    """
+    Test that joined single sample files gives the original genotypes
+    """
+    joiner = CohortJoiner(write_single_sample_files(tmpdir, region_file))
+    
+    assert joiner.individuals == INDIVIDUALS
+    assert summarize(joiner) == get_expected(region_file)
+
+def test_join_regions(tmpdir, region_file):
+    """
+    Test to join the variants in regions of indexed files
+    """
+    regions = [('1', 1, 1000000), ('1', 500000, 2000000), ('X', None, None)]
+    paths = write_single_sample_files(tmpdir, region_file, indexed=True)
+    joiner = CohortJoiner(paths, regions=regions)
+    expected = [
+        (variant_id, genotypes) for variant_id, genotypes in
+        get_expected(region_file)
+        if variant_id.startswith('X_') or (
+            variant_id.startswith('1_') and 
+            int(variant_id.split('_')[1]) <= 2000000)
+    ]
+    
+    assert summarize(joiner) == expected
+
+def test_join_unsorted_regions(tmpdir, region_file):
+    """
+    Test that unsorted and overlapping regions are all joined
+    """
+    regions = [('1', 1000000, 1500000), ('1', 100000, 500000), 
+               ('1', 400000, 600000)]
+    paths = write_single_sample_files(tmpdir, region_file, indexed=True)
+    joiner = CohortJoiner(paths, regions=regions)
+    expected = [
+        (variant_id, genotypes) for variant_id, genotypes in
+        get_expected(region_file)
+        if variant_id.startswith('1_') and (
+            100000 <= int(variant_id.split('_')[1]) <= 600000 or
+            1000000 <= int(variant_id.split('_')[1]) <= 1500000)
+    ]
+    
+    assert expected
+    assert summarize(joiner) == expected
+
+def test_join_with_workers(tmpdir, region_file):
+    """
+    Test to join indexed files with a pool of processes
+    """
+    paths = write_single_sample_files(tmpdir, region_file, indexed=True)
+    joiner = CohortJoiner(paths, workers=2)
+    
+    assert summarize(joiner) == get_expected(region_file)
+
+def test_join_in_groups(tmpdir, region_file):
+    """
+    Test that more files than max_open_files are joined in groups
+    """
+    paths = write_single_sample_files(tmpdir.mkdir('plain'), region_file)
+    joiner = CohortJoiner(paths, max_open_files=2)
+    
+    assert joiner.individuals == INDIVIDUALS
+    assert summarize(joiner) == get_expected(region_file)
+    
+    paths = write_single_sample_files(tmpdir.mkdir('indexed'), region_file,
+                                      indexed=True)
+    joiner = CohortJoiner(paths, regions=[('X', None, None)], workers=2, 
+                          max_open_files=2)
+    expected = [(variant_id, genotypes) for variant_id, genotypes in 
+                get_expected(region_file) if variant_id.startswith('X_')]
+    
+    assert expected
+    assert summarize(joiner) == expected
+
+def test_join_open_files(tmpdir, region_file):
+    """
+    Test that the files are only open while they are read
+    """
+    if not os.path.isdir('/proc/self/fd'):
+        pytest.skip("The open files can not be listed")
+    paths = write_single_sample_files(tmpdir, region_file)
+    open_files = len(os.listdir('/proc/self/fd'))
+    joiner = CohortJoiner(paths)
+    
+    assert len(os.listdir('/proc/self/fd')) == open_files
+    assert summarize(joiner) == get_expected(region_file)
+    assert len(os.listdir('/proc/self/fd')) == open_files
+
+def test_joined_batches(tmpdir, region_file):
+    """
+    Test to get the joined genotypes as a matrix
+    """
+    pytest.importorskip('numpy')
+    joiner = CohortJoiner(write_single_sample_files(tmpdir, region_file))
+    batches = list(joiner.iter_batches(size=1000))
+    
+    assert (sum(len(batch) for batch in batches) == 
+            len(get_expected(region_file)))
+    assert batches[0].alleles.shape[1:] == (3, 2)
@@ -0,0 +1,124 @@
+import os
+import gzip
+import pytest
+
+from click.testing import CliRunner
+
+from vcf_parser import VCFParser, merge_sorted
+from vcf_parser.cli.command_line import cli
+
+def read_example(vcf_file):
+    """Return the header lines and the variant lines of a bgzipped vcf"""
+    with gzip.open(vcf_file, 'rt') as vcf:
+        lines = [line.rstrip('\n') for line in vcf]
+    header_lines = [line for line in lines if line.startswith('#')]
+    variant_lines = [line for line in lines if not line.startswith('#')]
+    return header_lines, variant_lines
+
+def write_shards(directory, shards, header_lines):
+    """Write vcf files with the header lines and return the paths"""
+    paths = []
+    for number, lines in enumerate(shards):
+        path = os.path.join(str(directory), 'shard_{0}.vcf'.format(number))
+        with open(path, 'w') as vcf:
+            for line in header_lines + lines:
+                vcf.write(line + '\n')
+        paths.append(path)
+    return paths
+
+def test_merge_sorted(tmpdir, region_file):
+    """
+    Test to merge shards that are split on contigs and positions
+    """
+    header_lines, variant_lines = read_example(region_file)
+    # Contig X in the first file, the rest is spread on two files
+    shards = [
+        [line for line in variant_lines if line.startswith('X\t')],
+        [line for number, line in enumerate(variant_lines) 
+         if not line.startswith('X\t') and number % 2 == 0],
+        [line for number, line in enumerate(variant_lines) 
+         if not line.startswith('X\t') and number % 2 == 1],
+    ]
+    merged = list(merge_sorted(write_shards(tmpdir, shards, header_lines)))
+    
+    assert ([variant['variant_id'] for variant in merged] == 
+            [variant['variant_id'] for variant in 
+             VCFParser(infile=region_file)])
+
+def test_merge_unsorted(tmpdir, region_file):
+    """
+    Test that a file that is not sorted raises SyntaxError
+    """
+    header_lines, variant_lines = read_example(region_file)
+    shards = [variant_lines[:10][::-1], variant_lines[10:20]]
+    paths = write_shards(tmpdir, shards, header_lines)
+    
+    with pytest.raises(SyntaxError):
+        list(merge_sorted(paths))
+
+def test_merge_different_individuals(tmpdir, region_file):
+    """
+    Test that files with different individuals can not be merged
+    """
+    header_lines, variant_lines = read_example(region_file)
+    paths = write_shards(tmpdir.mkdir('first'), [variant_lines[:10]],
+                         header_lines)
+    other_header = header_lines[:-1] + [header_lines[-1].replace('proband', 
+                                                                 'sister')]
+    paths += write_shards(tmpdir.mkdir('second'), [variant_lines[10:20]],
+                          other_header)
+    
+    with pytest.raises(IOError):
+        list(merge_sorted(paths))
+
+def test_merge_headers(tmpdir, region_file):
+    """
+    Test that new header lines from the other files are added
+    """
+    header_lines, variant_lines = read_example(region_file)
+    paths = write_shards(tmpdir.mkdir('first'), [variant_lines[:10]],
+                         header_lines)
+    info_line = '##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP">'
+    paths += write_shards(tmpdir.mkdir('second'), [variant_lines[10:20]],
+                          [header_lines[0], info_line] + header_lines[1:])
+    outfile = str(tmpdir.join('merged.vcf'))
+    runner = CliRunner()
+    result = runner.invoke(cli, ['merge'] + paths + ['-o', outfile])
+    
+    assert result.exit_code == 0
+    parser = VCFParser(infile=outfile)
+    assert 'DB' in parser.metadata.extra_info
+    assert len(list(parser)) == 20
+
+def test_merge_command_bgzf(tmpdir, region_file):
+    """
+    Test that the merge command compresses and indexes a .gz outfile
+    """
+    from vcf_parser.bgzf import is_bgzf
+    header_lines, variant_lines = read_example(region_file)
+    paths = write_shards(tmpdir, [variant_lines[1::2], variant_lines[::2]],
+                         header_lines)
+    outfile = str(tmpdir.join('merged.vcf.gz'))
+    runner = CliRunner()
+    result = runner.invoke(cli, ['merge'] + paths + ['-o', outfile])
+    
+    assert result.exit_code == 0
+    assert is_bgzf(outfile)
+    assert os.path.exists(outfile + '.tbi')
+    parser = VCFParser(infile=outfile)
+    assert [variant['variant_id'] for variant in parser] == [
+        variant['variant_id'] for variant in VCFParser(infile=region_file)]
+    assert [variant['POS'] for variant in parser.fetch('2')] == [
+        variant['POS'] for variant in VCFParser(infile=region_file)
+        if variant['CHROM'] == '2']
+
+def test_merge_command_with_unsorted_file(tmpdir, region_file):
+    """
+    Test that the merge command exits with 1 for unsorted files
+    """
+    header_lines, variant_lines = read_example(region_file)
+    paths = write_shards(tmpdir, [variant_lines[:10][::-1]], header_lines)
+    runner = CliRunner()
+    result = runner.invoke(cli, ['merge'] + paths)
+    
+    assert result.exit_code == 1
@@ -0,0 +1,106 @@
+import os
+import gzip
+import shutil
+import pytest
+
+from vcf_parser import (VCFParser, LazyVariant)
+from vcf_parser.parallel import (split_file, parallel_lines, parse_parallel)
+
+from .test_bgzf import get_bgzf_file
+
+def get_uncompressed_file(directory, vcf_file):
+    """Return the path to an uncompressed copy of a bgzipped vcf"""
+    filename = os.path.join(str(directory), 'region_test.vcf')
+    with gzip.open(vcf_file, 'rb') as compressed:
+        with open(filename, 'wb') as uncompressed:
+            shutil.copyfileobj(compressed, uncompressed)
+
+    return filename
+
+def get_small_block_file(directory, vcf_file):
+    """Return the path to a copy of a bgzipped vcf with tiny BGZF blocks"""
+    with gzip.open(vcf_file, 'rb') as compressed:
+        return get_bgzf_file(directory, compressed.read(), block_size=1000)
+
+@pytest.mark.parametrize("get_file", [
+    get_uncompressed_file,
+    get_small_block_file,
+    lambda directory, vcf_file: vcf_file
+])
+def test_split_file(get_file, tmpdir, region_file):
+    """
+    Test that the ranges starts on new lines and covers all variants
+    """
+    vcf_file = get_file(tmpdir, region_file)
+    ranges = split_file(vcf_file, 7)
+
+    assert len(ranges) > 1 or vcf_file == region_file
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        assert end == next_start
+
+@pytest.mark.parametrize("get_file", [
+    get_uncompressed_file,
+    get_small_block_file,
+])
+def test_parse_parallel(get_file, tmpdir, region_file):
+    """
+    Test that the variants are the same, and in the same order, as when
+    parsing in one process
+    """
+    vcf_file = get_file(tmpdir, region_file)
+    parser = VCFParser(infile=vcf_file)
+    variants = [variant['variant_id'] for variant in parser]
+
+    parallel_variants = [
+        variant['variant_id'] for variant in parse_parallel(
+            filename=vcf_file,
+            header_parser=parser.metadata,
+            workers=3,
+            chunk_size=10000
+        )
+    ]
+
+    assert parallel_variants == variants
+
+def test_parser_with_workers(region_file):
+    """
+    Test to use workers from the parser
+    """
+    variants = list(VCFParser(infile=region_file))
+    parallel_variants = list(VCFParser(infile=region_file, workers=2))
+
+    assert len(parallel_variants) == 3000
+    assert ([variant['variant_id'] for variant in parallel_variants] ==
+            [variant['variant_id'] for variant in variants])
+    assert (parallel_variants[10]['genotypes']['mother'].genotype ==
+            variants[10]['genotypes']['mother'].genotype)
+
+def test_parallel_lines(tmpdir, region_file):
+    """
+    Test that the workers only sends back the lines that matches the filter,
+    also when only one range is handed to the pool at a time
+    """
+    vcf_file = get_uncompressed_file(tmpdir, region_file)
+    parser = VCFParser(infile=vcf_file, filter='FILTER == "PASS"')
+    positions = [variant['POS'] for variant in parser]
+    
+    lines = list(parallel_lines(vcf_file, parser.metadata, workers=2, 
+                                chunk_size=10000, filter='FILTER == "PASS"',
+                                max_pending=1))
+    
+    assert 0 < len(lines) < 3000
+    assert [line.split('\t')[1] for line in lines] == positions
+
+def test_lazy_with_workers(region_file):
+    """
+    Test that lazy variants can be parsed with workers
+    """
+    variants = list(VCFParser(infile=region_file))
+    lazy_variants = list(VCFParser(infile=region_file, workers=2,
+                                   lazy=True))
+    
+    assert all(isinstance(variant, LazyVariant) for variant in lazy_variants)
+    assert ([variant['variant_id'] for variant in lazy_variants] ==
+            [variant['variant_id'] for variant in variants])
+    assert (lazy_variants[10]['genotypes']['mother'].genotype ==
+            variants[10]['genotypes']['mother'].genotype)
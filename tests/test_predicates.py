@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+from vcf_parser.predicates import (range_may_match, chunk_may_match,
+                                   info_matches)
+
+def test_range_may_match():
+    """
+    Test if a range of values can match a comparison
+    """
+    assert range_may_match([1, 10], '<', 2)
+    assert not range_may_match([1, 10], '<', 1)
+    assert range_may_match([1, 10], '<=', 1)
+    assert not range_may_match([1, 10], '>', 10)
+    assert range_may_match([1, 10], '>=', 10)
+    assert range_may_match([1, 10], '==', 5)
+    assert not range_may_match([1, 10], '==', 11)
+    assert range_may_match([1, 10], '!=', 10)
+    assert not range_may_match([3, 3], '!=', 3)
+    # Missing values never match
+    assert not range_may_match(None, '!=', 3)
+
+def test_chunk_may_match():
+    """
+    Test to check predicates against a zone map
+    """
+    chunk = {
+        'start': 0,
+        'end': 10,
+        'contigs': [1],
+        'pos': [100, 200],
+        'qual': None,
+        'filters': [0],
+        'non_ref': [True],
+        'info': {'AF': [0.1, 0.5]},
+    }
+    contigs = ['1', '2']
+    filters = ['PASS']
+    
+    assert chunk_may_match(chunk, [('CHROM', '==', '2')], contigs, filters)
+    assert not chunk_may_match(chunk, [('CHROM', '==', '1')], contigs, filters)
+    assert not chunk_may_match(chunk, [('CHROM', '==', 'Y')], contigs, filters)
+    assert not chunk_may_match(chunk, [('FILTER', '!=', 'PASS')], contigs,
+                               filters)
+    assert not chunk_may_match(chunk, [('NON_REF', '==', False)], contigs,
+                               filters)
+    assert not chunk_may_match(chunk, [('POS', '>', 200)], contigs, filters)
+    assert not chunk_may_match(chunk, [('QUAL', '>', 0)], contigs, filters)
+    assert not chunk_may_match(chunk, [('AF', '<', 0.1)], contigs, filters)
+    # Keys without statistics can not be used to skip chunks
+    assert chunk_may_match(chunk, [('DB', '==', True)], contigs, filters)
+
+def test_info_matches():
+    """
+    Test to check predicates against parsed INFO fields
+    """
+    info_dict = OrderedDict([('AF', ['0.1', '0.7']), ('DB', []), 
+                             ('DP', ['.'])])
+    
+    assert info_matches(info_dict, 'AF', '>', 0.5)
+    assert not info_matches(info_dict, 'AF', '>', 0.7)
+    assert info_matches(info_dict, 'DB', '==', True)
+    assert info_matches(info_dict, 'H2', '==', False)
+    assert not info_matches(info_dict, 'DP', '<', 10)
+    assert not info_matches(info_dict, 'MQ', '<', 10)
@@ -0,0 +1,146 @@
+import io
+import os
+import pytest
+
+from vcf_parser import VCFParser
+from vcf_parser.readers import (read_lines, MmapReader, decode_record)
+
+from .test_vcf_parser import get_vcf_file
+
+VCF_LINES = [
+    '##fileformat=VCFv4.1\n',
+    '##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">\n',
+    '##contig=<ID=1,length=249250621,assembly=b37>\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t'\
+    'father\tmother\tproband\n',
+    '1\t11900\t.\tA\tT\t100\tPASS\tMQ=1\tGT:GQ\t0/1:60\t0/1:60\t1/1:60\n',
+    '1\t879585\t.\tA\tT\t100\tPASS\tMQ=1\tGT:GQ\t0/1:60\t0/0:60\t0/1:60\n',
+    '1\t879586\t.\tA\tT,C\t100\tPASS\tMQ=1\tGT:GQ\t0/0:60\t0/1:60\t0/2:60\n',
+    '3\t947378\t.\tA\tT\t100\tPASS\tMQ=1\tGT:GQ\t0/0:60\t0/0:60\t0/1:60\n',
+]
+
+@pytest.mark.parametrize("buffer_size", [1, 7, 64, 1024])
+def test_read_lines(buffer_size):
+    """
+    Test that the lines are the same regardless of the buffer size
+    """
+    data = b'first line\nsecond line\n\nlast line without newline'
+    lines = list(read_lines(io.BytesIO(data), buffer_size=buffer_size))
+
+    assert lines == [b'first line', b'second line', b'',
+                     b'last line without newline']
+
+def test_read_lines_empty():
+    """
+    Test to read an empty stream
+    """
+    assert list(read_lines(io.BytesIO(b''))) == []
+
+@pytest.mark.parametrize("split", [True, False])
+def test_binary_parser(split):
+    """
+    Test that the binary mode gives the same variants as the text mode
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    variants = list(VCFParser(infile=vcf_file, split_variants=split))
+    binary_variants = list(VCFParser(infile=vcf_file, split_variants=split,
+                                     binary=True))
+
+    assert len(binary_variants) == len(variants)
+    for variant, binary_variant in zip(variants, binary_variants):
+        assert binary_variant['variant_id'] == variant['variant_id']
+        assert binary_variant['info_dict'] == variant['info_dict']
+        assert binary_variant['proband'] == variant['proband']
+
+def test_binary_parser_compressed(examples):
+    """
+    Test to read a bgzipped file in binary mode
+    """
+    parser = VCFParser(infile=os.path.join(examples, 'test_vcf.vcf.gz'),
+                       binary=True)
+
+    assert parser.individuals == ['father', 'mother', 'proband']
+    variants = list(parser)
+    assert len(variants) == 9
+    assert variants[0]['POS'] == '11900'
+
+def test_mmap_reader():
+    """
+    Test to read lines through a memory map
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    with MmapReader(vcf_file) as reader:
+        assert reader.readline() == VCF_LINES[0].encode('utf-8')
+        offset = reader.tell()
+        assert reader.readline() == VCF_LINES[1].encode('utf-8')
+        reader.seek(offset)
+        assert reader.readline() == VCF_LINES[1].encode('utf-8')
+        assert reader.record_at(offset) == VCF_LINES[1].rstrip().encode('utf-8')
+
+def test_mmap_records():
+    """
+    Test to get the lines as memoryviews with their offsets
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    with MmapReader(vcf_file) as reader:
+        records = [(offset, bytes(record)) for offset, record in
+                   reader.records()]
+        assert [record for offset, record in records] == [
+            line.rstrip('\n').encode('utf-8') for line in VCF_LINES]
+        for offset, record in records:
+            assert reader.record_at(offset) == record
+
+def test_mmap_records_are_released():
+    """
+    Test that the reader can be closed while records are handed out
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    reader = MmapReader(vcf_file)
+    records = reader.records()
+    offset, record = next(records)
+    assert decode_record(record) == VCF_LINES[0].rstrip()
+    offset, record = next(records)
+    # The position follows the records
+    assert reader.tell() == offset
+    reader.close()
+    with pytest.raises(ValueError):
+        bytes(record)
+
+def test_binary_parser_reads_records():
+    """
+    Test that a binary parser gives the same variants from the memory map
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    parser = VCFParser(infile=vcf_file, binary=True)
+    assert isinstance(parser.vcf, MmapReader)
+    variants = [variant['variant_id'] for variant in parser]
+    assert variants == [variant['variant_id'] for variant in 
+                        VCFParser(infile=vcf_file)]
+    assert parser.vcf.tell() == parser.vcf.size
+    assert list(parser) == []
+    parser.vcf.close()
+
+def test_mmap_empty_file():
+    """
+    Test that an empty file can be opened
+    """
+    vcf_file = get_vcf_file([])
+    with MmapReader(vcf_file) as reader:
+        assert reader.readline() == b''
+        assert list(reader.records()) == []
+
+def test_variants_at():
+    """
+    Test to parse the variant at a byte offset
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    offset = sum(len(line) for line in VCF_LINES[:6])
+    parser = VCFParser(infile=vcf_file, split_variants=True)
+
+    variants = parser.variants_at(offset)
+    assert len(variants) == 2
+    assert variants[0]['POS'] == '879586'
+    assert variants[1]['ALT'] == 'C'
+
+    with pytest.raises(IOError):
+        parser.variants_at(0)
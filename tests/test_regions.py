@@ -0,0 +1,154 @@
+import pytest
+
+from click.testing import CliRunner
+
+from vcf_parser import VCFParser
+from vcf_parser.cli.command_line import cli
+from vcf_parser.regions import RegionSet, parse_region, read_bed
+
+REGIONS = [('1', 10000, 500000), ('1', 400000, 2000000), ('X', None, 300000),
+           ('2', 1500000, None)]
+
+def in_regions(variant, regions=REGIONS):
+    """Check if POS of a variant is inside one of the regions"""
+    pos = int(variant['POS'])
+    for chrom, start, end in regions:
+        if (variant['CHROM'] == chrom and (start is None or start <= pos) and
+                (end is None or pos <= end)):
+            return True
+    return False
+
+def variant_ids(parser):
+    """Return the variant ids of the variants from a parser"""
+    return [variant['variant_id'] for variant in parser]
+
+def test_read_bed(tmpdir):
+    """Test that the BED coordinates are made 1-based and inclusive"""
+    bed_file = tmpdir.join('regions.bed')
+    bed_file.write("track name=targets\n"\
+                   "# comment\n"\
+                   "1\t0\t100\tfirst\n"\
+                   "X 199 300\n")
+    assert read_bed(str(bed_file)) == [('1', 1, 100), ('X', 200, 300)]
+
+    bed_file.write("1\t0\n")
+    with pytest.raises(SyntaxError):
+        read_bed(str(bed_file))
+
+@pytest.mark.parametrize("region, expected", [
+    ('1:10000-20000', ('1', 10000, 20000)),
+    ('1:10,000-20,000', ('1', 10000, 20000)),
+    ('X:5000', ('X', 5000, None)),
+    ('chr1', ('chr1', None, None)),
+    ('HLA-A*01:01:01:01:1-100', ('HLA-A*01:01:01:01', 1, 100)),
+])
+def test_parse_region(region, expected):
+    """Test parsing of region strings"""
+    assert parse_region(region) == expected
+
+def test_parse_malformed_region():
+    """Test that a malformed region raises a SyntaxError"""
+    with pytest.raises(SyntaxError):
+        parse_region('1:start-end')
+
+def test_merge_regions():
+    """Test that overlapping and adjacent regions are merged"""
+    regions = RegionSet([('1', 300, 400), ('1', 100, 200), ('1', 150, 250),
+                         ('1', 251, 260), ('2', 10, 5)])
+    assert regions.starts == {'1': [100, 300]}
+    assert regions.ends == {'1': [260, 400]}
+    assert len(regions) == 2
+    assert regions.contigs() == ['1']
+
+def test_contains():
+    """Test the borders of the regions"""
+    regions = RegionSet([('1', 100, 200), ('X', None, 50)])
+    assert not regions.contains('1', 99)
+    assert regions.contains('1', 100)
+    assert regions.contains('1', 200)
+    assert not regions.contains('1', 201)
+    assert regions.contains('X', 1)
+    assert not regions.contains('X', 51)
+    assert not regions.contains('2', 150)
+    assert regions("1\t150\t.\tA\tC\t.\tPASS\t.\n")
+    assert not regions("2\t150\t.\tA\tC\t.\tPASS\t.\n")
+    with pytest.raises(SyntaxError):
+        regions("1\tPOS\t.\tA\tC\t.\tPASS\t.\n")
+
+def test_key():
+    """Test that the key only depends on the merged regions"""
+    assert (RegionSet([('1', 100, 200), ('1', 150, 300)]).key() ==
+            RegionSet([('1', 100, 300)]).key())
+    assert (RegionSet([('1', 100, 200)]).key() !=
+            RegionSet([('1', 100, 201)]).key())
+
+def test_parser_regions(region_file):
+    """Test that only the variants inside the regions are parsed"""
+    expected = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file) if in_regions(variant)]
+    assert expected
+    assert variant_ids(VCFParser(infile=region_file,
+                                 regions=REGIONS)) == expected
+    assert variant_ids(VCFParser(infile=region_file, regions=REGIONS,
+                                 lazy=True)) == expected
+
+def test_batch_regions(region_file):
+    """Test that the batches only holds the variants inside the regions"""
+    pytest.importorskip('numpy')
+    expected = [(variant['CHROM'], int(variant['POS'])) for variant in
+                VCFParser(infile=region_file) if in_regions(variant)]
+    batched = []
+    for batch in VCFParser(infile=region_file,
+                           regions=REGIONS).iter_batches(size=100):
+        batched.extend(zip(batch.chrom, batch.pos))
+    assert [(str(chrom), int(pos)) for chrom, pos in batched] == expected
+
+def test_parser_bed_regions(tmpdir, region_file):
+    """Test restricting the variants with a BED file"""
+    bed_file = tmpdir.join('regions.bed')
+    bed_file.write("1\t9999\t500000\n2\t1499999\t3000000\n")
+    regions = [('1', 10000, 500000), ('2', 1500000, 3000000)]
+    expected = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file)
+                if in_regions(variant, regions)]
+    assert variant_ids(VCFParser(infile=region_file,
+                                 regions=str(bed_file))) == expected
+
+def test_regions_and_filter(region_file):
+    """Test that the regions and the filter are both used"""
+    expected = [variant['variant_id'] for variant in
+                VCFParser(infile=region_file)
+                if in_regions(variant) and variant['FILTER'] == 'PASS']
+    assert variant_ids(VCFParser(infile=region_file, regions=REGIONS,
+                                 filter='FILTER == "PASS"')) == expected
+
+def test_regions_workers(region_file):
+    """Test that the regions are used by the workers"""
+    expected = variant_ids(VCFParser(infile=region_file, regions=REGIONS))
+    assert variant_ids(VCFParser(infile=region_file, regions=REGIONS,
+                                 workers=2)) == expected
+
+def test_regions_command(tmpdir, region_file):
+    """Test the --regions option with region strings and a BED file"""
+    runner = CliRunner()
+    result = runner.invoke(cli, [region_file, '--regions',
+                                 '1:10000-500000 X'])
+    assert result.exit_code == 0
+    lines = [line.split('\t') for line in result.output.split('\n')
+             if line and not line.startswith('#')]
+    assert lines
+    assert all((fields[0] == '1' and 10000 <= int(fields[1]) <= 500000) or
+               fields[0] == 'X' for fields in lines)
+
+    bed_file = tmpdir.join('regions.bed')
+    bed_file.write("X\t0\t300000\n")
+    result = runner.invoke(cli, [region_file, '--regions', str(bed_file)])
+    assert result.exit_code == 0
+    lines = [line.split('\t') for line in result.output.split('\n')
+             if line and not line.startswith('#')]
+    assert lines
+    assert all(fields[0] == 'X' and int(fields[1]) <= 300000
+               for fields in lines)
+
+    result = runner.invoke(cli, [region_file, '--regions', '1:a-b'])
+    assert result.exit_code == 1
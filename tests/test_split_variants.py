@@ -1,5 +1,6 @@
 import pytest
-from vcf_parser.utils import split_variants, format_variant
+from vcf_parser.utils import (split_variants, format_variant, split_genotype,
+    SplitPlan)
 from vcf_parser import HeaderParser
 
 def get_header(header_lines = None):
@@ -293,3 +294,108 @@ def test_split_no_info():
 
     assert first_variant['INFO'] == '.'
     assert second_variant['INFO'] == '.'
+
+def test_split_with_projection():
+    """
+    Test that the INFO column is kept when only some info keys are parsed
+    """
+    
+    header_parser = get_header()
+    
+    variant_line = "3\t947379\t.\tA\tT,C\t100\tPASS\tMQ=1;CNT=5,8;"\
+    "DP_HIST=12,43,22\tGT:GQ:AD:DP\t1/1:60:0,7,0:12\t0/2:60:7,0,10:17"\
+    "\t1/2:60:0,7,8:16"
+    info_fields = set(['CNT'])
+    format_fields = set(['GT'])
+    
+    variant = format_variant(
+        line = variant_line, 
+        header_parser=header_parser, 
+        info_fields=info_fields,
+        format_fields=format_fields
+    )
+    
+    splitted_variants = list(split_variants(
+        variant, 
+        header_parser, 
+        info_fields=info_fields, 
+        format_fields=format_fields
+    ))
+    
+    assert len(splitted_variants) == 2
+    first_variant = splitted_variants[0]
+    second_variant = splitted_variants[1]
+    
+    assert first_variant['INFO'] == "MQ=1;CNT=5;DP_HIST=12,43"
+    assert second_variant['INFO'] == "MQ=1;CNT=8;DP_HIST=12,22"
+    assert list(first_variant['info_dict']) == ['CNT']
+    assert second_variant['info_dict']['CNT'] == ['8']
+    
+    genotype = second_variant['genotypes']['mother']
+    assert genotype.genotype == '0/1'
+    # GQ was not parsed
+    assert genotype.genotype_quality == 0
+
+def test_split_plan():
+    """
+    Test that the INFO and FORMAT keys are classified by their Number
+    """
+    header_parser = get_header()
+    header_parser.parse_meta_data('##INFO=<ID=GL,Number=G,Type=Float,'\
+                                  'Description="Genotype likelihoods">')
+    split_plan = SplitPlan(header_parser)
+    
+    assert split_plan.info_number('MQ') == 'fixed'
+    assert split_plan.info_number('CNT') == 'A'
+    assert split_plan.info_number('DP_HIST') == 'R'
+    assert split_plan.info_number('GL') == 'G'
+    # AD has Number=. in the header but is allways splitted per allele
+    assert split_plan.format_numbers['AD'] == 'R'
+    assert split_plan.format_plan('GT:GQ:AD:DP') == (4, [(0, 'GT'), (2, 'R')])
+    
+    # INFO lines added after the plan was made are found in the header
+    header_parser.add_info('AC', 'A', 'Integer', 'Allele count')
+    assert split_plan.info_number('AC') == 'A'
+    with pytest.raises(KeyError):
+        split_plan.info_number('MISSING')
+
+def test_split_call_many_alternatives():
+    """
+    Test that a call is splitted like split_genotype for all alternatives
+    """
+    split_plan = SplitPlan(get_header())
+    gt_format = "GT:GQ:AD:DP"
+    alternatives = 30
+    ad = ','.join(str(depth) for depth in range(alternatives + 1))
+    for genotype in ["3/17:60:{0}:12".format(ad), "0|5:60:{0}:12".format(ad),
+                     "./2:60:.:12", "4", "1/1:60:0,7"]:
+        assert split_plan.split_call(genotype, gt_format, alternatives) == [
+            split_genotype(genotype, gt_format, alternative_number)
+            for alternative_number in range(alternatives)]
+
+def test_split_format_per_alternative():
+    """
+    Test that FORMAT values with Number=A get the value of the alternative
+    """
+    header_parser = get_header()
+    header_parser.parse_meta_data('##FORMAT=<ID=AF,Number=A,Type=Float,'\
+                                  'Description="Allele fractions">')
+    header_parser.parse_meta_data('##FORMAT=<ID=PL,Number=G,Type=Integer,'\
+                                  'Description="Genotype likelihoods">')
+    
+    variant_line = "3\t947379\t.\tA\tT,C\t100\tPASS\tMQ=1\tGT:AF:PL"\
+    "\t1/2:0.4,0.6:10,20,30,40,50,60\t0/1:0.5:0,10,20,30,40,50"\
+    "\t0/0:.:0,10,20,30,40,50"
+    
+    variant = format_variant(
+        line = variant_line, 
+        header_parser=header_parser
+    )
+    
+    first_variant, second_variant = split_variants(variant, header_parser)
+    
+    assert first_variant['father'] == "0/1:0.4:10,20,30,40,50,60"
+    assert second_variant['father'] == "0/1:0.6:10,20,30,40,50,60"
+    # If there is only one value it is used for all alternatives
+    assert second_variant['mother'] == "0/0:0.5:0,10,20,30,40,50"
+    assert second_variant['proband'] == "0/0:.:0,10,20,30,40,50"
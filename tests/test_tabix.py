@@ -0,0 +1,130 @@
+import os
+import pytest
+
+from vcf_parser import VCFParser
+from vcf_parser.tabix import (TabixIndex, TabixIndexBuilder, find_tabix_index,
+                              reg2bin, reg2bins, merge_chunks)
+
+def overlapping(variants, chrom, start, end):
+    """Return the ids of the variants that overlap a region"""
+    return [
+        variant['variant_id'] for variant in variants
+        if variant['CHROM'] == chrom and int(variant['POS']) <= end and
+        int(variant['POS']) + len(variant['REF']) - 1 >= start
+    ]
+
+def test_reg2bin():
+    """
+    Test to get the smallest bin for some regions
+    """
+    assert reg2bin(0, 1) == 4681
+    assert reg2bin(0, 2**14 + 1) == 585
+    assert reg2bin(2**14, 2**14 + 1) == 4682
+    assert reg2bin(0, 2**29) == 0
+
+def test_reg2bins():
+    """
+    Test that all levels are covered
+    """
+    bins = reg2bins(0, 1)
+    assert bins == [0, 1, 9, 73, 585, 4681]
+    assert reg2bin(100, 200) in reg2bins(150, 160)
+
+def test_merge_chunks():
+    """
+    Test to merge overlapping chunks
+    """
+    assert merge_chunks([(10, 20), (0, 5), (15, 30), (30, 40)]) == [
+        (0, 5), (10, 40)]
+
+def test_find_index(region_file, examples):
+    """
+    Test to find the index next to a file
+    """
+    assert find_tabix_index(region_file) == region_file + '.tbi'
+    assert find_tabix_index(os.path.join(examples, 'test_vcf.vcf.gz')) is None
+
+def test_read_index(region_file):
+    """
+    Test to read the contig names from the index
+    """
+    tabix_index = TabixIndex(region_file + '.tbi')
+    assert tabix_index.format == 'tbi'
+    assert tabix_index.names == ['1', '2', 'X']
+
+    csi_index = TabixIndex(region_file + '.csi')
+    assert csi_index.format == 'csi'
+    assert csi_index.names == ['1', '2', 'X']
+
+@pytest.mark.parametrize("index_suffix", ['.tbi', '.csi'])
+def test_fetch(index_suffix, region_file):
+    """
+    Test that fetch returns the same variants as a full scan
+    """
+    all_variants = list(VCFParser(infile=region_file))
+    parser = VCFParser(infile=region_file)
+    parser.index = TabixIndex(region_file + index_suffix)
+
+    for chrom, start, end in [('1', 100000, 200000), ('2', 1, 20000),
+                              ('X', 1500000, 3000000), ('2', 35791, 35791)]:
+        fetched = [variant['variant_id'] for variant in
+                   parser.fetch(chrom, start, end)]
+        assert fetched == overlapping(all_variants, chrom, start, end)
+
+def test_fetch_whole_contig(region_file):
+    """
+    Test to fetch all variants on a contig
+    """
+    parser = VCFParser(infile=region_file)
+    variants = list(parser.fetch('X'))
+
+    assert len(variants) == 1000
+    assert set(variant['CHROM'] for variant in variants) == set(['X'])
+
+def test_fetch_missing_contig(region_file):
+    """
+    Test to fetch a contig that is not in the file
+    """
+    parser = VCFParser(infile=region_file)
+    assert list(parser.fetch('7', 1, 1000000)) == []
+
+def test_fetch_without_index(examples):
+    """
+    Test that fetch fails if there is no index
+    """
+    parser = VCFParser(infile=os.path.join(examples, 'test_vcf.vcf.gz'))
+    with pytest.raises(IOError):
+        list(parser.fetch('1', 1, 100000))
+
+def test_index_builder_unsorted():
+    """
+    Test that no index is built for records that are not sorted
+    """
+    builder = TabixIndexBuilder()
+    builder.add('1', 100, 101, 0, 10)
+    builder.add('1', 200, 201, 10, 20)
+    assert builder.valid
+    builder.add('2', 50, 51, 20, 30)
+    builder.add('1', 300, 301, 30, 40)
+    assert not builder.valid
+
+    builder = TabixIndexBuilder()
+    builder.add('1', 200, 201, 0, 10)
+    builder.add('1', 100, 101, 10, 20)
+    assert not builder.valid
+
+def test_index_builder_chunks():
+    """
+    Test that records in the same bin are merged to one chunk
+    """
+    builder = TabixIndexBuilder()
+    builder.add('1', 100, 101, 0, 10)
+    builder.add('1', 200, 201, 10, 20)
+    builder.add('1', 20000, 20001, 20, 30)
+    builder.add('1', 20100, 20101, 30, 40)
+
+    assert builder.references[0] == {
+        reg2bin(100, 101): [[0, 20]],
+        reg2bin(20000, 20001): [[20, 40]],
+    }
+    assert builder.linear_indexes[0] == [0, 20]
@@ -0,0 +1,126 @@
+import pytest
+
+from vcf_parser import (LazyVariant, VCFParser)
+from vcf_parser.utils import format_variant
+
+from .test_format_variant import get_header
+from .test_readers import VCF_LINES
+from .test_vcf_parser import get_vcf_file
+
+VARIANT_LINE = "1\t11900\t.\tA\tT,C\t100\tPASS\tMQ=1;CNT=5,8\tGT:GQ\t0/1:60\t"\
+               "0/2:60\t1/2:60"
+
+
+def test_lazy_variant_same_as_format_variant():
+    """
+    Test that a LazyVariant holds the same information as format_variant
+    """
+    header_parser = get_header()
+    variant = format_variant(VARIANT_LINE, header_parser, check_info=False)
+    lazy_variant = LazyVariant(VARIANT_LINE, header_parser)
+
+    assert list(lazy_variant) == list(variant)
+    for key in variant:
+        if key == 'genotypes':
+            assert ({ind: gt.genotype for ind, gt in lazy_variant[key].items()}
+                    == {ind: gt.genotype for ind, gt in variant[key].items()})
+        else:
+            assert lazy_variant[key] == variant[key]
+
+def test_lazy_variant_parse_on_access():
+    """
+    Test that the derived fields are built first when they are accessed
+    """
+    lazy_variant = LazyVariant(VARIANT_LINE, get_header())
+
+    assert lazy_variant['POS'] == '11900'
+    assert not lazy_variant.is_parsed('info_dict')
+    assert not lazy_variant.is_parsed('genotypes')
+
+    info_dict = lazy_variant['info_dict']
+    assert info_dict['CNT'] == ['5', '8']
+    assert lazy_variant.is_parsed('info_dict')
+    assert not lazy_variant.is_parsed('genotypes')
+    # The value is kept after the first access
+    assert lazy_variant['info_dict'] is info_dict
+
+def test_lazy_variant_set_and_delete():
+    """
+    Test to change and remove keys of a LazyVariant
+    """
+    lazy_variant = LazyVariant(VARIANT_LINE, get_header())
+    number_of_keys = len(lazy_variant)
+
+    lazy_variant['info_dict'] = {'MQ': ['2']}
+    assert lazy_variant['info_dict'] == {'MQ': ['2']}
+
+    del lazy_variant['genotypes']
+    assert 'genotypes' not in lazy_variant
+    assert len(lazy_variant) == number_of_keys - 1
+    with pytest.raises(KeyError):
+        lazy_variant['genotypes']
+    with pytest.raises(KeyError):
+        del lazy_variant['genotypes']
+
+def test_lazy_variant_modified():
+    """
+    Test that a LazyVariant is modified only when a column is changed
+    """
+    lazy_variant = LazyVariant(VARIANT_LINE, get_header())
+    lazy_variant['info_dict']
+    lazy_variant['variant_id'] = 'variant'
+    del lazy_variant['genotypes']
+    assert not lazy_variant.modified
+
+    lazy_variant['FILTER'] = 'LowQual'
+    assert lazy_variant.modified
+
+    lazy_variant = LazyVariant(VARIANT_LINE, get_header())
+    del lazy_variant['QUAL']
+    assert lazy_variant.modified
+
+def test_lazy_variant_malformed_line():
+    """
+    Test that a line with the wrong number of columns raises SyntaxError
+    """
+    with pytest.raises(SyntaxError):
+        LazyVariant("1\t11900\t.\tA\tT", get_header())
+
+def test_lazy_variant_check_info():
+    """
+    Test that the INFO field is checked when check_info is used
+    """
+    line = "1\t11900\t.\tA\tT\t100\tPASS\tMQ=1;CNT=5,8\tGT:GQ\t0/1:60\t"\
+           "0/1:60\t1/1:60"
+    with pytest.raises(SyntaxError):
+        LazyVariant(line, get_header(), check_info=True)
+
+@pytest.mark.parametrize("split", [True, False])
+def test_lazy_parser(split):
+    """
+    Test that a lazy parser gives the same variants as the default parser
+    """
+    vcf_file = get_vcf_file(VCF_LINES)
+    variants = list(VCFParser(infile=vcf_file, split_variants=split))
+    lazy_variants = list(VCFParser(infile=vcf_file, split_variants=split,
+                                   lazy=True))
+
+    assert len(lazy_variants) == len(variants)
+    for variant, lazy_variant in zip(variants, lazy_variants):
+        assert lazy_variant['variant_id'] == variant['variant_id']
+        assert lazy_variant['info_dict'] == variant['info_dict']
+        assert lazy_variant['proband'] == variant['proband']
+        assert (lazy_variant['genotypes']['proband'].genotype ==
+                variant['genotypes']['proband'].genotype)
+
+def test_lazy_variant_projection():
+    """
+    Test to parse only some of the INFO and FORMAT keys
+    """
+    lazy_variant = LazyVariant(VARIANT_LINE, get_header(),
+                               info_fields=set(['CNT']),
+                               format_fields=set(['GT']))
+
+    assert list(lazy_variant['info_dict']) == ['CNT']
+    assert lazy_variant['genotypes']['proband'].genotype == '1/2'
+    assert lazy_variant['genotypes']['proband'].genotype_quality == 0
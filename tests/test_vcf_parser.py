@@ -124,6 +124,94 @@ def test_split_variant():
     assert second_variant['ALT'] == 'C'
 
 
+def test_parser_projection():
+    """
+    Test to parse only some of the INFO and FORMAT keys
+    """
+    vcf_lines = [
+        '##fileformat=VCFv4.1\n',
+        '##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">\n',
+        '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">\n',
+        '##contig=<ID=1,length=249250621,assembly=b37>\n',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t'\
+        'father\tmother\tproband\n',
+        '1\t11900\t.\tA\tT\t100\tPASS\tMQ=1;DP=20\tGT:GQ\t0/1:60\t0/1:60\t'\
+        '1/1:60\n',
+        ]
+    
+    vcf_file = get_vcf_file(vcf_lines)
+    variants = list(VCFParser(infile=vcf_file, info_fields=['DP'], 
+                              format_fields=['GT']))
+    
+    variant = variants[0]
+    assert list(variant['info_dict']) == ['DP']
+    assert variant['INFO'] == 'MQ=1;DP=20'
+    assert variant['genotypes']['proband'].genotype == '1/1'
+    assert variant['genotypes']['proband'].genotype_quality == 0
+
+
+def test_parser_samples():
+    """
+    Test to parse only some of the individuals
+    """
+    vcf_lines = [
+        '##fileformat=VCFv4.1\n',
+        '##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">\n',
+        '##contig=<ID=1,length=249250621,assembly=b37>\n',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t'\
+        'father\tmother\tproband\n',
+        '1\t11900\t.\tA\tT,C\t100\tPASS\tMQ=1\tGT:GQ\t0/1:60\t0/2:60\t'\
+        '1/2:60\n',
+        '1\t11901\t.\tA\tT\t100\tPASS\tMQ=1\tGT:GQ\t0/1:60\t0/1:60\n',
+        ]
+    
+    vcf_file = get_vcf_file(vcf_lines)
+    parser = VCFParser(infile=vcf_file, samples=['mother'], split_variants=True)
+    assert parser.individuals == ['mother']
+    
+    variants = []
+    with pytest.raises(SyntaxError):
+        for variant in parser:
+            variants.append(variant)
+    
+    assert len(variants) == 2
+    assert 'father' not in variants[0]
+    assert list(variants[0]['genotypes']) == ['mother']
+    assert variants[0]['genotypes']['mother'].genotype == '0/0'
+    assert variants[1]['genotypes']['mother'].genotype == '0/1'
+
+
+def test_parser_genotype_cache():
+    """
+    Test that identical genotype calls gives the same Genotype object
+    """
+    vcf_lines = [
+        '##fileformat=VCFv4.1\n',
+        '##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">\n',
+        '##contig=<ID=1,length=249250621,assembly=b37>\n',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t'\
+        'father\tmother\tproband\n',
+        '1\t11900\t.\tA\tT,C\t100\tPASS\tMQ=1\tGT:GQ\t0/0:60\t0/0:60\t'\
+        '1/2:60\n',
+        '1\t11901\t.\tA\tT\t100\tPASS\tMQ=1\tGT:GQ\t0/0:60\t0/1:60\t'\
+        '0/1:60\n',
+        ]
+    
+    vcf_file = get_vcf_file(vcf_lines)
+    parser = VCFParser(infile=vcf_file, genotype_cache_size=100, 
+                       split_variants=True)
+    variants = list(parser)
+    
+    assert len(variants) == 3
+    genotypes = variants[2]['genotypes']
+    assert genotypes['mother'] is genotypes['proband']
+    assert genotypes['mother'].genotype == '0/1'
+    assert variants[0]['genotypes']['father'] is genotypes['father']
+    # Three genotypes for each line and for each splitted variant
+    assert parser.genotype_cache.hits + parser.genotype_cache.misses == 12
+    assert parser.genotype_cache.hit_rate > 0.5
+
+
 def test_wrong_formatted_vcf():
     """
     Test how vcf_parser behaves if no fileformat is given
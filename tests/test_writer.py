@@ -0,0 +1,136 @@
+import os
+import gzip
+
+from io import StringIO
+from click.testing import CliRunner
+
+from vcf_parser import VCFParser, VCFWriter
+from vcf_parser.bgzf import is_bgzf
+from vcf_parser.cli.command_line import cli
+from vcf_parser.tabix import TabixIndex
+
+def read_variant_lines(path):
+    """Return the variant lines of a vcf"""
+    if path.endswith('.gz'):
+        vcf = gzip.open(path, 'rb')
+    else:
+        vcf = open(path, 'rb')
+    with vcf:
+        return [line.decode('utf-8').rstrip() for line in vcf
+                if not line.startswith(b'#')]
+
+def write_variants(variants, header_parser, **kwargs):
+    """Write variants to a StringIO and return the lines"""
+    outfile = StringIO()
+    writer = VCFWriter(outfile, header_parser, **kwargs)
+    writer.write_header()
+    for variant in variants:
+        writer.write(variant)
+    writer.close()
+    return writer, outfile.getvalue().split('\n')
+
+def test_raw_lines(region_file):
+    """Test that lazy variants that are not modified are written as they are"""
+    parser = VCFParser(infile=region_file, lazy=True)
+    writer, lines = write_variants(parser, parser.metadata, buffer_size=1000)
+
+    assert lines[:len(parser.metadata.print_header())] == (
+        parser.metadata.print_header())
+    assert lines[len(parser.metadata.print_header()):] == (
+        read_variant_lines(region_file) + [''])
+    assert writer.number_of_variants == 3000
+    assert writer.number_of_raw_lines == 3000
+
+def test_modified_variants(region_file):
+    """Test that modified variants are written from the columns"""
+    parser = VCFParser(infile=region_file, lazy=True)
+    variants = list(parser)
+    variants[0]['FILTER'] = 'Changed'
+    writer, lines = write_variants(variants, parser.metadata)
+
+    expected = read_variant_lines(region_file)
+    columns = expected[0].split('\t')
+    columns[6] = 'Changed'
+    expected[0] = '\t'.join(columns)
+    assert lines[len(parser.metadata.print_header()):-1] == expected
+    assert writer.number_of_raw_lines == 2999
+
+def test_same_as_parsed_variants(example_vcf):
+    """Test that the output is the same for parsed and lazy variants"""
+    parser = VCFParser(infile=example_vcf, split_variants=True)
+    writer, parsed_lines = write_variants(parser, parser.metadata)
+    assert writer.number_of_raw_lines == 0
+
+    parser = VCFParser(infile=example_vcf, split_variants=True, lazy=True)
+    writer, lazy_lines = write_variants(parser, parser.metadata)
+    assert lazy_lines == parsed_lines
+
+def test_samples(region_file):
+    """Test that only the choosen individuals are written"""
+    parser = VCFParser(infile=region_file, lazy=True, samples=['proband'])
+    writer, lines = write_variants(parser, parser.metadata)
+
+    assert lines[len(parser.metadata.print_header())].split('\t')[9:] == [
+        read_variant_lines(region_file)[0].split('\t')[11]]
+    assert writer.number_of_raw_lines == 0
+
+def test_write_file(region_file, tmpdir):
+    """Test to write to a path"""
+    outfile = str(tmpdir.join('out.vcf'))
+    parser = VCFParser(infile=region_file, lazy=True)
+    with VCFWriter(outfile, parser.metadata) as writer:
+        writer.write_header()
+        for variant in parser:
+            writer.write(variant)
+
+    assert read_variant_lines(outfile) == read_variant_lines(region_file)
+    assert len(list(VCFParser(infile=outfile))) == 3000
+
+def test_write_bgzf(region_file, tmpdir):
+    """Test that a BGZF file with a tabix index is written for .gz"""
+    outfile = str(tmpdir.join('out.vcf.gz'))
+    parser = VCFParser(infile=region_file, lazy=True)
+    with VCFWriter(outfile, parser.metadata, buffer_size=1000,
+                   threads=2) as writer:
+        writer.write_header()
+        for variant in parser:
+            writer.write(variant)
+
+    assert is_bgzf(outfile)
+    assert read_variant_lines(outfile) == read_variant_lines(region_file)
+
+    written = VCFParser(infile=outfile)
+    assert written.index is None
+    example = VCFParser(infile=region_file)
+    for chrom, start, end in [('1', 100000, 200000), ('2', 1, 20000),
+                              ('X', 1500000, 3000000), ('2', 35791, 35791)]:
+        assert ([variant['variant_id'] for variant in
+                 written.fetch(chrom, start, end)] ==
+                [variant['variant_id'] for variant in
+                 example.fetch(chrom, start, end)])
+    assert TabixIndex(outfile + '.tbi').names == ['1', '2', 'X']
+
+def test_write_bgzf_unsorted(region_file, tmpdir):
+    """Test that no index is written if the variants are not sorted"""
+    outfile = str(tmpdir.join('out.vcf.gz'))
+    parser = VCFParser(infile=region_file, lazy=True)
+    variants = list(parser)
+    with VCFWriter(outfile, parser.metadata) as writer:
+        writer.write_header()
+        for variant in reversed(variants):
+            writer.write(variant)
+
+    assert not os.path.exists(outfile + '.tbi')
+    assert len(read_variant_lines(outfile)) == 3000
+
+def test_parse_command_bgzf(region_file, tmpdir):
+    """Test that the parse command compresses and indexes a .gz outfile"""
+    outfile = str(tmpdir.join('out.vcf.gz'))
+    runner = CliRunner()
+    result = runner.invoke(cli, ['parse', '--split', region_file,
+                                 '--outfile', outfile])
+
+    assert result.exit_code == 0
+    assert is_bgzf(outfile)
+    assert os.path.exists(outfile + '.tbi')
+    assert len(list(VCFParser(infile=outfile).fetch('2'))) == 1000
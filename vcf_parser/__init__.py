@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import sys
+
 from pkg_resources import require
 
 __version__ = require("vcf_parser")[0].version
@@ -7,7 +9,16 @@ __version__ = require("vcf_parser")[0].version
 from logging import getLogger
 logger = getLogger(__name__)
 
-from .header_parser import HeaderParser
+from .header_parser import (HeaderParser, read_header)
 from .log import init_log
-from .genotype import Genotype
+from .genotype import (Genotype, FrozenGenotype, GenotypeCache, 
+    GenotypeDecoder, get_genotype_decoder)
+from .variant import LazyVariant
 from .parser import VCFParser
+from .merge import merge_sorted
+from .join import CohortJoiner
+from .columnar import ColumnarReader
+from .writer import VCFWriter
+
+if sys.version_info >= (3, 6):
+    from .async_parser import AsyncVCFParser
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+async_parser.py
+
+Parse a vcf from asyncio code without blocking the event loop.
+
+The variant lines are read in batches, from an async stream or from a file,
+and each batch is parsed in an executor:
+
+    parser = AsyncVCFParser(stream=reader)
+    await parser.open()
+    async for variant in parser:
+        print(variant['variant_id'])
+
+The parser is pull based, the next batch is not read until the consumer has
+taken all variants of the current batch. A slow consumer therefore stops the
+reading and at most one batch of variants is held in memory. For a network
+stream this means that the flow control of the stream takes over.
+
+This module needs python 3.6 or later.
+"""
+
+import asyncio
+
+from itertools import islice
+from logging import getLogger
+
+from vcf_parser.parser import VCFParser
+
+# The number of variant lines that are parsed at a time
+ASYNC_BATCH_SIZE = 1000
+
+
+def format_lines(parser, lines):
+    """
+    Parse a batch of variant lines.
+
+    Arguments:
+        parser (VCFParser): A parser with the header and the options
+        lines (list): The variant lines
+
+    Returns:
+        variants (list): The variant dictionaries
+    """
+    variants = []
+    for line in lines:
+        variants.extend(parser._format_line(line))
+    return variants
+
+
+def read_batch(parser, lines, batch_size):
+    """Read and parse the next batch of lines, None at the end of the file"""
+    batch = list(islice(lines, batch_size))
+    if not batch:
+        return None
+    return format_lines(parser, batch)
+
+
+class AsyncVCFParser(object):
+    """
+    Parse a vcf with async iteration.
+
+    Arguments:
+        stream: An asyncio.StreamReader, or anything with a readline
+                coroutine or that supports async iteration over lines.
+                The lines can be bytes or strings.
+        infile (str): Path to a vcf, used if there is no stream. The file is
+                      read in the executor.
+        batch_size (int): The number of variant lines parsed at a time
+        executor (concurrent.futures.Executor): The executor where the lines
+                                                are parsed, default is the
+                                                executor of the event loop.
+                                                A process pool can only be
+                                                used with a stream.
+
+    The other arguments are the same as for VCFParser.
+    """
+    def __init__(self, stream=None, infile=None, split_variants=False,
+                 check_info=False, allele_symbol='0', info_fields=None,
+                 format_fields=None, samples=None, genotype_cache_size=None,
+                 batch_size=ASYNC_BATCH_SIZE, executor=None):
+        super(AsyncVCFParser, self).__init__()
+        self.logger = getLogger(__name__)
+        if stream is None and infile is None:
+            raise IOError("Please give a stream or a file to parse")
+        self.stream = stream
+        self.infile = infile
+        self.batch_size = batch_size
+        self.executor = executor
+        self.parser_options = {
+            'split_variants': split_variants,
+            'check_info': check_info,
+            'allele_symbol': allele_symbol,
+            'info_fields': info_fields,
+            'format_fields': format_fields,
+            'samples': samples,
+            'genotype_cache_size': genotype_cache_size,
+        }
+        # The parser with the header, created when the vcf is opened
+        self.parser = None
+        self.metadata = None
+        self.individuals = []
+        self.header = []
+        self.header_lines = []
+        self._lines = None
+        self._stream_lines = None
+        self._first_line = None
+
+    async def _run(self, function, *args):
+        """Run a function in the executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def _readline(self):
+        """Read the next line from the stream, None at the end"""
+        if hasattr(self.stream, 'readline'):
+            line = await self.stream.readline()
+            if not line:
+                return None
+        else:
+            if self._stream_lines is None:
+                self._stream_lines = self.stream.__aiter__()
+            try:
+                line = await self._stream_lines.__anext__()
+            except StopAsyncIteration:
+                return None
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        return line.rstrip()
+
+    async def open(self):
+        """
+        Read the header of the vcf.
+
+        This is done automatically when the iteration starts.
+
+        Returns:
+            metadata (HeaderParser): The parsed header
+        """
+        if self.parser is not None:
+            return self.metadata
+
+        if self.stream is None:
+            self.parser = await self._run(self._open_file)
+            self._lines = self.parser._variant_lines()
+        else:
+            self.parser = VCFParser(fileformat='VCFv4.2', **self.parser_options)
+            self.parser.metadata.fileformat = None
+            line = await self._readline()
+            if line is None or not line.startswith('#'):
+                raise IOError("VCF files allways have to start with a "\
+                              "metadata line.")
+            while line is not None and line.startswith('#'):
+                self.parser.header_lines.append(line)
+                if line.startswith('##'):
+                    self.parser.metadata.parse_meta_data(line)
+                else:
+                    self.parser.metadata.parse_header_line(line)
+                    line = None
+                    break
+                line = await self._readline()
+            # A line after the header has been read if there was no '#CHROM'
+            self._first_line = line
+            self.parser.individuals = self.parser.metadata.individuals
+            self.parser.header = self.parser.metadata.header
+
+        self.metadata = self.parser.metadata
+        self.individuals = self.parser.individuals
+        self.header = self.parser.header
+        self.header_lines = self.parser.header_lines
+        return self.metadata
+
+    def _open_file(self):
+        """Open the file and read the header, runs in the executor"""
+        return VCFParser(infile=self.infile, binary=True, **self.parser_options)
+
+    async def _read_lines(self):
+        """Read the next batch of variant lines from the stream"""
+        lines = []
+        if self._first_line:
+            lines.append(self._first_line)
+            self._first_line = None
+        while len(lines) < self.batch_size:
+            line = await self._readline()
+            if line is None:
+                break
+            if not line.startswith('#') and line.count('\t') >= 7:
+                lines.append(line)
+        return lines
+
+    async def batches(self):
+        """
+        Yield the parsed variants one batch at a time.
+
+        Yields:
+            variants (list): The variant dictionaries of a batch
+        """
+        await self.open()
+        if not self.metadata.fileformat:
+            raise SyntaxError("Vcf must have fileformat defined")
+        try:
+            while True:
+                if self.stream is None:
+                    variants = await self._run(read_batch, self.parser,
+                                               self._lines, self.batch_size)
+                    if variants is None:
+                        break
+                else:
+                    lines = await self._read_lines()
+                    if not lines:
+                        break
+                    variants = await self._run(format_lines, self.parser,
+                                               lines)
+                yield variants
+        finally:
+            if self.parser.vcf is not None:
+                self.parser.vcf.close()
+
+    async def _iterate(self):
+        async for variants in self.batches():
+            for variant in variants:
+                yield variant
+
+    def __aiter__(self):
+        return self._iterate()
+
+    def __repr__(self):
+        return "AsyncVCFParser(stream={0},infile={1})".format(
+            self.stream, self.infile)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+batches.py
+
+Read variants in columnar batches of numpy arrays.
+
+Instead of one dictionary with Genotype objects per variant a batch holds the
+information for many variants in arrays:
+
+    - chrom, ref, alt: arrays with strings
+    - pos: int64 array
+    - alleles: int16 array with shape (variants, samples, 2), -1 is a missing
+      allele and -2 is the second allele of a haploid call, like '1'. Allele
+      indexes above 32767 raise a SyntaxError
+    - dp, gq: int32 arrays with shape (variants, samples), -1 if missing
+    - ad: int32 array with shape (variants, samples, 2) with the reference
+      depth and the sum of the depths of all alternatives, -1 if missing
+
+The arrays are filled straight from the vcf lines, no Genotype objects are
+created. Allele frequencies, call rates and so on can then be calculated
+with vectorized operations.
+
+numpy is needed for this module, install it with 'pip install numpy' or
+'pip install vcf_parser[numpy]'.
+"""
+
+from logging import getLogger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from vcf_parser.utils import split_variant_line
+
+# The number of variants in a batch
+BATCH_SIZE = 10000
+# The FORMAT fields that can be added to a batch
+BATCH_FIELDS = ('DP', 'GQ', 'AD')
+# The value of a missing allele
+MISSING_ALLELE = -1
+# The value of the second allele of a haploid call, it is not missing
+NON_ALLELE = -2
+# The type of the allele arrays and the largest allele index it can hold
+ALLELE_DTYPE = 'int16'
+MAX_ALLELE = 32767
+
+
+def check_numpy():
+    """Raise ImportError if numpy is not installed"""
+    if np is None:
+        raise ImportError("numpy is needed for batches, install it with "
+                          "'pip install numpy'")
+
+
+def parse_alleles(gt_call):
+    """
+    Parse the alleles of a GT call.
+
+    Arguments:
+        gt_call (str): A GT call like '0/1', '1|0' or '1'
+
+    Returns:
+        alleles (tuple): The two alleles as integers, MISSING_ALLELE for 
+                         missing alleles and NON_ALLELE as the second allele 
+                         of haploid calls
+    """
+    alleles = gt_call.replace('|', '/').split('/')
+    allele_1 = MISSING_ALLELE
+    allele_2 = MISSING_ALLELE
+    if alleles[0].isdigit():
+        allele_1 = int(alleles[0])
+    if len(alleles) == 1:
+        allele_2 = NON_ALLELE
+    elif alleles[-1].isdigit():
+        allele_2 = int(alleles[-1])
+    if max(allele_1, allele_2) > MAX_ALLELE:
+        raise SyntaxError("Allele index in GT call {0} is larger than "
+                          "{1}".format(gt_call, MAX_ALLELE))
+    return (allele_1, allele_2)
+
+
+def parse_depths(ad_call):
+    """
+    Parse the reference and alternative depth of a AD call.
+
+    For multiallelic variants the depths of all alternatives are summed.
+
+    Arguments:
+        ad_call (str): A AD call like '10,12' or '10,5,7'
+
+    Returns:
+        depths (tuple): The depths as integers, -1 for missing values
+    """
+    depths = ad_call.split(',')
+    ref_depth = -1
+    alt_depth = -1
+    if depths[0].isdigit():
+        ref_depth = int(depths[0])
+    for depth in depths[1:]:
+        if depth.isdigit():
+            alt_depth = max(alt_depth, 0) + int(depth)
+    return (ref_depth, alt_depth)
+
+
+def parse_number(call):
+    """Return the integer value of a call, -1 if it is missing"""
+    try:
+        return int(call)
+    except ValueError:
+        try:
+            return int(float(call))
+        except ValueError:
+            return -1
+
+
+class VariantBatch(object):
+    """
+    Holds a batch of variants as numpy arrays.
+
+    See the module documentation for the arrays. The arrays that was not
+    asked for are None.
+    """
+    def __init__(self, samples, chrom, pos, ref, alt, alleles, dp=None, gq=None,
+                 ad=None):
+        super(VariantBatch, self).__init__()
+        self.samples = samples
+        self.chrom = chrom
+        self.pos = pos
+        self.ref = ref
+        self.alt = alt
+        self.alleles = alleles
+        self.dp = dp
+        self.gq = gq
+        self.ad = ad
+
+    def called(self):
+        """
+        Return a boolean (variants, samples) array, True if called
+        
+        Haploid calls are called if their only allele is called.
+        """
+        alleles = self.alleles
+        return (alleles[:, :, 0] >= 0) & (
+            (alleles[:, :, 1] >= 0) | (alleles[:, :, 1] == NON_ALLELE))
+
+    def call_rate(self):
+        """Return the fraction of called samples for each variant"""
+        if not self.samples:
+            return np.zeros(len(self), dtype=np.float64)
+        return self.called().mean(axis=1)
+
+    def heterozygote_count(self):
+        """Return the number of heterozygous samples for each variant"""
+        alleles = self.alleles
+        return (self.called() & (alleles[:, :, 1] >= 0) &
+                (alleles[:, :, 0] != alleles[:, :, 1])).sum(axis=1)
+
+    def alt_allele_frequency(self):
+        """
+        Return the frequency of the alternative alleles for each variant.
+
+        All alternative alleles are counted together, variants where no
+        alleles are called get nan.
+        """
+        observed = self.alleles >= 0
+        number_of_alleles = observed.sum(axis=(1, 2))
+        alt_alleles = (self.alleles > 0).sum(axis=(1, 2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(
+                number_of_alleles > 0,
+                alt_alleles / number_of_alleles.astype(np.float64),
+                np.nan
+            )
+
+    def __len__(self):
+        return len(self.pos)
+
+    def __repr__(self):
+        return "VariantBatch(variants={0},samples={1})".format(
+            len(self), len(self.samples))
+
+
+def build_batch(variant_lines, header_parser, fields=()):
+    """
+    Build a VariantBatch from splitted variant lines.
+
+    Arguments:
+        variant_lines (list): Lists with the columns of each variant
+        header_parser (HeaderParser): The header of the vcf
+        fields (iterable): The FORMAT fields to include, any of DP, GQ and AD
+
+    Returns:
+        batch (VariantBatch)
+    """
+    check_numpy()
+    number_of_variants = len(variant_lines)
+    number_of_samples = len(header_parser.individuals)
+
+    alleles = np.empty((number_of_variants, number_of_samples, 2),
+                       dtype=ALLELE_DTYPE)
+    dp = None
+    gq = None
+    ad = None
+    if 'DP' in fields:
+        dp = np.full((number_of_variants, number_of_samples), -1, dtype=np.int32)
+    if 'GQ' in fields:
+        gq = np.full((number_of_variants, number_of_samples), -1, dtype=np.int32)
+    if 'AD' in fields:
+        ad = np.full((number_of_variants, number_of_samples, 2), -1,
+                     dtype=np.int32)
+
+    # Most calls are identical so the parsed values are reused
+    allele_cache = {}
+    depth_cache = {}
+    number_cache = {}
+
+    for row, columns in enumerate(variant_lines):
+        calls = columns[9:]
+        gt_format = columns[8].split(':') if len(columns) > 8 else []
+
+        split_calls = [call.split(':') for call in calls]
+
+        gt_position = gt_format.index('GT') if 'GT' in gt_format else None
+        row_alleles = []
+        for values in split_calls:
+            gt_call = './.'
+            if gt_position is not None and gt_position < len(values):
+                gt_call = values[gt_position]
+            try:
+                row_alleles.append(allele_cache[gt_call])
+            except KeyError:
+                allele_cache[gt_call] = parse_alleles(gt_call)
+                row_alleles.append(allele_cache[gt_call])
+        if number_of_samples:
+            alleles[row] = row_alleles
+
+        for key, array in (('DP', dp), ('GQ', gq), ('AD', ad)):
+            if array is None or key not in gt_format:
+                continue
+            position = gt_format.index(key)
+            if key == 'AD':
+                parse, cache = parse_depths, depth_cache
+            else:
+                parse, cache = parse_number, number_cache
+            row_values = []
+            for values in split_calls:
+                value = '.'
+                if position < len(values):
+                    value = values[position]
+                try:
+                    row_values.append(cache[value])
+                except KeyError:
+                    cache[value] = parse(value)
+                    row_values.append(cache[value])
+            if number_of_samples:
+                array[row] = row_values
+
+    return VariantBatch(
+        samples = list(header_parser.individuals),
+        chrom = np.array([columns[0] for columns in variant_lines], dtype=object),
+        pos = np.array([int(columns[1]) for columns in variant_lines],
+                       dtype=np.int64),
+        ref = np.array([columns[3] for columns in variant_lines], dtype=object),
+        alt = np.array([columns[4] for columns in variant_lines], dtype=object),
+        alleles = alleles,
+        dp = dp,
+        gq = gq,
+        ad = ad,
+    )
+
+
+def iter_batches(lines, header_parser, size=BATCH_SIZE, fields=()):
+    """
+    Yield VariantBatches from variant lines.
+
+    Arguments:
+        lines (iterable): Variant lines as strings
+        header_parser (HeaderParser): The header of the vcf
+        size (int): The maximum number of variants in a batch
+        fields (iterable): The FORMAT fields to include, any of DP, GQ and AD
+
+    Yields:
+        batch (VariantBatch)
+    """
+    logger = getLogger(__name__)
+    check_numpy()
+    fields = tuple(fields or ())
+    for field in fields:
+        if field not in BATCH_FIELDS:
+            raise ValueError("Field {0} can not be added to a batch, choose "
+                             "from {1}".format(field, ', '.join(BATCH_FIELDS)))
+
+    variant_lines = []
+    for line in lines:
+        variant_lines.append(split_variant_line(line, header_parser))
+        if len(variant_lines) == size:
+            logger.debug("Building batch with {0} variants".format(size))
+            yield build_batch(variant_lines, header_parser, fields)
+            variant_lines = []
+
+    if variant_lines:
+        yield build_batch(variant_lines, header_parser, fields)
@@ -0,0 +1,511 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bgzf.py
+
+Read and write files in the Blocked GNU Zip Format (BGZF).
+
+BGZF is the compression format used by bgzip and tabix. A BGZF file is a
+series of concatenated gzip members (blocks) where each block holds at most
+64 kb of uncompressed data and stores its own compressed size in the gzip
+extra field. Since every block can be inflated without knowing anything about
+the others we can decompress them on a thread pool, zlib releases the GIL
+while inflating. In the same way the blocks are compressed on a thread pool
+when a BGZF file is written.
+
+Positions in a BGZF file are described by virtual offsets, that is the byte
+offset of the compressed block shifted 16 bits to the left combined with the
+offset within the uncompressed block.
+"""
+
+import os
+import struct
+import zlib
+
+from collections import deque
+from logging import getLogger
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+
+# The empty block that bgzip writes at the end of each file
+BGZF_EOF = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43'
+            b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+# The number of uncompressed bytes in each written block, same as bgzip
+BGZF_BLOCK_SIZE = 0xff00
+
+# Number of threads used for (de)compression if nothing else is specified
+DEFAULT_THREADS = min(4, os.cpu_count() or 1) if hasattr(os, 'cpu_count') else 1
+
+
+def is_bgzf(filename):
+    """
+    Check if a file is compressed with BGZF.
+
+    Arguments:
+        filename (str): Path to a file
+
+    Returns:
+        bool: True if the first block of the file is a BGZF block
+    """
+    with open(filename, 'rb') as handle:
+        header = handle.read(18)
+
+    return (len(header) == 18 and header[:4] == BGZF_MAGIC and
+            header[12:14] == b'BC')
+
+
+def make_virtual_offset(block_offset, within_block_offset):
+    """Return the virtual offset for a block offset and a offset in the block"""
+    return (block_offset << 16) | within_block_offset
+
+
+def split_virtual_offset(virtual_offset):
+    """Return a tuple with (block_offset, within_block_offset)"""
+    return (virtual_offset >> 16, virtual_offset & 0xFFFF)
+
+
+def read_block_header(handle):
+    """
+    Read the gzip header of the next BGZF block from a file handle.
+
+    Arguments:
+        handle (file): A file handle opened in binary mode
+
+    Returns:
+        header (tuple): (block_offset, header_size, block_size) or None if
+                        the end of the file is reached
+    """
+    block_offset = handle.tell()
+    header = handle.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or header[:4] != BGZF_MAGIC:
+        raise IOError("Invalid BGZF block at offset {0}".format(block_offset))
+
+    extra_length = struct.unpack('<H', header[10:12])[0]
+    extra = handle.read(extra_length)
+    position = 0
+    # Find the BC subfield that holds the total block size
+    while position + 4 <= len(extra):
+        subfield_length = struct.unpack('<H', extra[position+2:position+4])[0]
+        if extra[position:position+2] == b'BC' and subfield_length == 2:
+            block_size = struct.unpack(
+                '<H', extra[position+4:position+6])[0] + 1
+            return (block_offset, 12 + extra_length, block_size)
+        position += 4 + subfield_length
+
+    raise IOError("Block at offset {0} is not a BGZF block".format(
+        block_offset))
+
+
+def read_raw_block(handle):
+    """
+    Read the next compressed BGZF block from a file handle.
+
+    Arguments:
+        handle (file): A file handle opened in binary mode
+
+    Returns:
+        block (tuple): (block_offset, block_size, compressed_data, 
+                        uncompressed_size) or None if the end of the file is 
+                        reached
+    """
+    header = read_block_header(handle)
+    if header is None:
+        return None
+    block_offset, header_size, block_size = header
+
+    remaining = handle.read(block_size - header_size)
+    if len(remaining) != block_size - header_size:
+        raise IOError("Truncated BGZF block at offset {0}".format(block_offset))
+
+    uncompressed_size = struct.unpack('<I', remaining[-4:])[0]
+    return (block_offset, block_size, remaining[:-8], uncompressed_size)
+
+
+def block_offsets(filename):
+    """
+    Yield the offsets of all blocks in a BGZF file.
+
+    Only the headers of the blocks are read, the compressed data is skipped.
+
+    Arguments:
+        filename (str): Path to a BGZF file
+
+    Yields:
+        block_offset (int): The position of a block in the file
+    """
+    with open(filename, 'rb') as handle:
+        while True:
+            header = read_block_header(handle)
+            if header is None:
+                return
+            block_offset, header_size, block_size = header
+            handle.seek(block_offset + block_size)
+            yield block_offset
+
+
+def decompress_block(compressed_data, uncompressed_size):
+    """Inflate the deflate stream of a BGZF block"""
+    data = zlib.decompress(compressed_data, -15)
+    if len(data) != uncompressed_size:
+        raise IOError("BGZF block has wrong uncompressed size")
+    return data
+
+
+def compress_block(data, level=6):
+    """
+    Compress data into one BGZF block.
+
+    Arguments:
+        data (bytes): At most BGZF_BLOCK_SIZE bytes
+        level (int): The zlib compression level
+
+    Returns:
+        block (bytes): The complete block with header and footer
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) > 65536 - 26:
+        # Data that can not be compressed is stored as it is
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+    header = struct.pack(
+        '<4sIBBHBBHH', BGZF_MAGIC, 0, 0, 255, 6, 66, 67, 2,
+        len(compressed) + 25
+    )
+    footer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+    return header + compressed + footer
+
+
+class BgzfReader(object):
+    """
+    Read a BGZF file as a stream of lines.
+
+    Blocks are read sequentially from disk and inflated on a pool of
+    threads. The inflated blocks are handed out in file order so the lines
+    come out exactly as they are written in the file.
+
+    If an encoding is given the lines are returned decoded, otherwise raw
+    bytes are returned.
+    """
+    def __init__(self, filename=None, fileobj=None, threads=None,
+                 encoding=None, errors='strict'):
+        super(BgzfReader, self).__init__()
+        self.logger = getLogger(__name__)
+        self.filename = filename
+        if fileobj:
+            self._handle = fileobj
+        else:
+            self._handle = open(filename, 'rb')
+
+        if threads is None:
+            threads = DEFAULT_THREADS
+        self.threads = threads
+        self.encoding = encoding
+        self.errors = errors
+
+        self._executor = None
+        if self.threads > 1 and ThreadPoolExecutor:
+            self.logger.debug("Decompressing BGZF blocks with {0} threads".format(
+                self.threads))
+            self._executor = ThreadPoolExecutor(max_workers=self.threads)
+
+        self._start_blocks(self._handle.tell())
+
+    def _start_blocks(self, block_offset):
+        """(Re)start reading blocks from a compressed offset"""
+        self._handle.seek(block_offset)
+        self._blocks = self._inflated_blocks()
+        self._block_offset = block_offset
+        self._next_block_offset = block_offset
+        self._data = b''
+        self._position = 0
+
+    def _inflated_blocks(self):
+        """
+        Yield all blocks from the current position in the file.
+
+        Yields:
+            block (tuple): (block_offset, next_block_offset, uncompressed_data)
+        """
+        if not self._executor:
+            while True:
+                raw_block = read_raw_block(self._handle)
+                if raw_block is None:
+                    return
+                yield (raw_block[0], raw_block[0] + raw_block[1],
+                       decompress_block(raw_block[2], raw_block[3]))
+
+        # Keep a few blocks in flight for each thread so that the threads
+        # always have something to work on
+        pending = deque()
+        read_ahead = self.threads * 4
+        end_of_file = False
+        while True:
+            while not end_of_file and len(pending) < read_ahead:
+                raw_block = read_raw_block(self._handle)
+                if raw_block is None:
+                    end_of_file = True
+                    break
+                pending.append((raw_block[0], raw_block[0] + raw_block[1],
+                    self._executor.submit(
+                        decompress_block, raw_block[2], raw_block[3])))
+            if not pending:
+                return
+            block_offset, next_block_offset, future = pending.popleft()
+            yield (block_offset, next_block_offset, future.result())
+
+    def _load_block(self):
+        """
+        Load the next block into the buffer.
+
+        Returns:
+            bool: False if there are no more blocks
+        """
+        for block_offset, next_block_offset, data in self._blocks:
+            self._block_offset = block_offset
+            self._next_block_offset = next_block_offset
+            self._data = data
+            self._position = 0
+            return True
+
+        self._block_offset = self._next_block_offset
+        self._data = b''
+        self._position = 0
+        return False
+
+    def tell(self):
+        """
+        Return the virtual offset of the current position.
+
+        If we are at the end of a block the offset of the start of the next
+        block is returned.
+        """
+        if self._data and self._position >= len(self._data):
+            return make_virtual_offset(self._next_block_offset, 0)
+        return make_virtual_offset(self._block_offset, self._position)
+
+    def seek(self, virtual_offset):
+        """Move to a virtual offset"""
+        block_offset, within_block_offset = split_virtual_offset(virtual_offset)
+        self._start_blocks(block_offset)
+        if within_block_offset:
+            self._load_block()
+            if within_block_offset > len(self._data):
+                raise IOError("Virtual offset {0} is outside of the block".format(
+                    virtual_offset))
+            self._position = within_block_offset
+        return virtual_offset
+
+    def _readline(self):
+        """Return the next line as bytes, empty bytes if end of file"""
+        chunks = []
+        while True:
+            if self._position >= len(self._data):
+                if not self._load_block():
+                    break
+                continue
+            end = self._data.find(b'\n', self._position)
+            if end == -1:
+                chunks.append(self._data[self._position:])
+                self._position = len(self._data)
+            else:
+                chunks.append(self._data[self._position:end+1])
+                self._position = end + 1
+                break
+
+        if len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
+
+    def readline(self):
+        """Return the next line, empty if end of file"""
+        line = self._readline()
+        if self.encoding:
+            return line.decode(self.encoding, self.errors)
+        return line
+
+    def read(self, size=-1):
+        """
+        Read at most size uncompressed bytes, all remaining if size < 0.
+
+        The data is allways returned as bytes since a multibyte character
+        could be cut in two.
+        """
+        chunks = []
+        while size < 0 or size > 0:
+            if self._position >= len(self._data):
+                if not self._load_block():
+                    break
+                continue
+            if size < 0:
+                end = len(self._data)
+            else:
+                end = min(len(self._data), self._position + size)
+                size -= end - self._position
+            chunks.append(self._data[self._position:end])
+            self._position = end
+
+        return b''.join(chunks)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    next = __next__
+
+    def close(self):
+        """Close the file and shut down the thread pool"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "BgzfReader(filename={0},threads={1})".format(
+            self.filename, self.threads
+        )
+
+
+
+class BgzfWriter(object):
+    """
+    Write a BGZF file.
+
+    The data is cut into blocks of BGZF_BLOCK_SIZE bytes that are compressed
+    on a pool of threads and written in order. Since the blocks have a fixed
+    size the block of any uncompressed offset is known before it is
+    compressed, virtual_offset() gives the virtual offset once the block has
+    been written.
+    """
+    def __init__(self, filename=None, fileobj=None, threads=None, level=6):
+        super(BgzfWriter, self).__init__()
+        self.logger = getLogger(__name__)
+        self.filename = filename
+        if fileobj:
+            self._handle = fileobj
+        else:
+            self._handle = open(filename, 'wb')
+
+        if threads is None:
+            threads = DEFAULT_THREADS
+        self.threads = threads
+        self.level = level
+
+        self._executor = None
+        if self.threads > 1 and ThreadPoolExecutor:
+            self.logger.debug("Compressing BGZF blocks with {0} threads".format(
+                self.threads))
+            self._executor = ThreadPoolExecutor(max_workers=self.threads)
+
+        # The number of uncompressed bytes that has been written
+        self.offset = 0
+        # The compressed offset of each block that has been written
+        self.block_offsets = []
+        self._data = []
+        self._buffered = 0
+        self._pending = deque()
+        self._next_block_offset = 0
+        self.closed = False
+
+    def _write_block(self, block):
+        """Write a compressed block to the file"""
+        self.block_offsets.append(self._next_block_offset)
+        self._handle.write(block)
+        self._next_block_offset += len(block)
+
+    def _compress(self, data):
+        """Compress a block, on the thread pool if there is one"""
+        if not self._executor:
+            self._write_block(compress_block(data, self.level))
+            return
+        self._pending.append(
+            self._executor.submit(compress_block, data, self.level))
+        # Keep a few blocks in flight for each thread
+        while len(self._pending) > self.threads * 4:
+            self._write_block(self._pending.popleft().result())
+
+    def write(self, data):
+        """
+        Write bytes to the file.
+
+        Arguments:
+            data (bytes)
+        """
+        self._data.append(data)
+        self._buffered += len(data)
+        self.offset += len(data)
+        if self._buffered < BGZF_BLOCK_SIZE:
+            return
+        data = b''.join(self._data)
+        position = 0
+        while len(data) - position >= BGZF_BLOCK_SIZE:
+            self._compress(data[position:position + BGZF_BLOCK_SIZE])
+            position += BGZF_BLOCK_SIZE
+        data = data[position:]
+        self._data = [data]
+        self._buffered = len(data)
+
+    def virtual_offset(self, offset):
+        """
+        Return the virtual offset of an uncompressed offset.
+
+        The block with the offset has to be written, all blocks are written
+        when the file is closed.
+
+        Arguments:
+            offset (int): The number of uncompressed bytes before a position
+
+        Returns:
+            virtual_offset (int)
+        """
+        block_number, within_block_offset = divmod(offset, BGZF_BLOCK_SIZE)
+        return make_virtual_offset(
+            self.block_offsets[block_number], within_block_offset)
+
+    def close(self):
+        """Compress the last data, write the end of file block and close"""
+        if self.closed:
+            return
+        if self._buffered:
+            self._compress(b''.join(self._data))
+            self._data = []
+            self._buffered = 0
+        while self._pending:
+            self._write_block(self._pending.popleft().result())
+        # The offset of the end of the file is the start of the EOF block
+        self._write_block(BGZF_EOF)
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+        self._handle.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "BgzfWriter(filename={0},threads={1})".format(
+            self.filename, self.threads
+        )
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+cache.py
+
+A cache on disk with parsed variants.
+
+When the same vcf is parsed many times with the same options the parsed
+variants can be stored in a cache directory. The next time the variants are
+loaded from the cache instead of being parsed again.
+
+Each entry in the cache is one file named
+
+    <path hash>_<fingerprint>_<options hash>.vcache
+
+The fingerprint is built from the size and modification time of the vcf and
+a hash of the header and of some blocks spread over the file, so a changed
+vcf gets a new fingerprint. The entries for older versions of a file are
+removed when the new version is stored. The options hash covers the parser
+options that change the variants, like split_variants and samples.
+
+The entry holds pickled batches of variants. To keep the entries small the
+Genotype objects are stored once per batch and the variants only refers to
+them, so variants loaded from the cache shares the Genotype objects for
+identical calls, just like when a genotype cache is used. The shared
+Genotype objects are frozen when they are loaded.
+
+Entries are written to a temporary file that is renamed when all variants
+has been stored, an entry is only created if all variants was read. When
+the total size of the cache is larger than the size limit the least
+recently used entries are removed.
+
+The entries are loaded with pickle so the cache directory should not be
+writable by others.
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+
+from logging import getLogger
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+CACHE_SUFFIX = '.vcache'
+# Change this when the content of the entries changes
+CACHE_VERSION = 1
+# Default size limit of the cache in bytes
+CACHE_SIZE = 2**30
+# Number of variants in each stored batch
+CACHE_BATCH_SIZE = 1000
+# The blocks of the file that are hashed in the fingerprint
+NUMBER_OF_BLOCKS = 16
+BLOCK_SIZE = 65536
+
+
+def get_hash(value):
+    """Return a short hex hash of a string"""
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+
+
+def get_fingerprint(filename, header_lines):
+    """
+    Build a fingerprint that changes when the vcf is changed.
+
+    Arguments:
+        filename (str): Path to the vcf
+        header_lines (list): The header lines of the vcf
+
+    Returns:
+        fingerprint (str)
+    """
+    stat = os.stat(filename)
+    fingerprint = hashlib.sha1()
+    fingerprint.update("{0}:{1}".format(stat.st_size, stat.st_mtime).encode(
+        'utf-8'))
+    fingerprint.update('\n'.join(header_lines).encode('utf-8'))
+    step = max(stat.st_size // NUMBER_OF_BLOCKS, BLOCK_SIZE)
+    with open(filename, 'rb') as vcf:
+        for offset in range(0, stat.st_size, step):
+            vcf.seek(offset)
+            fingerprint.update(vcf.read(BLOCK_SIZE))
+        # The end of the file is where it is most likely to change
+        vcf.seek(max(stat.st_size - BLOCK_SIZE, 0))
+        fingerprint.update(vcf.read(BLOCK_SIZE))
+    return fingerprint.hexdigest()[:16]
+
+
+def genotype_key(genotype):
+    """Return the fields that a Genotype is built from"""
+    return (
+        genotype.allele_1, genotype.allele_2, genotype.phased, genotype._AD,
+        genotype._DP, genotype._GQ, genotype._PL, genotype._RO, genotype._AO,
+        genotype._PR, genotype._SR
+    )
+
+
+def pack_batch(variants):
+    """
+    Pack a batch of variants with the Genotype objects stored once.
+
+    Arguments:
+        variants (list): Variant dictionaries
+
+    Returns:
+        batch (tuple): (variants without genotypes, genotypes, the lists of
+                       individuals, rows with the individuals and genotype
+                       indexes of each variant)
+    """
+    genotype_indexes = {}
+    genotypes = []
+    individual_indexes = {}
+    individual_lists = []
+    packed_variants = []
+    rows = []
+    for variant in variants:
+        packed_variant = dict(variant)
+        genotype_dict = packed_variant.pop('genotypes')
+        individuals = tuple(genotype_dict)
+        individuals_index = individual_indexes.get(individuals)
+        if individuals_index is None:
+            individuals_index = len(individual_lists)
+            individual_indexes[individuals] = individuals_index
+            individual_lists.append(individuals)
+        row = []
+        for genotype in genotype_dict.values():
+            key = genotype_key(genotype)
+            index = genotype_indexes.get(key)
+            if index is None:
+                index = genotype_indexes[key] = len(genotypes)
+                genotypes.append(genotype)
+            row.append(index)
+        packed_variants.append(packed_variant)
+        rows.append((individuals_index, row))
+    return (packed_variants, genotypes, individual_lists, rows)
+
+
+def unpack_batch(batch):
+    """
+    Return the variants of a batch built with pack_batch.
+
+    The Genotype objects are shared between the variants so they are frozen,
+    changing one call would otherwise change all the identical calls.
+
+    Arguments:
+        batch (tuple): A batch from pack_batch
+
+    Returns:
+        variants (list): Variant dictionaries
+    """
+    variants, genotypes, individual_lists, rows = batch
+    for genotype in genotypes:
+        genotype.freeze()
+    get_genotype = genotypes.__getitem__
+    for variant, (individuals_index, row) in zip(variants, rows):
+        variant['genotypes'] = dict(zip(individual_lists[individuals_index],
+                                        map(get_genotype, row)))
+    return variants
+
+
+class VariantCache(object):
+    """
+    A directory with parsed variants.
+
+    Arguments:
+        cache_dir (str): The directory, created if it does not exist
+        max_size (int): The size limit of the cache in bytes
+    """
+    def __init__(self, cache_dir, max_size=CACHE_SIZE):
+        super(VariantCache, self).__init__()
+        self.logger = getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_key(self, filename, header_lines, options):
+        """
+        Return the name of the entry for a vcf parsed with some options.
+
+        Arguments:
+            filename (str): Path to the vcf
+            header_lines (list): The header lines of the vcf
+            options (dict): The parser options that change the variants
+
+        Returns:
+            key (str)
+        """
+        options = dict(options, cache_version=CACHE_VERSION,
+                       python=sys.version_info[0])
+        return '_'.join([
+            get_hash(os.path.abspath(filename)),
+            get_fingerprint(filename, header_lines),
+            get_hash(json.dumps(options, sort_keys=True)),
+        ])
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def _entries(self):
+        return glob.glob(os.path.join(self.cache_dir, '*' + CACHE_SUFFIX))
+
+    def __contains__(self, key):
+        return os.path.exists(self._entry_path(key))
+
+    def load(self, key):
+        """
+        Yield the variants of an entry.
+
+        Arguments:
+            key (str): The name of the entry
+
+        Yields:
+            variant (dict)
+        """
+        path = self._entry_path(key)
+        self.logger.info("Loading variants from {0}".format(path))
+        # Mark the entry as recently used
+        os.utime(path, None)
+        with open(path, 'rb') as entry:
+            while True:
+                try:
+                    batch = pickle.load(entry)
+                except EOFError:
+                    break
+                for variant in unpack_batch(batch):
+                    yield variant
+
+    def store(self, key, variants, batch_size=CACHE_BATCH_SIZE):
+        """
+        Store variants in the cache while they are yielded.
+
+        A batch is written before its variants are yielded so changes to
+        the variants does not end up in the cache. The entry is only
+        created if all variants are consumed.
+
+        Arguments:
+            key (str): The name of the entry
+            variants (iterable): The parsed variants
+            batch_size (int): Number of variants in each stored batch
+
+        Yields:
+            variant (dict): The same variants
+        """
+        path = self._entry_path(key)
+        tmp_path = "{0}.tmp{1}".format(path, os.getpid())
+        finished = False
+        try:
+            with open(tmp_path, 'wb') as entry:
+                batch = []
+                for variant in variants:
+                    batch.append(variant)
+                    if len(batch) == batch_size:
+                        pickle.dump(pack_batch(batch), entry,
+                                    pickle.HIGHEST_PROTOCOL)
+                        for stored_variant in batch:
+                            yield stored_variant
+                        batch = []
+                if batch:
+                    pickle.dump(pack_batch(batch), entry,
+                                pickle.HIGHEST_PROTOCOL)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+            finished = True
+            self.logger.info("Stored variants in {0}".format(path))
+        finally:
+            if not finished and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.remove_stale(key)
+        self.evict()
+        for variant in batch:
+            yield variant
+
+    def remove_stale(self, key):
+        """Remove the entries for older versions of the same file"""
+        path_hash, fingerprint, options_hash = key.split('_')
+        for path in self._entries():
+            name = os.path.basename(path)[:-len(CACHE_SUFFIX)]
+            entry_path_hash, entry_fingerprint = name.split('_')[:2]
+            if entry_path_hash == path_hash and entry_fingerprint != fingerprint:
+                self.logger.info("Removing outdated entry {0}".format(path))
+                os.remove(path)
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits"""
+        entries = []
+        for path in self._entries():
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total_size = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            self.logger.info("Removing {0} from the cache".format(path))
+            os.remove(path)
+            total_size -= size
+
+    def size(self):
+        """Return the total size of the entries in bytes"""
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def __repr__(self):
+        return "VariantCache(cache_dir={0},max_size={1})".format(
+            self.cache_dir, self.max_size)
@@ -17,9 +17,10 @@ import click
 
 from pprint import pprint as pp
 from datetime import datetime
-from codecs import open
 
 from vcf_parser import __version__, VCFParser
+from vcf_parser.regions import parse_region
+from vcf_parser.writer import VCFWriter
 
 
 def print_version(ctx, param, value):
@@ -37,9 +38,39 @@ def print_version(ctx, param, value):
     ctx.exit()
 
 
+class DefaultCommandGroup(click.Group):
+    """
+    A group of commands that falls back on a default command.
+    
+    This makes it possible to run 'vcf_parser <vcf_file>' as before while 
+    also having subcommands like 'vcf_parser index <vcf_file>'.
+    """
+    def __init__(self, *args, **kwargs):
+        self.default_command = kwargs.pop('default_command', None)
+        super(DefaultCommandGroup, self).__init__(*args, **kwargs)
+    
+    def parse_args(self, ctx, args):
+        if (args and self.default_command and args[0] not in self.commands 
+                and args[0] not in ('--help', '-h')):
+            args.insert(0, self.default_command)
+        return super(DefaultCommandGroup, self).parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup, default_command='parse')
+def cli():
+    """
+    Tool for parsing vcf files.
+    
+    If no command is given the vcf is parsed and printed, see 
+    'vcf_parser parse --help'.
+    For more information, please see github.com/moonso/vcf_parser.
+    """
+    pass
+
+
 ###         This is the main script         ###
 
-@click.command()
+@cli.command()
 @click.argument('variant_file', 
                     nargs=1, 
                     type=click.Path(),
@@ -55,7 +86,8 @@ def print_version(ctx, param, value):
 )
 @click.option('-o', '--outfile', 
                     type=click.Path(exists=False),
-                    help='Path to a outfile.'
+                    help='Path to a outfile. If it ends with .gz the vcf is '\
+                    'compressed with BGZF and a tabix index is written.'
 )
 @click.option('-a',"--allele_symbol",
                 default='0',
@@ -74,6 +106,14 @@ def print_version(ctx, param, value):
                 is_flag=True,
                 help='Do not print vcf data.'
 )
+@click.option('--filter', 'filter_expression',
+                help="Only keep the variants that matches a filter "\
+                "expression, like 'QUAL > 30 and INFO.AF < 0.01'."
+)
+@click.option('--regions',
+                help="Only keep the variants with POS in these regions. A "\
+                "BED file or regions like '1:10000-20000' separated by spaces."
+)
 @click.option('--version',
                 is_flag=True,
                 callback=print_version,
@@ -90,8 +130,8 @@ def print_version(ctx, param, value):
                                         'CRITICAL']),
                     help="Set the level of log output."
 )
-def cli(variant_file, vep, split, outfile, verbose, silent, check_info,
-        allele_symbol, logfile, loglevel):
+def parse(variant_file, vep, split, outfile, verbose, silent, check_info,
+        allele_symbol, logfile, loglevel, filter_expression, regions):
     """
     Tool for parsing vcf files.
     
@@ -115,55 +155,230 @@ def cli(variant_file, vep, split, outfile, verbose, silent, check_info,
     #         if not line.startswith('#'):
     #             nr_of_variants += 1
     
-    if variant_file == '-':
-        logger.info("Start parsing variants from stdin")
-        my_parser = VCFParser(
-            fsock=sys.stdin, 
-            split_variants=split,
-            check_info=check_info, 
-            allele_symbol=allele_symbol
-        )
-    else:
-        logger.info("Start parsing variants from file {0}".format(variant_file))
-        my_parser = VCFParser(
-            infile = variant_file,
-            split_variants=split, 
-            check_info=check_info, 
-            allele_symbol=allele_symbol
-        )
-
+    # The variants are only parsed on demand when they are written, lines
+    # that are not changed are then written as they are. The vcf is read
+    # in binary mode since that is faster.
+    write_output = bool(outfile) or not silent
+    
+    try:
+        if regions and not os.path.exists(regions):
+            regions = [parse_region(region) for region in regions.split()]
+        if variant_file == '-':
+            logger.info("Start parsing variants from stdin")
+            my_parser = VCFParser(
+                fsock=sys.stdin, 
+                split_variants=split,
+                check_info=check_info, 
+                allele_symbol=allele_symbol,
+                lazy=write_output,
+                binary=True,
+                filter=filter_expression,
+                regions=regions
+            )
+        else:
+            logger.info("Start parsing variants from file {0}".format(variant_file))
+            my_parser = VCFParser(
+                infile = variant_file,
+                split_variants=split, 
+                check_info=check_info, 
+                allele_symbol=allele_symbol,
+                lazy=write_output,
+                binary=True,
+                filter=filter_expression,
+                regions=regions
+            )
+    except SyntaxError as e:
+        logger.error(e)
+        sys.exit(1)
+    
+    writer = None
     if outfile:
-        f = open(outfile, 'w', encoding='utf-8')
         logger.info("Printing vcf to file {0}".format(outfile))
-    
-    if not silent:
+        writer = VCFWriter(outfile, my_parser.metadata)
+    elif not silent:
         logger.info("Printing vcf to stdout")
+        writer = VCFWriter(sys.stdout, my_parser.metadata)
     else:
         logger.info("Skip printing since silent is active")
     
-    for line in my_parser.metadata.print_header():
-        if outfile:
-            f.write(line+'\n')
-        else:
-            if not silent:
-                print(line)
     try:
+        if writer:
+            writer.write_header()
         for variant in my_parser:
-            variant_line = '\t'.join([variant[head] for head in my_parser.header])
-            if outfile:
-                f.write(variant_line + '\n')
-            else:
-                if not silent:
-                    print(variant_line)
+            if writer:
+                writer.write(variant)
             nr_of_variants += 1
     except SyntaxError as e:
         print(e)
+    finally:
+        if writer:
+            writer.close()
 
     logger.info('Number of variants: {0}'.format(nr_of_variants))
     logger.info('Time to parse file: {0}'.format(str(datetime.now() - start)))
     # print('Number of variants: {0}'.format(nr_of_variants))
     # print('Time to parse file: {0}'.format(str(datetime.now() - start)))
+
+
+@cli.command()
+@click.argument('variant_file', 
+                    nargs=1, 
+                    type=click.Path(exists=True),
+                    metavar='<vcf_file>'
+)
+@click.option('-f', '--force', 
+                is_flag=True,
+                help='Overwrite an existing index.'
+)
+@click.option('-l', '--logfile',
+                    type=click.Path(exists=False),
+                    help="Path to log file. If none logging is "\
+                          "printed to stderr."
+)
+@click.option('--loglevel',
+                    type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR', 
+                                        'CRITICAL']),
+                    help="Set the level of log output."
+)
+def index(variant_file, force, logfile, loglevel):
+    """
+    Build an index for a sorted vcf.
     
+    Works for both uncompressed and bgzipped vcf files. The index is written
+    next to the vcf with the suffix .vpi and is used by the parser for 
+    region queries.
+    """
+    from vcf_parser import logger, init_log
+    from vcf_parser.index import (build_index, get_index_path)
+    
+    init_log(logger, logfile, loglevel)
+    
+    index_file = get_index_path(variant_file)
+    if os.path.exists(index_file) and not force:
+        logger.error("Index {0} already exists, use --force to "\
+                     "overwrite it".format(index_file))
+        sys.exit(1)
+    
+    start = datetime.now()
+    try:
+        build_index(variant_file, outfile=index_file)
+    except (SyntaxError, IOError) as e:
+        logger.error(e)
+        sys.exit(1)
+    
+    logger.info('Time to index file: {0}'.format(str(datetime.now() - start)))
+
+
+
+@cli.command()
+@click.argument('variant_file', 
+                    nargs=1, 
+                    type=click.Path(exists=True),
+                    metavar='<vcf_file>'
+)
+@click.option('--to', 'output_format',
+                type=click.Choice(['columnar']),
+                default='columnar',
+                show_default=True,
+                help='The format to convert to.'
+)
+@click.option('-o', '--outdir', 
+                type=click.Path(exists=False),
+                help='Directory for the converted vcf. Default is '\
+                      '<vcf_file>.columnar'
+)
+@click.option('-f', '--force', 
+                is_flag=True,
+                help='Overwrite an existing converted vcf.'
+)
+@click.option('-l', '--logfile',
+                    type=click.Path(exists=False),
+                    help="Path to log file. If none logging is "\
+                          "printed to stderr."
+)
+@click.option('--loglevel',
+                    type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR', 
+                                        'CRITICAL']),
+                    help="Set the level of log output."
+)
+def convert(variant_file, output_format, outdir, force, logfile, loglevel):
+    """
+    Convert a vcf to a format that is faster to read.
+    
+    The columnar format is a directory with memory mapped numpy columns 
+    that is read with vcf_parser.ColumnarReader. numpy has to be installed.
+    """
+    import shutil
+    from vcf_parser import logger, init_log
+    from vcf_parser.columnar import (convert_to_columnar, get_columnar_path)
+    
+    init_log(logger, logfile, loglevel)
+    
+    outdir = outdir or get_columnar_path(variant_file)
+    if os.path.exists(outdir):
+        if not force:
+            logger.error("{0} already exists, use --force to "\
+                         "overwrite it".format(outdir))
+            sys.exit(1)
+        shutil.rmtree(outdir)
+    
+    start = datetime.now()
+    try:
+        convert_to_columnar(variant_file, outdir=outdir)
+    except (SyntaxError, IOError, ImportError) as e:
+        logger.error(e)
+        sys.exit(1)
+    
+    logger.info('Time to convert file: {0}'.format(str(datetime.now() - start)))
+
+
+@cli.command()
+@click.argument('variant_files', 
+                    nargs=-1, 
+                    type=click.Path(exists=True),
+                    metavar='<vcf_file> <vcf_file> ...'
+)
+@click.option('-o', '--outfile', 
+                    type=click.Path(exists=False),
+                    help='Path to a outfile. Default is stdout. If it ends '\
+                    'with .gz the vcf is compressed with BGZF and a tabix '\
+                    'index is written.'
+)
+@click.option('-l', '--logfile',
+                    type=click.Path(exists=False),
+                    help="Path to log file. If none logging is "\
+                          "printed to stderr."
+)
+@click.option('--loglevel',
+                    type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR', 
+                                        'CRITICAL']),
+                    help="Set the level of log output."
+)
+def merge(variant_files, outfile, logfile, loglevel):
+    """
+    Merge coordinate sorted vcf files.
+    
+    The files should have the same individuals, like one vcf per chromosome
+    from the same caller. The contigs are ordered as in the headers.
+    """
+    from vcf_parser import logger, init_log
+    from vcf_parser.merge import write_merged
+    
+    init_log(logger, logfile, loglevel)
+    
+    start = datetime.now()
+    if outfile:
+        logger.info("Printing merged vcf to file {0}".format(outfile))
+    try:
+        nr_of_variants = write_merged(list(variant_files), 
+                                      outfile or sys.stdout)
+    except (SyntaxError, IOError) as e:
+        logger.error(e)
+        sys.exit(1)
+    
+    logger.info('Number of variants: {0}'.format(nr_of_variants))
+    logger.info('Time to merge files: {0}'.format(str(datetime.now() - start)))
+
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,991 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+columnar.py
+
+Convert a vcf to a directory of numpy columns and read it back.
+
+Parsing a large vcf takes minutes, a converted vcf is opened in milliseconds
+since the columns are memory mapped with np.load(mmap_mode='r'). The
+directory looks like:
+
+    meta.json             The header lines, samples, string dictionaries...
+    chrom.npy             int32 codes into meta['contigs']
+    pos.npy               int64
+    qual.npy              float32, nan if missing
+    filter.npy            int32 codes into meta['filters']
+    id, ref, alt          String columns (see below)
+    gt.npy                int16 (variants, samples, 2), -1 for missing alleles
+                          and -2 for the second allele of haploid calls
+    dp.npy, gq.npy        int32 (variants, samples), -1 if missing
+    info_<KEY>.npy        Typed INFO columns for Flags and the keys with
+                          Number=1 or Number=A, see meta['info_columns'].
+                          For Number=A it is the value of the first
+                          alternative allele.
+    qual                  QUAL as it is written, a string column
+    info, calls           The INFO column and the FORMAT and genotype 
+                          columns, compressed string columns (see below)
+
+The variants are converted in chunks and meta['chunks'] holds a zone map
+for each chunk, the min and max POS, QUAL and numeric INFO values, the
+contigs and filters and so on (see predicates.py). ColumnarReader.query
+uses the zone maps to skip the chunks where no variant can match.
+
+A string column is stored as <name>.data.npy (uint8 with all the strings
+after each other) and <name>.offsets.npy (int64 with the start of each
+string and the end of the last one). A compressed string column is stored 
+as <name>.blocks.npy (uint8 with zlib compressed blocks of 
+meta['string_block_size'] strings joined with newlines) and 
+<name>.block_offsets.npy (int64 with the start of each block and the end of 
+the last one).
+
+ColumnarReader builds the variants from the columns, only the INFO and the
+genotype calls are split from the text. The genotype calls are kept as text
+since the gt, dp and gq columns can not hold all FORMAT keys, phasing or 
+calls with more than two alleles. The reader gives exactly the same variants
+as VCFParser, with the same options for splitting and so on.
+
+If the vcf is sorted meta['contig_rows'] holds the first and last row of 
+each contig, so region queries can use a binary search on pos.
+
+numpy is needed for this module.
+"""
+
+import os
+import json
+import zlib
+import shutil
+
+from logging import getLogger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from vcf_parser.parser import VCFParser
+from vcf_parser.batches import (check_numpy, build_batch, iter_batches,
+                                VariantBatch, ALLELE_DTYPE, BATCH_SIZE,
+                                BATCH_FIELDS)
+from vcf_parser.predicates import (OPERATORS, check_predicates,
+                                   chunk_may_match, info_matches,
+                                   min_max, parse_number)
+from vcf_parser.utils import (split_variant_line, build_info_dict)
+
+COLUMNAR_SUFFIX = '.columnar'
+COLUMNAR_FORMAT = 'vcf_parser_columnar'
+COLUMNAR_VERSION = 3
+META_FILE = 'meta.json'
+# Number of variants that are converted at a time, each chunk gets a zone map
+CHUNK_SIZE = 8192
+# Number of strings in each block of a compressed string column
+STRING_BLOCK_SIZE = 256
+# The string columns that are compressed
+COMPRESSED_COLUMNS = ('info', 'calls')
+# The zlib level for the compressed string columns, the fastest level since
+# the genotype calls compress well anyway
+COMPRESSION_LEVEL = 1
+# The value for missing integers in the INFO columns
+MISSING_INTEGER = -2147483648
+
+# The numpy types for the INFO types that gets a column
+INFO_TYPES = {
+    'Integer': 'int32',
+    'Float': 'float32',
+    'Flag': 'bool',
+}
+
+
+def get_columnar_path(filename):
+    """Return the default path for a converted vcf"""
+    return filename + COLUMNAR_SUFFIX
+
+
+def get_info_columns(extra_info):
+    """
+    Find the INFO keys that can be stored as typed columns.
+
+    Arguments:
+        extra_info (dict): HeaderParser.extra_info
+
+    Returns:
+        info_columns (dict): INFO key -> numpy type name
+    """
+    info_columns = {}
+    for info_key, info in extra_info.items():
+        info_type = info.get('Type')
+        if info_type == 'Flag' or (info.get('Number') in ('1', 'A') and
+                                   info_type in INFO_TYPES):
+            info_columns[info_key] = INFO_TYPES[info_type]
+    return info_columns
+
+
+def get_numeric_info_keys(extra_info):
+    """Return the INFO keys with Integer or Float values"""
+    return [info_key for info_key, info in extra_info.items()
+            if info.get('Type') in ('Integer', 'Float')]
+
+
+def get_info_statistics(info_dicts, info_keys):
+    """
+    Find the min and max value of numeric INFO keys.
+
+    All values are used, also for keys with one value per allele.
+
+    Arguments:
+        info_dicts (list): The parsed INFO fields
+        info_keys (list): The INFO keys to check
+
+    Returns:
+        statistics (dict): INFO key -> [min, max], None if there are no values
+    """
+    statistics = {}
+    for info_key in info_keys:
+        values = []
+        for info_dict in info_dicts:
+            for value in info_dict.get(info_key) or []:
+                number = parse_number(value)
+                if number is not None:
+                    values.append(number)
+        statistics[info_key] = min_max(values)
+    return statistics
+
+
+def parse_info_value(values, dtype):
+    """Convert the values of an INFO key to a value for a typed column"""
+    if dtype == 'bool':
+        return values is not None
+    if not values:
+        if dtype == 'int32':
+            return MISSING_INTEGER
+        return float('nan')
+    try:
+        if dtype == 'int32':
+            return int(values[0])
+        return float(values[0])
+    except ValueError:
+        if dtype == 'int32':
+            return MISSING_INTEGER
+        return float('nan')
+
+
+def parse_qual(qual):
+    """Return QUAL as a float, nan if it is missing"""
+    try:
+        return float(qual)
+    except ValueError:
+        return float('nan')
+
+
+class ColumnWriter(object):
+    """
+    Write an array to a .npy file a piece at a time.
+
+    The pieces are written to a temporary file, when the writer is closed
+    the .npy header is written with the final shape followed by the data.
+    """
+    def __init__(self, path, dtype, shape=()):
+        super(ColumnWriter, self).__init__()
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.length = 0
+        self._tmp_path = path + '.part'
+        self._handle = open(self._tmp_path, 'wb')
+
+    def append(self, values):
+        """Append an array, or a list, with values"""
+        array = np.ascontiguousarray(values, dtype=self.dtype)
+        self._handle.write(array.tobytes())
+        self.length += len(array)
+
+    def close(self):
+        """Write the .npy file"""
+        self._handle.close()
+        header = {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.length,) + self.shape,
+        }
+        with open(self.path, 'wb') as npy_file:
+            np.lib.format.write_array_header_1_0(npy_file, header)
+            with open(self._tmp_path, 'rb') as data:
+                shutil.copyfileobj(data, npy_file)
+        os.remove(self._tmp_path)
+
+
+class StringColumnWriter(object):
+    """Write a string column as a data and a offsets .npy file"""
+    def __init__(self, path):
+        super(StringColumnWriter, self).__init__()
+        self.data = ColumnWriter(path + '.data.npy', 'uint8')
+        self.offsets = ColumnWriter(path + '.offsets.npy', 'int64')
+        self.offsets.append([0])
+        self.end = 0
+
+    def append(self, strings):
+        """Append a list of strings"""
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = []
+        for value in encoded:
+            self.end += len(value)
+            offsets.append(self.end)
+        self.data.append(np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        self.offsets.append(offsets)
+
+    def close(self):
+        self.data.close()
+        self.offsets.close()
+
+
+class StringColumn(object):
+    """
+    Read a string column.
+
+    Arguments:
+        data (numpy.ndarray): uint8 array with the strings
+        offsets (numpy.ndarray): int64 array with the string boundaries
+    """
+    def __init__(self, data, offsets):
+        super(StringColumn, self).__init__()
+        self.data = data
+        self.offsets = offsets
+
+    def lengths(self):
+        """Return the length in bytes of each string"""
+        return np.diff(self.offsets)
+
+    def slice(self, start, end):
+        """Return a list with the strings from start to end"""
+        end = min(end, len(self))
+        if start >= end:
+            return []
+        offsets = self.offsets[start:end + 1]
+        first = offsets[0]
+        data = self.data[first:offsets[-1]].tobytes()
+        positions = (offsets - first).tolist()
+        return [
+            data[positions[i]:positions[i + 1]].decode('utf-8')
+            for i in range(len(positions) - 1)
+        ]
+
+    def take(self, rows):
+        """Return a list with the strings in some rows, rows is sorted"""
+        if rows and rows[-1] - rows[0] + 1 == len(rows):
+            return self.slice(rows[0], rows[-1] + 1)
+        return [self[row] for row in rows]
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes(
+            ).decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class CompressedStringColumnWriter(object):
+    """
+    Write a string column in zlib compressed blocks.
+
+    Each block holds block_size strings joined with newlines, so the strings
+    can not hold newlines.
+    """
+    def __init__(self, path, block_size=STRING_BLOCK_SIZE):
+        super(CompressedStringColumnWriter, self).__init__()
+        self.data = ColumnWriter(path + '.blocks.npy', 'uint8')
+        self.offsets = ColumnWriter(path + '.block_offsets.npy', 'int64')
+        self.offsets.append([0])
+        self.block_size = block_size
+        self.end = 0
+        self._strings = []
+
+    def append(self, strings):
+        """Append a list of strings"""
+        self._strings.extend(strings)
+        start = 0
+        while len(self._strings) - start >= self.block_size:
+            self._write_block(self._strings[start:start + self.block_size])
+            start += self.block_size
+        del self._strings[:start]
+
+    def _write_block(self, strings):
+        block = zlib.compress('\n'.join(strings).encode('utf-8'),
+                              COMPRESSION_LEVEL)
+        self.end += len(block)
+        self.data.append(np.frombuffer(block, dtype=np.uint8))
+        self.offsets.append([self.end])
+
+    def close(self):
+        if self._strings:
+            self._write_block(self._strings)
+            self._strings = []
+        self.data.close()
+        self.offsets.close()
+
+
+class CompressedStringColumn(StringColumn):
+    """
+    Read a compressed string column.
+
+    The last block that was read is kept decompressed, so reading the rows
+    in order only decompresses each block once.
+
+    Arguments:
+        data (numpy.ndarray): uint8 array with the compressed blocks
+        offsets (numpy.ndarray): int64 array with the block boundaries
+        block_size (int): The number of strings in each block
+        length (int): The number of strings
+    """
+    def __init__(self, data, offsets, block_size, length):
+        super(CompressedStringColumn, self).__init__(data, offsets)
+        self.block_size = block_size
+        self.length = length
+        self._block_number = None
+        self._block = None
+
+    def block(self, number):
+        """Return the strings in a block"""
+        if number != self._block_number:
+            start, end = self.offsets[number], self.offsets[number + 1]
+            self._block = zlib.decompress(self.data[start:end].tobytes()
+                                          ).decode('utf-8').split('\n')
+            self._block_number = number
+        return self._block
+
+    def lengths(self):
+        """Return the length in bytes of each string"""
+        return np.array([len(string.encode('utf-8')) 
+                         for string in self.slice(0, len(self))], 
+                        dtype=np.int64)
+
+    def slice(self, start, end):
+        """Return a list with the strings from start to end"""
+        end = min(end, len(self))
+        strings = []
+        while start < end:
+            number, first = divmod(start, self.block_size)
+            last = min(self.block_size, first + end - start)
+            strings.extend(self.block(number)[first:last])
+            start += last - first
+        return strings
+
+    def __getitem__(self, index):
+        number, position = divmod(index, self.block_size)
+        return self.block(number)[position]
+
+    def __len__(self):
+        return self.length
+
+
+def convert_to_columnar(vcf_file, outdir=None, chunk_size=CHUNK_SIZE):
+    """
+    Convert a vcf to a directory with numpy columns.
+
+    The columns are written to a temporary directory that is renamed when
+    the conversion is done, so a interrupted conversion never leaves a
+    half written directory behind.
+
+    Arguments:
+        vcf_file (str): Path to a vcf or bgzipped vcf
+        outdir (str): The directory to create, defaults to <vcf>.columnar
+        chunk_size (int): Number of variants that are converted at a time
+
+    Returns:
+        outdir (str): The path to the converted vcf
+    """
+    logger = getLogger(__name__)
+    check_numpy()
+    outdir = outdir or get_columnar_path(vcf_file)
+    if os.path.exists(outdir):
+        raise IOError("{0} already exists".format(outdir))
+
+    parser = VCFParser(infile=vcf_file, binary=True)
+    header_parser = parser.metadata
+    samples = list(header_parser.individuals)
+    number_of_samples = len(samples)
+    info_columns = get_info_columns(header_parser.extra_info)
+    numeric_keys = get_numeric_info_keys(header_parser.extra_info)
+    info_fields = frozenset(info_columns).union(numeric_keys)
+
+    tmp_dir = "{0}.tmp{1}".format(outdir, os.getpid())
+    os.makedirs(tmp_dir)
+    logger.info("Converting {0} to {1}".format(vcf_file, outdir))
+
+    def column_path(name):
+        return os.path.join(tmp_dir, name)
+
+    finished = False
+    try:
+        writers = {
+            'chrom': ColumnWriter(column_path('chrom.npy'), 'int32'),
+            'pos': ColumnWriter(column_path('pos.npy'), 'int64'),
+            'qual': ColumnWriter(column_path('qual.npy'), 'float32'),
+            'filter': ColumnWriter(column_path('filter.npy'), 'int32'),
+            'gt': ColumnWriter(column_path('gt.npy'), ALLELE_DTYPE,
+                               (number_of_samples, 2)),
+            'dp': ColumnWriter(column_path('dp.npy'), 'int32',
+                               (number_of_samples,)),
+            'gq': ColumnWriter(column_path('gq.npy'), 'int32',
+                               (number_of_samples,)),
+        }
+        for info_key, dtype in info_columns.items():
+            writers['info_' + info_key] = ColumnWriter(
+                column_path('info_{0}.npy'.format(info_key)), dtype)
+        string_writers = dict(
+            (name, StringColumnWriter(column_path(name)))
+            for name in ('id', 'ref', 'alt', 'qual')
+        )
+        for name in COMPRESSED_COLUMNS:
+            string_writers[name] = CompressedStringColumnWriter(
+                column_path(name))
+
+        contigs = {}
+        filters = {}
+        chunks = []
+        number_of_variants = 0
+        # The first and last row of each contig, if the vcf is sorted
+        contig_rows = {}
+        is_sorted = True
+        last_contig = None
+        last_position = None
+        max_ref_length = 0
+        for lines in _chunks(parser._variant_lines(), chunk_size):
+            variant_lines = [split_variant_line(line, header_parser)
+                             for line in lines]
+            batch = build_batch(variant_lines, header_parser, ('DP', 'GQ'))
+            contig_codes = [contigs.setdefault(columns[0], len(contigs))
+                            for columns in variant_lines]
+            quals = [parse_qual(columns[5]) for columns in variant_lines]
+            filter_codes = [filters.setdefault(columns[6], len(filters))
+                            for columns in variant_lines]
+            non_ref = (batch.alleles > 0).any(axis=(1, 2))
+
+            writers['chrom'].append(contig_codes)
+            writers['pos'].append(batch.pos)
+            writers['qual'].append(quals)
+            writers['filter'].append(filter_codes)
+            writers['gt'].append(batch.alleles)
+            writers['dp'].append(batch.dp)
+            writers['gq'].append(batch.gq)
+
+            info_dicts = []
+            if info_fields:
+                info_dicts = [build_info_dict(columns[7], info_fields)
+                              for columns in variant_lines]
+                for info_key, dtype in info_columns.items():
+                    writers['info_' + info_key].append([
+                        parse_info_value(info_dict.get(info_key), dtype)
+                        for info_dict in info_dicts
+                    ])
+
+            chunks.append({
+                'start': number_of_variants,
+                'end': number_of_variants + len(lines),
+                'contigs': sorted(set(contig_codes)),
+                'pos': [int(batch.pos.min()), int(batch.pos.max())],
+                'qual': min_max(quals),
+                'filters': sorted(set(filter_codes)),
+                'non_ref': sorted(set(bool(value) for value in non_ref)),
+                'info': get_info_statistics(info_dicts, numeric_keys),
+            })
+
+            for row, contig, position in zip(
+                    range(number_of_variants, number_of_variants + len(lines)),
+                    contig_codes, batch.pos.tolist()):
+                if contig != last_contig:
+                    if contig in contig_rows:
+                        is_sorted = False
+                    contig_rows[contig] = [row, row + 1]
+                else:
+                    if position < last_position:
+                        is_sorted = False
+                    contig_rows[contig][1] = row + 1
+                last_contig, last_position = contig, position
+            max_ref_length = max(max_ref_length, 
+                                 max(len(ref) for ref in batch.ref))
+
+            string_writers['id'].append([columns[2] for columns in variant_lines])
+            string_writers['ref'].append(list(batch.ref))
+            string_writers['alt'].append(list(batch.alt))
+            string_writers['qual'].append([columns[5] 
+                                           for columns in variant_lines])
+            string_writers['info'].append([columns[7] 
+                                           for columns in variant_lines])
+            string_writers['calls'].append(['\t'.join(columns[8:]) 
+                                            for columns in variant_lines])
+            number_of_variants += len(lines)
+            logger.debug("{0} variants converted".format(number_of_variants))
+
+        for writer in list(writers.values()) + list(string_writers.values()):
+            writer.close()
+
+        meta = {
+            'format': COLUMNAR_FORMAT,
+            'version': COLUMNAR_VERSION,
+            'source': {
+                'path': os.path.abspath(vcf_file),
+                'size': os.path.getsize(vcf_file),
+                'mtime': os.path.getmtime(vcf_file),
+            },
+            'header_lines': parser.header_lines,
+            'samples': samples,
+            'variants': number_of_variants,
+            'chunk_size': chunk_size,
+            'contigs': sorted(contigs, key=contigs.get),
+            'filters': sorted(filters, key=filters.get),
+            'info_columns': info_columns,
+            'chunks': chunks,
+            'contig_rows': (dict((contig, contig_rows[code]) 
+                                 for contig, code in contigs.items())
+                            if is_sorted else None),
+            'max_ref_length': max_ref_length,
+            'string_block_size': STRING_BLOCK_SIZE,
+        }
+        with open(column_path(META_FILE), 'w') as meta_file:
+            json.dump(meta, meta_file, indent=1)
+
+        os.rename(tmp_dir, outdir)
+        finished = True
+    finally:
+        parser.vcf.close()
+        if not finished:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    logger.info("{0} variants converted to {1}".format(
+        number_of_variants, outdir))
+    return outdir
+
+
+def _chunks(lines, chunk_size):
+    """Yield lists with chunk_size lines"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_meta(directory):
+    """
+    Read the meta data of a converted vcf.
+
+    Raises:
+        IOError: If the directory is not a converted vcf
+    """
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        raise IOError("{0} is not a converted vcf".format(directory))
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('format') != COLUMNAR_FORMAT:
+        raise IOError("{0} is not a converted vcf".format(directory))
+    if meta.get('version') != COLUMNAR_VERSION:
+        raise IOError("{0} was converted with version {1} of the format, "
+                      "convert the vcf again".format(
+                          directory, meta.get('version')))
+    return meta
+
+
+class ColumnarReader(VCFParser):
+    """
+    Read a vcf that has been converted with convert_to_columnar.
+
+    The reader works like a VCFParser, iterate over it to get the variant
+    dictionaries, and takes the same options for how the variants are
+    parsed. Region queries (fetch) and batches (iter_batches) use the
+    columns directly.
+    """
+    def __init__(self, directory, split_variants=False, check_info=False,
+                 allele_symbol='0', lazy=False, info_fields=None,
+                 format_fields=None, samples=None, genotype_cache_size=None):
+        check_numpy()
+        meta = read_meta(directory)
+        fileformat = meta['header_lines'][0].split('=', 1)[-1]
+        super(ColumnarReader, self).__init__(
+            fileformat=fileformat,
+            split_variants=split_variants,
+            check_info=check_info,
+            allele_symbol=allele_symbol,
+            lazy=lazy,
+            info_fields=info_fields,
+            format_fields=format_fields,
+            samples=samples,
+            genotype_cache_size=genotype_cache_size
+        )
+        self.directory = directory
+        self.meta = meta
+        self.number_of_variants = meta['variants']
+        self._columns = {}
+
+        for line in meta['header_lines']:
+            if line.startswith('##'):
+                self.metadata.parse_meta_data(line)
+            elif line.startswith('#'):
+                self.metadata.parse_header_line(line)
+        self.header_lines = list(meta['header_lines'])
+        self.individuals = self.metadata.individuals
+        self.header = self.metadata.header
+        self.vep_header = self.metadata.vep_columns
+        # The position of the individuals in the sample columns
+        self.sample_indexes = [meta['samples'].index(individual)
+                               for individual in self.individuals]
+
+    def column(self, name):
+        """
+        Return a memory mapped column.
+
+        Arguments:
+            name (str): Name of the column, like 'pos', 'gt' or 'info_AF'
+
+        Returns:
+            column (numpy.ndarray)
+        """
+        if name not in self._columns:
+            self._columns[name] = np.load(
+                os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def strings(self, name):
+        """
+        Return a string column, like 'id', 'ref', 'alt', 'qual', 'info' or
+        'calls'
+        """
+        if name in COMPRESSED_COLUMNS:
+            return CompressedStringColumn(
+                self.column(name + '.blocks'), 
+                self.column(name + '.block_offsets'),
+                self.meta['string_block_size'], self.number_of_variants)
+        return StringColumn(self.column(name + '.data'),
+                            self.column(name + '.offsets'))
+
+    def info(self, info_key):
+        """
+        Return the typed column for an INFO key.
+
+        Integers that are missing have the value MISSING_INTEGER and
+        floats are nan.
+        """
+        if info_key not in self.meta['info_columns']:
+            raise KeyError("There is no column for INFO key {0}".format(
+                info_key))
+        return self.column('info_' + info_key)
+
+    def _row_columns(self, rows=None):
+        """
+        Build the columns of the variant lines from the stored columns.
+
+        Arguments:
+            rows (list): The sorted rows to read, all rows if None
+
+        Yields:
+            columns (list): The vcf columns of a variant, with all samples
+        """
+        if rows is None:
+            rows = range(self.number_of_variants)
+        contigs = self.meta['contigs']
+        filters = self.meta['filters']
+        strings = [self.strings(name) for name in 
+                   ('id', 'ref', 'alt', 'qual', 'info')]
+        calls = self.strings('calls')
+        has_calls = self.metadata.number_of_columns > 8
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = list(rows[start:start + CHUNK_SIZE])
+            index = np.array(chunk, dtype=np.int64)
+            chroms = [contigs[code] for code in 
+                      self.column('chrom')[index].tolist()]
+            positions = [str(position) for position in 
+                         self.column('pos')[index].tolist()]
+            filter_names = [filters[code] for code in 
+                            self.column('filter')[index].tolist()]
+            ids, refs, alts, quals, infos = [column.take(chunk) 
+                                             for column in strings]
+            chunk_calls = calls.take(chunk)
+            for row in range(len(chunk)):
+                columns = [chroms[row], positions[row], ids[row], refs[row],
+                           alts[row], quals[row], filter_names[row], 
+                           infos[row]]
+                if has_calls:
+                    columns.extend(chunk_calls[row].split('\t'))
+                yield columns
+
+    def _variant_lines(self, rows=None):
+        """
+        Yield the variant lines.
+
+        Arguments:
+            rows (list): The sorted rows to read, all rows if None
+        """
+        for columns in self._row_columns(rows):
+            yield '\t'.join(columns)
+
+    def _row_variants(self, rows=None):
+        """
+        Yield the variants, built from the columns.
+
+        Arguments:
+            rows (list): The sorted rows to read, all rows if None
+        """
+        sample_columns = self.metadata.columns
+        for columns in self._row_columns(rows):
+            if self.lazy:
+                variants = self._build_variants('\t'.join(columns))
+            else:
+                if sample_columns is not None:
+                    columns = [columns[column] for column in sample_columns]
+                variants = self._build_variants(None, columns)
+            for variant in variants:
+                yield variant
+
+    def __iter__(self):
+        for variant in self._row_variants():
+            yield variant
+
+    def region_rows(self, chrom, start=None, end=None):
+        """
+        Find the rows of the variants that overlap a region.
+
+        Coordinates are 1-based and inclusive, like for VCFParser.fetch.
+
+        Returns:
+            rows (numpy.ndarray): The row numbers in the same order as the vcf
+        """
+        if chrom not in self.meta['contigs']:
+            return np.array([], dtype=np.int64)
+        contig_rows = self.meta.get('contig_rows')
+        if contig_rows is None:
+            # The vcf is not sorted so all rows are checked
+            mask = self.column('chrom') == self.meta['contigs'].index(chrom)
+            positions = self.column('pos')
+            if end is not None:
+                mask &= positions <= end
+            if start is not None:
+                mask &= positions + self.strings('ref').lengths() - 1 >= start
+            return np.flatnonzero(mask)
+
+        first, last = contig_rows[chrom]
+        positions = self.column('pos')[first:last]
+        if end is not None:
+            last = first + int(np.searchsorted(positions, end, side='right'))
+        if start is not None:
+            # Variants that starts before the region can still overlap it
+            first += int(np.searchsorted(
+                positions, start - self.meta['max_ref_length'] + 1))
+        if last <= first:
+            return np.array([], dtype=np.int64)
+        rows = np.arange(first, last, dtype=np.int64)
+        if start is not None:
+            ref_lengths = np.array(
+                [len(ref) for ref in self.strings('ref').slice(first, last)])
+            rows = rows[self.column('pos')[first:last] + ref_lengths - 1 >= 
+                        start]
+        return rows
+
+    def fetch(self, chrom, start=None, end=None):
+        """
+        Yield the variants that overlap a region.
+
+        Arguments:
+            chrom (str): The contig name
+            start (int): First position of the region
+            end (int): Last position of the region
+
+        Yields:
+            variant (dict): The variants that overlap the region
+        """
+        rows = self.region_rows(chrom, start, end)
+        for variant in self._row_variants(rows.tolist()):
+            yield variant
+
+    @property
+    def chunks(self):
+        """The zone maps of the chunks, see predicates.py"""
+        return self.meta.get('chunks')
+
+    def matching_chunks(self, predicates):
+        """
+        Find the chunks where some variant could match the predicates.
+
+        Arguments:
+            predicates (list): (field, operator, value) tuples
+
+        Returns:
+            chunks (list): The zone maps of the chunks that has to be read
+        """
+        predicates = check_predicates(predicates)
+        if self.chunks is None:
+            # Converted before there was zone maps
+            return [{'start': 0, 'end': self.number_of_variants}]
+        return [
+            chunk for chunk in self.chunks
+            if chunk_may_match(chunk, predicates, self.meta['contigs'],
+                               self.meta['filters'])
+        ]
+
+    def query_rows(self, predicates):
+        """
+        Find the rows of the variants that match all predicates.
+
+        The chunks that can not match are skipped with the zone maps, the
+        rest are checked with the columns. Predicates on INFO keys that
+        does not have a exact column are checked on the variant lines.
+
+        Arguments:
+            predicates (list): (field, operator, value) tuples like
+                               ('AF', '<', 0.01) or ('FILTER', '==', 'PASS')
+
+        Returns:
+            rows (numpy.ndarray): The row numbers in the same order as the vcf
+        """
+        logger = getLogger(__name__)
+        predicates = check_predicates(predicates)
+        chunks = self.matching_chunks(predicates)
+        logger.debug("Reading {0} of {1} chunks".format(
+            len(chunks), len(self.chunks or chunks)))
+
+        rows = []
+        for chunk in chunks:
+            start, end = chunk['start'], chunk['end']
+            mask = np.ones(end - start, dtype=bool)
+            line_predicates = []
+            for predicate in predicates:
+                column_mask = self._predicate_mask(predicate, start, end)
+                if column_mask is None:
+                    line_predicates.append(predicate)
+                else:
+                    mask &= column_mask
+            chunk_rows = np.flatnonzero(mask) + start
+            if line_predicates:
+                chunk_rows = self._filter_lines(chunk_rows, line_predicates)
+            rows.append(chunk_rows)
+
+        if not rows:
+            return np.array([], dtype=np.int64)
+        return np.concatenate(rows).astype(np.int64)
+
+    def _predicate_mask(self, predicate, start, end):
+        """
+        Check a predicate with the columns.
+
+        Returns:
+            mask (numpy.ndarray): True for the rows that match, None if the
+                                  predicate has to be checked on the lines
+        """
+        field, op, value = predicate
+        compare = OPERATORS[op]
+        if field in ('CHROM', 'FILTER'):
+            names = self.meta['contigs' if field == 'CHROM' else 'filters']
+            if value not in names:
+                return np.full(end - start, op == '!=', dtype=bool)
+            column = self.column(field.lower())[start:end]
+            return compare(column, names.index(value))
+        if field == 'NON_REF':
+            non_ref = (self.column('gt')[start:end] > 0).any(axis=(1, 2))
+            return compare(non_ref, bool(value))
+        if field == 'POS':
+            return compare(self.column('pos')[start:end], value)
+        if field == 'QUAL':
+            quals = self.column('qual')[start:end]
+            return compare(quals, value) & ~np.isnan(quals)
+
+        dtype = self.meta['info_columns'].get(field)
+        number = self.metadata.extra_info.get(field, {}).get('Number')
+        if dtype == 'bool' and isinstance(value, bool):
+            return compare(self.info(field)[start:end], value)
+        if dtype in ('int32', 'float32') and number == '1':
+            column = self.info(field)[start:end]
+            if dtype == 'int32':
+                present = column != MISSING_INTEGER
+            else:
+                present = ~np.isnan(column)
+            return compare(column, value) & present
+        return None
+
+    def _filter_lines(self, rows, predicates):
+        """Return the rows where the INFO field matches the predicates"""
+        info_fields = frozenset(field for field, op, value in predicates)
+        rows = rows.tolist()
+        matching = []
+        for row, info in zip(rows, self.strings('info').take(rows)):
+            info_dict = build_info_dict(info, info_fields)
+            if all(info_matches(info_dict, field, op, value)
+                   for field, op, value in predicates):
+                matching.append(row)
+        return np.array(matching, dtype=np.int64)
+
+    def query(self, predicates):
+        """
+        Yield the variants that match all predicates.
+
+        Arguments:
+            predicates (list): (field, operator, value) tuples, the field
+                               is one of CHROM, POS, QUAL, FILTER, NON_REF
+                               or a INFO key
+
+        Yields:
+            variant (dict): The matching variants
+        """
+        rows = self.query_rows(predicates)
+        for variant in self._row_variants(rows.tolist()):
+            yield variant
+
+    def iter_batches(self, size=BATCH_SIZE, fields=()):
+        """
+        Yield the variants in batches of numpy arrays.
+
+        The batches are built from the columns, only AD has to be parsed
+        from the variant lines.
+
+        Arguments:
+            size (int): The maximum number of variants in a batch
+            fields (iterable): FORMAT fields to include, any of DP, GQ and AD
+
+        Yields:
+            batch (VariantBatch)
+        """
+        fields = tuple(fields or ())
+        if 'AD' in fields:
+            for batch in iter_batches(self._variant_lines(), self.metadata,
+                                      size=size, fields=fields):
+                yield batch
+            return
+
+        for field in fields:
+            if field not in BATCH_FIELDS:
+                raise ValueError("Field {0} can not be added to a batch, "
+                                 "choose from {1}".format(
+                                     field, ', '.join(BATCH_FIELDS)))
+
+        contigs = np.array(self.meta['contigs'], dtype=object)
+        ref = self.strings('ref')
+        alt = self.strings('alt')
+        all_samples = self.sample_indexes == list(range(len(self.meta['samples'])))
+        for start in range(0, self.number_of_variants, size):
+            end = min(start + size, self.number_of_variants)
+            yield VariantBatch(
+                samples = list(self.individuals),
+                chrom = contigs[self.column('chrom')[start:end]],
+                pos = self.column('pos')[start:end],
+                ref = np.array(ref.slice(start, end), dtype=object),
+                alt = np.array(alt.slice(start, end), dtype=object),
+                alleles = self._sample_slice('gt', start, end, all_samples),
+                dp = (self._sample_slice('dp', start, end, all_samples)
+                      if 'DP' in fields else None),
+                gq = (self._sample_slice('gq', start, end, all_samples)
+                      if 'GQ' in fields else None),
+            )
+
+    def _sample_slice(self, name, start, end, all_samples):
+        """Return the rows of a sample column for the choosen individuals"""
+        column = self.column(name)[start:end]
+        if all_samples:
+            return column
+        return column[:, self.sample_indexes]
+
+    def __len__(self):
+        return self.number_of_variants
+
+    def __repr__(self):
+        return "ColumnarReader(directory={0})".format(self.directory)
@@ -0,0 +1,548 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+filters.py
+
+Compile filter expressions for vcf records.
+
+A filter is a python expression that is evaluated for each variant line:
+
+    QUAL > 30 and FILTER == "PASS" and INFO.AF < 0.01 and any(GT.has_variant)
+
+The names that can be used are:
+
+    CHROM, ID, REF, ALT, FILTER     The columns as strings
+    POS                             The position as an int
+    QUAL                            The quality as a float
+    INFO.<key> or INFO["<key>"]     The value of a INFO key
+    GT.<attribute>                  A list with one value per individual
+
+INFO values get the type from the INFO line in the header. Integer and Float
+values are numbers and Flags are True or False. Keys with Number=1 gives a
+single value, keys with other numbers gives a list of values. A comparison
+with a list is true if any of the values matches. Missing values ('.' or a
+key that is not in the line) never match a comparison. '"AF" in INFO' checks
+if a key is in the line.
+
+The GT attributes are has_variant, heterozygote, homo_alt, homo_ref,
+genotyped, phased and genotype, with the same meaning as for Genotype
+objects. They can be used with any, all, sum, len, min and max.
+
+The expression is checked and compiled to a python function once. The
+function works on the raw variant line, only the columns that are used are
+looked at and no Genotype objects are built. A prefilter with substrings that
+has to be in a line for it to match, like '\\tPASS\\t' or 'AF=', is also
+derived from the expression so most lines that does not match are rejected
+without being splitted.
+"""
+
+import ast
+import operator
+
+from logging import getLogger
+from numbers import Real
+
+from vcf_parser.genotype import Genotype
+
+# The fixed columns that can be used in a expression
+COLUMNS = {
+    'CHROM': 'r.columns[0]',
+    'POS': 'r.pos()',
+    'ID': 'r.columns[2]',
+    'REF': 'r.columns[3]',
+    'ALT': 'r.columns[4]',
+    'QUAL': 'r.qual()',
+    'FILTER': 'r.columns[6]',
+}
+
+GT_ATTRIBUTES = ('has_variant', 'heterozygote', 'homo_alt', 'homo_ref',
+                 'genotyped', 'phased', 'genotype')
+
+FUNCTIONS = {
+    'any': any,
+    'all': all,
+    'sum': sum,
+    'len': len,
+    'min': min,
+    'max': max,
+    'abs': abs,
+}
+
+COMPARISONS = {
+    'Eq': operator.eq,
+    'NotEq': operator.ne,
+    'Lt': operator.lt,
+    'LtE': operator.le,
+    'Gt': operator.gt,
+    'GtE': operator.ge,
+}
+
+INFO_TYPES = {
+    'Integer': int,
+    'Float': float,
+}
+
+# The fields that are compared as strings with the text in the line
+TEXT_COLUMNS = ('CHROM', 'ID', 'REF', 'ALT', 'FILTER')
+
+# The flags of the genotype calls, shared between all filters
+_genotypes = {}
+
+
+def get_constant(node):
+    """
+    Return the value of a constant node.
+
+    Raises:
+        ValueError: If the node is not a constant
+        SyntaxError: If a constant that is not a number is negated
+    """
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return tuple(get_constant(element) for element in node.elts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = get_constant(node.operand)
+        if isinstance(value, bool) or not isinstance(value, Real):
+            raise SyntaxError("Only numbers can be negative, not {0!r}".format(
+                value))
+        return -value
+    if hasattr(ast, 'Constant') and isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, getattr(ast, 'Num', ())):
+        return node.n
+    if isinstance(node, getattr(ast, 'Str', ())):
+        return node.s
+    if isinstance(node, getattr(ast, 'NameConstant', ())):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in ('True', 'False', 'None'):
+        return {'True': True, 'False': False, 'None': None}[node.id]
+    raise ValueError("Not a constant")
+
+
+def is_constant(node):
+    """Check if a node is a constant"""
+    try:
+        get_constant(node)
+    except ValueError:
+        return False
+    return True
+
+
+def get_genotype(call):
+    """Return a Genotype with only the GT of a call, shared for equal calls"""
+    genotype = _genotypes.get(call)
+    if genotype is None:
+        genotype = _genotypes[call] = Genotype.from_fields(GT=call)
+    return genotype
+
+
+def compare(op, value, other):
+    """
+    Compare two values, missing values never match.
+
+    If one of the values is a list it is enough that one of the values in
+    the list matches.
+    """
+    if value is None or other is None:
+        return False
+    if isinstance(value, list):
+        return any(compare(op, item, other) for item in value)
+    if isinstance(other, list):
+        return any(compare(op, value, item) for item in other)
+    try:
+        return op(value, other)
+    except TypeError:
+        return False
+
+
+def contains(container, value):
+    """The 'in' operator, missing values never match"""
+    if container is None or value is None:
+        return False
+    if isinstance(value, list):
+        return any(item in container for item in value)
+    return value in container
+
+
+def get_item(value, index):
+    """Return a item of a INFO value, None if it is missing"""
+    try:
+        return value[index]
+    except (TypeError, IndexError, KeyError):
+        return None
+
+
+def number_function(function):
+    """Return a version of a function that returns None for missing values"""
+    def wrapped(value):
+        if value is None:
+            return None
+        if isinstance(value, list):
+            value = [item for item in value if item is not None]
+            if not value and function in (min, max):
+                return None
+        try:
+            return function(value)
+        except TypeError:
+            return None
+    return wrapped
+
+
+def join_clauses(clauses):
+    """Join the clauses from VariantFilter._required to python source"""
+    return ' and '.join(
+        clause[0] if len(clause) == 1 else '(' + ' or '.join(clause) + ')'
+        for clause in clauses)
+
+
+def get_index(node):
+    """Return the node inside the brackets of a subscript"""
+    index = node.slice
+    # Before python 3.9 the index is wrapped in a Index node
+    if type(index).__name__ == 'Index':
+        index = index.value
+    return index
+
+
+class VariantRecord(object):
+    """
+    The columns of a variant line that are parsed on demand.
+
+    Only used by the compiled filters.
+    """
+    __slots__ = ('line', 'columns', 'variant_filter', '_info', '_calls')
+
+    def __init__(self, line, variant_filter):
+        self.line = line
+        self.variant_filter = variant_filter
+        self.columns = line.split('\t', 8)
+        if len(self.columns) < 8:
+            raise SyntaxError("One of the variant lines is malformed: {0}".format(
+                line))
+        self._info = None
+        self._calls = None
+
+    def pos(self):
+        return int(self.columns[1])
+
+    def qual(self):
+        try:
+            return float(self.columns[5])
+        except ValueError:
+            return None
+
+    def info_dict(self):
+        """Return a dictionary with the raw INFO values"""
+        if self._info is None:
+            self._info = {}
+            for info in self.columns[7].split(';'):
+                key, separator, value = info.partition('=')
+                self._info[key] = value if separator else True
+        return self._info
+
+    def info(self, key):
+        """Return the typed value of a INFO key"""
+        value = self.info_dict().get(key)
+        info_type, number = self.variant_filter.info_types.get(
+            key, (None, None))
+        if info_type == 'Flag':
+            return value is not None
+        if value is None or value is True:
+            return None
+        values = [self.variant_filter.convert(info_type, item)
+                  for item in value.split(',')]
+        if number == '1':
+            return values[0]
+        return values
+
+    def gt(self, attribute):
+        """Return the value of a genotype attribute for each individual"""
+        if self._calls is None:
+            self._calls = []
+            if len(self.columns) > 8:
+                columns = self.columns[8].split('\t')
+                gt_format = columns[0].split(':')
+                gt_index = gt_format.index('GT') if 'GT' in gt_format else None
+                for column in self.variant_filter.sample_columns:
+                    call = './.'
+                    if gt_index is not None and column < len(columns):
+                        values = columns[column].split(':', gt_index + 1)
+                        if gt_index < len(values):
+                            call = values[gt_index]
+                    self._calls.append(get_genotype(call))
+        return [getattr(genotype, attribute) for genotype in self._calls]
+
+
+class VariantFilter(object):
+    """
+    A filter expression compiled for the header of a vcf.
+
+    Call the filter with a variant line to check if it matches:
+
+        variant_filter = VariantFilter('INFO.AF < 0.01', parser.metadata)
+        matching = [line for line in lines if variant_filter(line)]
+
+    Arguments:
+        expression (str): The filter expression, see the module docstring
+        header_parser (HeaderParser): The header of the vcf
+
+    Raises:
+        SyntaxError: If the expression can not be used as a filter
+    """
+    def __init__(self, expression, header_parser):
+        super(VariantFilter, self).__init__()
+        self.logger = getLogger(__name__)
+        self.expression = expression
+        # (Type, Number) for each INFO key in the header
+        self.info_types = dict(
+            (key, (info['Type'], info['Number']))
+            for key, info in header_parser.extra_info.items()
+        )
+        # The columns of the individuals, relative to the FORMAT column
+        if header_parser.columns is None:
+            self.sample_columns = list(range(1, len(header_parser.header) - 8))
+        else:
+            self.sample_columns = [column - 8 for column in
+                                   header_parser.columns[9:]]
+
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise SyntaxError("Filter {0} is malformed: {1}".format(
+                expression, e))
+        self.source = self._translate(tree.body)
+        self.logger.debug("Filter {0} compiled to {1}".format(
+            expression, self.source))
+        self.function = self._compile(
+            'def _filter(line):\n'
+            '    r = VariantRecord(line, variant_filter)\n'
+            '    return bool({0})\n'.format(self.source), '_filter')
+
+        self.prefilter = None
+        self.prefilter_source = None
+        clauses = self._required(tree.body)
+        if clauses:
+            self.prefilter_source = join_clauses(clauses)
+            self.logger.debug("Prefilter for {0}: {1}".format(
+                expression, self.prefilter_source))
+            self.prefilter = self._compile(
+                'def _prefilter(line):\n'
+                '    return {0}\n'.format(self.prefilter_source), '_prefilter')
+
+    def _compile(self, source, name):
+        """Compile a function"""
+        namespace = {
+            'VariantRecord': VariantRecord,
+            'variant_filter': self,
+            'compare': compare,
+            'contains': contains,
+            'get_item': get_item,
+        }
+        for op_name, op in COMPARISONS.items():
+            namespace['op_' + op_name] = op
+        for function_name, function in FUNCTIONS.items():
+            namespace['_' + function_name] = number_function(function)
+        exec(compile(source, '<filter>', 'exec'), namespace)
+        return namespace[name]
+
+    def convert(self, info_type, value):
+        """Convert a INFO value to its type, None if it is missing"""
+        if value == '.' or value == '':
+            return None
+        converter = INFO_TYPES.get(info_type)
+        if converter is None:
+            if info_type is not None:
+                return value
+            # Keys that are not in the header are numbers if they can be
+            try:
+                return float(value)
+            except ValueError:
+                return value
+        try:
+            return converter(value)
+        except ValueError:
+            return None
+
+    def _error(self, node, message="is not supported"):
+        return SyntaxError("Filter {0}: {1} {2}".format(
+            self.expression, ast.dump(node), message))
+
+    def _info_key(self, node):
+        """Return the INFO key if the node is INFO.<key> or INFO[<key>]"""
+        if (isinstance(node, ast.Attribute) and
+                isinstance(node.value, ast.Name) and node.value.id == 'INFO'):
+            return node.attr
+        if (isinstance(node, ast.Subscript) and
+                isinstance(node.value, ast.Name) and node.value.id == 'INFO'):
+            index = get_index(node)
+            if is_constant(index) and isinstance(get_constant(index), str):
+                return get_constant(index)
+            raise self._error(node, "INFO keys must be strings")
+        return None
+
+    def _translate(self, node):
+        """Translate a node of the expression to python source"""
+        if is_constant(node):
+            return repr(get_constant(node))
+
+        if isinstance(node, ast.BoolOp):
+            joiner = ' and ' if isinstance(node.op, ast.And) else ' or '
+            return '(' + joiner.join(
+                self._translate(value) for value in node.values) + ')'
+
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return '(not {0})'.format(self._translate(node.operand))
+            if isinstance(node.op, ast.USub):
+                return '(-{0})'.format(self._translate(node.operand))
+            raise self._error(node)
+
+        if isinstance(node, ast.Compare):
+            comparisons = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                comparisons.append(self._comparison(left, op, right))
+                left = right
+            return '(' + ' and '.join(comparisons) + ')'
+
+        if isinstance(node, ast.Name):
+            if node.id in COLUMNS:
+                return COLUMNS[node.id]
+            raise self._error(node, "is not a known name, use one of {0}, "\
+                              "INFO.<key> or GT.<attribute>".format(
+                                  ', '.join(sorted(COLUMNS))))
+
+        info_key = self._info_key(node)
+        if info_key is not None:
+            if info_key not in self.info_types:
+                self.logger.warning("INFO key {0} is not in the header".format(
+                    info_key))
+            return 'r.info({0!r})'.format(info_key)
+
+        if (isinstance(node, ast.Attribute) and
+                isinstance(node.value, ast.Name) and node.value.id == 'GT'):
+            if node.attr not in GT_ATTRIBUTES:
+                raise self._error(node, "is not a genotype attribute, use one"\
+                                  " of {0}".format(', '.join(GT_ATTRIBUTES)))
+            return 'r.gt({0!r})'.format(node.attr)
+
+        if isinstance(node, ast.Subscript):
+            index = get_index(node)
+            if not (is_constant(index) and
+                    isinstance(get_constant(index), int)):
+                raise self._error(node, "can only be indexed with integers")
+            return 'get_item({0}, {1!r})'.format(
+                self._translate(node.value), get_constant(index))
+
+        if isinstance(node, ast.Call):
+            if (not isinstance(node.func, ast.Name) or
+                    node.func.id not in FUNCTIONS or
+                    len(node.args) != 1 or node.keywords):
+                raise self._error(node, "is not a allowed function call, use"\
+                                  " one of {0} with one argument".format(
+                                      ', '.join(sorted(FUNCTIONS))))
+            return '_{0}({1})'.format(
+                node.func.id, self._translate(node.args[0]))
+
+        raise self._error(node)
+
+    def _comparison(self, left, op, right):
+        """Translate one comparison to python source"""
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if isinstance(right, ast.Name) and right.id == 'INFO':
+                container = 'r.info_dict()'
+            elif isinstance(right, ast.Name) and right.id == 'FILTER':
+                container = "r.columns[6].split(';')"
+            else:
+                container = self._translate(right)
+            source = 'contains({0}, {1})'.format(
+                container, self._translate(left))
+            if isinstance(op, ast.NotIn):
+                return '(not {0})'.format(source)
+            return source
+
+        if type(op).__name__ not in COMPARISONS:
+            raise self._error(op)
+        return 'compare(op_{0}, {1}, {2})'.format(
+            type(op).__name__, self._translate(left), self._translate(right))
+
+    def _required(self, node):
+        """
+        Return text that has to be in a line for it to match a node.
+
+        Returns:
+            clauses (list): Lists with python conditions on 'line', at least
+                            one condition in each list has to be true
+        """
+        if isinstance(node, ast.BoolOp):
+            if isinstance(node.op, ast.And):
+                clauses = []
+                for value in node.values:
+                    clauses.extend(self._required(value))
+                return clauses
+            alternatives = []
+            for value in node.values:
+                clauses = self._required(value)
+                if not clauses:
+                    return []
+                if len(clauses) == 1:
+                    alternatives.append(join_clauses(clauses))
+                else:
+                    alternatives.append('(' + join_clauses(clauses) + ')')
+            return [alternatives]
+
+        info_key = self._info_key(node)
+        if info_key is not None:
+            # A flag that has to be set
+            if self.info_types.get(info_key, (None,))[0] == 'Flag':
+                return [['{0!r} in line'.format(info_key)]]
+            return []
+
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            return []
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+
+        if isinstance(op, ast.In):
+            if isinstance(right, ast.Name) and right.id in ('INFO', 'FILTER'):
+                value = get_constant(left) if is_constant(left) else None
+                if isinstance(value, str) and value:
+                    return [['{0!r} in line'.format(value)]]
+            return []
+
+        if isinstance(op, ast.NotIn):
+            return []
+
+        if is_constant(left):
+            left, right = right, left
+        info_key = self._info_key(left)
+        if info_key is not None:
+            if self.info_types.get(info_key, (None,))[0] == 'Flag':
+                return []
+            # Missing values never match
+            return [['{0!r} in line'.format(info_key + '=')]]
+
+        if (isinstance(op, ast.Eq) and isinstance(left, ast.Name) and
+                left.id in TEXT_COLUMNS and is_constant(right)):
+            value = get_constant(right)
+            if not isinstance(value, str):
+                return []
+            if left.id == 'CHROM':
+                return [['line.startswith({0!r})'.format(value + '\t')]]
+            return [['{0!r} in line'.format('\t' + value + '\t')]]
+        return []
+
+    def __call__(self, line):
+        """
+        Check if a variant line matches the filter.
+
+        Arguments:
+            line (str): A variant line
+
+        Returns:
+            bool
+        """
+        if self.prefilter is not None and not self.prefilter(line):
+            return False
+        return self.function(line)
+
+    def __repr__(self):
+        return "VariantFilter({0!r})".format(self.expression)
@@ -41,21 +41,88 @@ Copyright (c) 2013 __MyCompanyName__. All rights reserved.
 import sys
 import os
 
+if sys.version_info < (3, 0):
+    from __builtin__ import intern
+else:
+    from sys import intern
+
+if sys.version_info < (2, 7):
+    from ordereddict import OrderedDict
+else:
+    from collections import OrderedDict
+
+# The default number of genotypes in a GenotypeCache
+GENOTYPE_CACHE_SIZE = 10000
+# The number of FORMAT strings that we keep decoders for
+DECODER_CACHE_SIZE = 1000
+
+# The FORMAT keys that are used by Genotype with their default values
+GENOTYPE_FIELDS = (
+    ('GT', './.'), ('AD', '.,.'), ('DP', '0'), ('GQ', '0'), ('PL', None),
+    ('GL', None), ('RO', None), ('AO', None), ('PR', None), ('SR', None),
+)
+
 class Genotype(object):
-    """Holds information about a genotype"""
+    """
+    Holds information about a genotype
+    
+    The genotype call is parsed when the object is created. The numeric 
+    fields (AD, DP, GQ and PL) are stored as the raw strings from the vcf and
+    are converted the first time they are read.
+    """
+    __slots__ = (
+        'allele_1', 'allele_2', 'genotype', 'phased', 'genotyped', 
+        'heterozygote', 'homo_alt', 'homo_ref', 'has_variant', 'allele_depth',
+        # The raw strings from the vcf
+        '_AD', '_DP', '_GQ', '_PL', '_RO', '_AO', '_PR', '_SR',
+        # The converted values, these are not set until they are used
+        '_ref_depth', '_alt_depth', '_quality_depth', '_depth_of_coverage',
+        '_genotype_quality', '_phred_likelihoods',
+    )
+    
     def __init__(self, **kwargs):
         super(Genotype, self).__init__()        
         # These are the different genotypes:
-        GT = kwargs.get('GT', './.')
-        AD = kwargs.get('AD', '.,.')
-        DP = kwargs.get('DP', '0')
-        GQ = kwargs.get('GQ', '0')
-        PL = kwargs.get('PL', None)
-        GL = kwargs.get('GL', None)
-        RO = kwargs.get('RO', None)
-        AO = kwargs.get('AO', None)
-        PR = kwargs.get('PR', None)
-        SR = kwargs.get('SR', None)
+        self._set_fields(
+            GT = kwargs.get('GT', './.'),
+            AD = kwargs.get('AD', '.,.'),
+            DP = kwargs.get('DP', '0'),
+            GQ = kwargs.get('GQ', '0'),
+            PL = kwargs.get('PL', None),
+            GL = kwargs.get('GL', None),
+            RO = kwargs.get('RO', None),
+            AO = kwargs.get('AO', None),
+            PR = kwargs.get('PR', None),
+            SR = kwargs.get('SR', None)
+        )
+
+    @classmethod
+    def from_fields(cls, GT='./.', AD='.,.', DP='0', GQ='0', PL=None, GL=None,
+                    RO=None, AO=None, PR=None, SR=None):
+        """
+        Create a Genotype from the values of the FORMAT keys.
+        
+        The values are given in the same order as in GENOTYPE_FIELDS, this
+        is faster than building a dictionary and unpacking it as keywords.
+        
+        Returns:
+            genotype (Genotype): A Genotype object
+        """
+        genotype = cls.__new__(cls)
+        genotype._set_fields(GT, AD, DP, GQ, PL, GL, RO, AO, PR, SR)
+        return genotype
+
+    def _set_fields(self, GT, AD, DP, GQ, PL, GL, RO, AO, PR, SR):
+        """Parse the genotype call and store the raw numeric fields"""
+        self._AD = AD
+        self._DP = DP
+        self._GQ = GQ
+        # The genotype likelihoods are taken from GL if there is no PL
+        self._PL = PL or GL
+        self._RO = RO
+        self._AO = AO
+        self._PR = PR
+        self._SR = SR
         
         self.heterozygote = False
         self.allele_depth = False
@@ -64,14 +131,6 @@ class Genotype(object):
         self.has_variant = False
         self.genotyped = False
         self.phased = False
-        self.depth_of_coverage = 0
-        self.quality_depth = 0
-        self.genotype_quality = 0
-
-        #Check the allele depth:
-        self.ref_depth = None
-        self.alt_depth = None
-        self.quality_depth = None
 
         #Check phasing
         if '|' in GT:
@@ -86,7 +145,8 @@ class Genotype(object):
             self.allele_1 = GT[0]
             self.allele_2 = GT[-1]
         # The genotype should allways be represented on the same form
-        self.genotype = self.allele_1 +'/'+ self.allele_2
+        # There are only a few different genotypes so they can be shared
+        self.genotype = intern(self.allele_1 +'/'+ self.allele_2)
         
         if self.genotype != './.':
             self.genotyped = True
@@ -100,69 +160,328 @@ class Genotype(object):
                 self.heterozygote = True
                 self.has_variant = True
 
-        allele_depths = AD.split(',')
+    def _parse_depths(self):
+        """Set the allele depths that has not been set from the raw fields"""
+        ref_depth = None
+        alt_depth = None
+        quality_depth = None
+        
+        allele_depths = self._AD.split(',')
         
         if len(allele_depths) > 1 and allele_depths[0] != '.':
             if allele_depths[0].isdigit():
-                self.ref_depth = int(allele_depths[0])
+                ref_depth = int(allele_depths[0])
             if allele_depths[1].isdigit():
-                self.alt_depth = int(allele_depths[1])
-        elif RO or AO:
-            if RO.isdigit():
-                self.ref_depth = int(RO)
-            if AO.isdigit():
-                self.alt_depth = int(AO)
-        elif PR or SR:
-            if PR:
-                paired_depth = PR.split(',')
-                self.ref_depth = int(paired_depth[0])
-                self.alt_depth = int(paired_depth[1])
-            if SR:
-                split_depth = SR.split(',')
-                if self.ref_depth:
-                    self.ref_depth += int(split_depth[0])
+                alt_depth = int(allele_depths[1])
+        elif self._RO or self._AO:
+            if self._RO.isdigit():
+                ref_depth = int(self._RO)
+            if self._AO.isdigit():
+                alt_depth = int(self._AO)
+        elif self._PR or self._SR:
+            if self._PR:
+                paired_depth = self._PR.split(',')
+                ref_depth = int(paired_depth[0])
+                alt_depth = int(paired_depth[1])
+            if self._SR:
+                split_depth = self._SR.split(',')
+                if ref_depth:
+                    ref_depth += int(split_depth[0])
                 else:
-                    self.ref_depth = int(split_depth[0])
-                if self.alt_depth:
-                    self.alt_depth += int(split_depth[1])
+                    ref_depth = int(split_depth[0])
+                if alt_depth:
+                    alt_depth += int(split_depth[1])
                 else:
-                    self.alt_depth = int(split_depth[1])
+                    alt_depth = int(split_depth[1])
         
         #Sum up the quality depth
-        if self.ref_depth:
-            self.quality_depth = self.ref_depth
-        if self.alt_depth:
-            if self.quality_depth:
-                self.quality_depth += self.alt_depth
+        if ref_depth:
+            quality_depth = ref_depth
+        if alt_depth:
+            if quality_depth:
+                quality_depth += alt_depth
             else:
-                self.quality_depth = self.alt_depth
-            
-        #Check the depth of coverage:
+                quality_depth = alt_depth
+        
+        # Values that the user has set are kept
+        if not hasattr(self, '_ref_depth'):
+            self._ref_depth = ref_depth
+        if not hasattr(self, '_alt_depth'):
+            self._alt_depth = alt_depth
+        if not hasattr(self, '_quality_depth'):
+            self._quality_depth = quality_depth
+
+    @property
+    def ref_depth(self):
+        try:
+            return self._ref_depth
+        except AttributeError:
+            self._parse_depths()
+            return self._ref_depth
+
+    @ref_depth.setter
+    def ref_depth(self, value):
+        self._ref_depth = value
+
+    @property
+    def alt_depth(self):
         try:
-            self.depth_of_coverage = int(DP)
-        except ValueError:
-            pass
-        #Check the genotype quality
+            return self._alt_depth
+        except AttributeError:
+            self._parse_depths()
+            return self._alt_depth
+
+    @alt_depth.setter
+    def alt_depth(self, value):
+        self._alt_depth = value
+
+    @property
+    def quality_depth(self):
+        try:
+            return self._quality_depth
+        except AttributeError:
+            self._parse_depths()
+            return self._quality_depth
+
+    @quality_depth.setter
+    def quality_depth(self, value):
+        self._quality_depth = value
+
+    @property
+    def depth_of_coverage(self):
         try:
-            self.genotype_quality = float(GQ)
-        except ValueError:
-            pass
-
-        #Check the genotype likelihoods
-        self.phred_likelihoods = []
-        gls = None
-        if PL:
-            gls = PL
-        elif GL:
-            gls = GL
-
-        if gls:
+            return self._depth_of_coverage
+        except AttributeError:
+            #Check the depth of coverage:
             try:
-                self.phred_likelihoods = [float(score) for score in gls.split(',')]
+                self._depth_of_coverage = int(self._DP)
             except ValueError:
-                pass
+                self._depth_of_coverage = 0
+            return self._depth_of_coverage
+
+    @depth_of_coverage.setter
+    def depth_of_coverage(self, value):
+        self._depth_of_coverage = value
+
+    @property
+    def genotype_quality(self):
+        try:
+            return self._genotype_quality
+        except AttributeError:
+            #Check the genotype quality
+            try:
+                self._genotype_quality = float(self._GQ)
+            except ValueError:
+                self._genotype_quality = 0
+            return self._genotype_quality
+
+    @genotype_quality.setter
+    def genotype_quality(self, value):
+        self._genotype_quality = value
+
+    @property
+    def phred_likelihoods(self):
+        try:
+            return self._phred_likelihoods
+        except AttributeError:
+            #Check the genotype likelihoods
+            self._phred_likelihoods = []
+            if self._PL:
+                try:
+                    self._phred_likelihoods = [
+                        float(score) for score in self._PL.split(',')]
+                except ValueError:
+                    pass
+            return self._phred_likelihoods
+
+    @phred_likelihoods.setter
+    def phred_likelihoods(self, value):
+        self._phred_likelihoods = value
+        
+    def freeze(self):
+        """
+        Make the genotype immutable.
+        
+        This is done for genotypes that are shared, like the ones from a 
+        GenotypeCache, so that changing one variant does not change others.
+        
+        Returns:
+            genotype (FrozenGenotype): The same object
+        """
+        self.__class__ = FrozenGenotype
+        return self
         
     def __str__(self):
         """Specifies what will be printed when printing the object."""
         return self.allele_1+'/'+self.allele_2
 
+
+class FrozenGenotype(Genotype):
+    """
+    A Genotype that can not be modified.
+    
+    The numeric fields are still converted the first time they are read,
+    but no attribute can be set or changed from the outside.
+    """
+    __slots__ = ()
+    
+    def __setattr__(self, name, value):
+        # The converted values are set when they are first read
+        if name.startswith('_') and not hasattr(self, name):
+            object.__setattr__(self, name, value)
+        else:
+            raise AttributeError("Genotype is shared and can not be "\
+                                 "modified, attribute {0}".format(name))
+    
+    def __delattr__(self, name):
+        raise AttributeError("Genotype is shared and can not be modified, "\
+                             "attribute {0}".format(name))
+    
+    def __setstate__(self, state):
+        """Set the slots when the genotype is unpickled or copied"""
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+class GenotypeCache(object):
+    """
+    A cache with the most recently used Genotype objects.
+    
+    In large cohorts most genotype calls on a line are identical strings, 
+    like '0/0:20,0:20:60:0,60,900'. The cache is keyed on the FORMAT and the
+    genotype call so the same Genotype object can be used for all of them.
+    
+    The Genotype objects from the cache are shared between individuals and
+    variants, build_genotype freezes them so that they can not be modified.
+    """
+    def __init__(self, maxsize=GENOTYPE_CACHE_SIZE):
+        super(GenotypeCache, self).__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._genotypes = OrderedDict()
+    
+    def get(self, key):
+        """
+        Return the genotype for a key, None if it is not in the cache.
+        
+        Arguments:
+            key (tuple): Usually (FORMAT, genotype call, format fields)
+        
+        Returns:
+            genotype (Genotype): The cached Genotype or None
+        """
+        try:
+            genotype = self._genotypes.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # Put the genotype last since it was the most recently used
+        self._genotypes[key] = genotype
+        self.hits += 1
+        return genotype
+    
+    def add(self, key, genotype):
+        """Add a genotype, the least recently used is removed if full"""
+        self._genotypes[key] = genotype
+        if len(self._genotypes) > self.maxsize:
+            self._genotypes.popitem(last=False)
+    
+    @property
+    def hit_rate(self):
+        """The fraction of the lookups that were found in the cache"""
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0.0
+        return self.hits / float(lookups)
+    
+    def clear(self):
+        """Remove all genotypes and reset the statistics"""
+        self._genotypes.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self._genotypes)
+    
+    def __repr__(self):
+        return "GenotypeCache(maxsize={0},hits={1},misses={2})".format(
+            self.maxsize, self.hits, self.misses
+        )
+
+
+class GenotypeDecoder(object):
+    """
+    Builds Genotype objects for one FORMAT string.
+    
+    The positions of the keys that Genotype uses are found once, the
+    genotype calls are then decoded straight from the splitted string.
+    Use get_genotype_decoder to get a cached decoder for a FORMAT.
+    """
+    def __init__(self, gt_format, format_fields=None):
+        super(GenotypeDecoder, self).__init__()
+        self.gt_format = gt_format
+        self.format_fields = format_fields
+        
+        format_keys = gt_format.split(':')
+        # A tuple with (position, default) for each key in GENOTYPE_FIELDS
+        positions = []
+        for key, default in GENOTYPE_FIELDS:
+            position = None
+            if key in format_keys:
+                if format_fields is None or key in format_fields:
+                    position = format_keys.index(key)
+            positions.append((position, default))
+        self.positions = tuple(positions)
+    
+    def decode(self, gt_info):
+        """
+        Build a Genotype from a genotype call.
+        
+        Arguments:
+            gt_info (str): The genotype call, like '0/1:10,10:60'
+        
+        Returns:
+            genotype (Genotype): A Genotype object
+        """
+        values = gt_info.split(':')
+        number_of_values = len(values)
+        return Genotype.from_fields(*[
+            values[position] 
+            if position is not None and position < number_of_values 
+            else default 
+            for position, default in self.positions
+        ])
+    
+    def __repr__(self):
+        return "GenotypeDecoder(gt_format={0})".format(self.gt_format)
+
+
+_decoders = {}
+
+def get_genotype_decoder(gt_format, format_fields=None):
+    """
+    Return the GenotypeDecoder for a FORMAT string.
+    
+    The decoders are cached since the same FORMAT is used on most lines.
+    
+    Arguments:
+        gt_format (str): The FORMAT column of a variant
+        format_fields (set): If given, only these FORMAT keys are used
+    
+    Returns:
+        decoder (GenotypeDecoder)
+    """
+    if format_fields is not None:
+        format_fields = frozenset(format_fields)
+    key = (gt_format, format_fields)
+    try:
+        return _decoders[key]
+    except KeyError:
+        if len(_decoders) >= DECODER_CACHE_SIZE:
+            _decoders.clear()
+        decoder = GenotypeDecoder(gt_format, format_fields)
+        _decoders[key] = decoder
+        return decoder
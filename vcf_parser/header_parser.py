@@ -2,6 +2,7 @@ from __future__ import print_function
 
 import sys
 import re
+import gzip
 
 from logging import getLogger
 
@@ -13,6 +14,35 @@ else:
 
 class HeaderParser(object):
     """Parses a file with family info and creates a family object with individuals."""
+    # The patterns are compiled once and shared by all instances
+    info_pattern = re.compile(r'''\#\#INFO=<
+        ID=(?P<id>[^,]+),
+        Number=(?P<number>-?\d+|\.|[AGR]),
+        Type=(?P<type>Integer|Float|Flag|Character|String),
+        Description="(?P<desc>[^"]*)"
+        >''', re.VERBOSE)
+    filter_pattern = re.compile(r'''\#\#FILTER=<
+        ID=(?P<id>[^,]+),
+        Description="(?P<desc>[^"]*)"
+        >''', re.VERBOSE)
+    contig_pattern = re.compile(r'''\#\#contig=<
+        ID=(?P<id>[^,]+),
+        .*
+        length=(?P<length>-?\d+)
+        .*
+        >''', re.VERBOSE)
+    format_pattern = re.compile(r'''\#\#FORMAT=<
+        ID=(?P<id>.+),
+        Number=(?P<number>-?\d+|\.|[AGR]),
+        Type=(?P<type>.+),
+        Description="(?P<desc>.*)"
+        >''', re.VERBOSE)
+    alt_pattern = re.compile(r'''\#\#ALT=<
+        ID=(?P<id>[^,]+),
+        Description="(?P<desc>[^"]*)"
+        >''', re.VERBOSE)
+    meta_pattern = re.compile(r'''##(?P<key>.+?)=(?P<val>.+)''')
+    
     def __init__(self):
         super(HeaderParser, self).__init__()
         self.logger = getLogger(__name__)
@@ -50,34 +80,13 @@ class HeaderParser(object):
         self.source = None
         self.line_counter = 0
         self.individuals = []
+        # If only some of the individuals should be parsed
+        self.samples = None
+        # The indexes of the columns to parse, None means all columns
+        self.columns = None
+        # The number of columns in the vcf
+        self.number_of_columns = len(self.header)
         self.vep_columns = []
-        self.info_pattern = re.compile(r'''\#\#INFO=<
-            ID=(?P<id>[^,]+),
-            Number=(?P<number>-?\d+|\.|[AGR]),
-            Type=(?P<type>Integer|Float|Flag|Character|String),
-            Description="(?P<desc>[^"]*)"
-            >''', re.VERBOSE)
-        self.filter_pattern = re.compile(r'''\#\#FILTER=<
-            ID=(?P<id>[^,]+),
-            Description="(?P<desc>[^"]*)"
-            >''', re.VERBOSE)
-        self.contig_pattern = re.compile(r'''\#\#contig=<
-            ID=(?P<id>[^,]+),
-            .*
-            length=(?P<length>-?\d+)
-            .*
-            >''', re.VERBOSE)
-        self.format_pattern = re.compile(r'''\#\#FORMAT=<
-            ID=(?P<id>.+),
-            Number=(?P<number>-?\d+|\.|[AGR]),
-            Type=(?P<type>.+),
-            Description="(?P<desc>.*)"
-            >''', re.VERBOSE)
-        self.alt_pattern = re.compile(r'''\#\#ALT=<
-            ID=(?P<id>[^,]+),
-            Description="(?P<desc>[^"]*)"
-            >''', re.VERBOSE)
-        self.meta_pattern = re.compile(r'''##(?P<key>.+?)=(?P<val>.+)''')
     
     def parse_meta_data(self, line):
         """Parse a vcf metadataline"""
@@ -176,11 +185,36 @@ class HeaderParser(object):
             self.other_dict[match.group('key')] = line
     
     def parse_header_line(self, line):
-        """docstring for parse_header_line"""
+        """
+        Parse the header line with the column names.
+        
+        If self.samples is set the header and the individuals are restricted
+        to the choosen samples and the indexes of the columns that should be
+        parsed are stored in self.columns.
+        
+        Arguments:
+            line (str): The line that starts with '#CHROM'
+        """
         self.header = line[1:].rstrip().split('\t')
         if len(self.header) < 9:
             self.header = line[1:].rstrip().split()
+        self.number_of_columns = len(self.header)
         self.individuals = self.header[9:]
+        self.columns = None
+        
+        if self.samples is not None:
+            sample_columns = []
+            for sample in self.samples:
+                if sample not in self.individuals:
+                    raise SyntaxError("Individual {0} is not found in the vcf "\
+                                      "header".format(sample))
+                sample_columns.append(self.header.index(sample))
+            
+            self.columns = list(range(min(9, len(self.header)))) + sample_columns
+            self.header = [self.header[column] for column in self.columns]
+            self.individuals = self.header[9:]
+            self.logger.info("Parsing individuals {0}".format(
+                ', '.join(self.individuals)))
     
     def print_header(self):
         """Returns a list with the header lines if proper format"""
@@ -351,3 +385,48 @@ class HeaderParser(object):
             info_id, version, date, command_line) 
         self.other_dict[info_id] = other_line
         return
+
+
+def read_header(path, samples=None):
+    """
+    Read the header of a vcf without reading any variants.
+    
+    The file is read until the '#CHROM' line, so this is fast also for very
+    large files.
+    
+    Arguments:
+        path (str): Path to a vcf or a (b)gzipped vcf
+        samples (list): If given, only these individuals are used
+    
+    Returns:
+        header_parser (HeaderParser): The parsed header
+    
+    Raises:
+        IOError: If the file does not start with a metadata line
+    """
+    header_parser = HeaderParser()
+    if samples is not None:
+        header_parser.samples = list(samples)
+    
+    if path.endswith('.gz'):
+        vcf = gzip.open(path, 'rb')
+    else:
+        vcf = open(path, 'rb')
+    
+    try:
+        line = vcf.readline().decode('utf-8', 'replace').rstrip()
+        # First line is allways a metadata line
+        if not line.startswith('#'):
+            raise IOError("VCF files allways have to start with a metadata "\
+                          "line.")
+        while line.startswith('#'):
+            if line.startswith('##'):
+                header_parser.parse_meta_data(line)
+            else:
+                header_parser.parse_header_line(line)
+                break
+            line = vcf.readline().decode('utf-8', 'replace').rstrip()
+    finally:
+        vcf.close()
+    
+    return header_parser
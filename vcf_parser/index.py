@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+index.py
+
+Build and read the vcf_parser index.
+
+The index is a small gzipped text file that is stored next to the vcf with
+the suffix '.vpi'. It works for both uncompressed vcf files and vcf files
+compressed with bgzip. Each contig is divided into bins of 16 kb and for each
+bin we store the offset of the first record that overlaps the bin. For
+uncompressed files the offsets are byte offsets and for bgzipped files they
+are virtual offsets.
+
+The index file looks like:
+
+    ##vcf_parser_index=1
+    ##compression=plain
+    ##bin_shift=14
+    ##source_size=1254
+    ##source_mtime=1434621000.25
+    #CHROM  BIN  OFFSET
+    1   0   1067
+    1   53  1125
+
+To find the records in a region we start reading from the first bin that
+overlaps the region and continue until we have passed the region. The size
+and modification time of the vcf are stored so that an index for an older
+version of the file is not used.
+"""
+
+import os
+import gzip
+
+from bisect import bisect_left
+from logging import getLogger
+
+from vcf_parser.bgzf import (BgzfReader, is_bgzf)
+from vcf_parser.readers import MmapReader
+from vcf_parser.tabix import (TabixIndex, find_tabix_index)
+
+INDEX_SUFFIX = '.vpi'
+INDEX_VERSION = '1'
+BIN_SHIFT = 14
+
+
+def get_index_path(filename):
+    """Return the path of the vcf_parser index for a vcf"""
+    return filename + INDEX_SUFFIX
+
+
+def open_raw_vcf(filename, threads=1):
+    """
+    Open a vcf for reading bytes with support for seek and tell.
+
+    Arguments:
+        filename (str): Path to a vcf or bgzipped vcf
+        threads (int): Number of threads used for BGZF decompression
+
+    Returns:
+        handle: A BgzfReader or a MmapReader for uncompressed files
+    """
+    if is_bgzf(filename):
+        return BgzfReader(filename, threads=threads)
+
+    if filename.endswith('.gz'):
+        raise IOError("Only files compressed with bgzip can be indexed")
+
+    return MmapReader(filename)
+
+
+def build_index(filename, bin_shift=BIN_SHIFT, outfile=None):
+    """
+    Build a vcf_parser index for a sorted vcf.
+
+    Arguments:
+        filename (str): Path to a vcf or bgzipped vcf
+        bin_shift (int): The bins will be 2**bin_shift bases long
+        outfile (str): Path to the index, defaults to <filename>.vpi
+
+    Returns:
+        outfile (str): Path to the index that was written
+    """
+    logger = getLogger(__name__)
+    outfile = outfile or get_index_path(filename)
+    logger.info("Building index for {0}".format(filename))
+
+    compression = 'plain'
+    # Bins in the order they are found, one list per contig
+    contig_bins = []
+    contig_ids = set()
+    current_contig = None
+    last_position = 0
+    next_bin = 0
+
+    handle = open_raw_vcf(filename)
+    if isinstance(handle, BgzfReader):
+        compression = 'bgzf'
+
+    try:
+        offset = handle.tell()
+        for line in iter(handle.readline, b''):
+            line_offset = offset
+            if compression == 'plain':
+                offset += len(line)
+            else:
+                offset = handle.tell()
+
+            if line.startswith(b'#') or not line.strip():
+                continue
+
+            variant_info = line.split(b'\t', 4)
+            contig = variant_info[0].decode('utf-8')
+            position = int(variant_info[1])
+
+            if contig != current_contig:
+                if contig in contig_ids:
+                    raise SyntaxError("Vcf is not sorted, contig {0} is found "
+                                      "in more than one place".format(contig))
+                contig_ids.add(contig)
+                contig_bins.append((contig, []))
+                current_contig = contig
+                last_position = 0
+                next_bin = 0
+
+            if position < last_position:
+                raise SyntaxError("Vcf is not sorted, position {0}:{1} comes "
+                                  "after {0}:{2}".format(
+                                      contig, position, last_position))
+            last_position = position
+
+            # The bins that the record overlaps that have not been seen
+            first_bin = max((position - 1) >> bin_shift, next_bin)
+            last_bin = (position - 2 + len(variant_info[3])) >> bin_shift
+            for bin_number in range(first_bin, last_bin + 1):
+                contig_bins[-1][1].append((bin_number, line_offset))
+            next_bin = max(next_bin, last_bin + 1)
+    finally:
+        handle.close()
+
+    with gzip.open(outfile, 'wt') as index_file:
+        index_file.write("##vcf_parser_index={0}\n".format(INDEX_VERSION))
+        index_file.write("##compression={0}\n".format(compression))
+        index_file.write("##bin_shift={0}\n".format(bin_shift))
+        stat = os.stat(filename)
+        index_file.write("##source_size={0}\n".format(stat.st_size))
+        index_file.write("##source_mtime={0!r}\n".format(stat.st_mtime))
+        index_file.write("#CHROM\tBIN\tOFFSET\n")
+        for contig, bins in contig_bins:
+            for bin_number, bin_offset in bins:
+                index_file.write("{0}\t{1}\t{2}\n".format(
+                    contig, bin_number, bin_offset))
+
+    logger.info("Index written to {0}".format(outfile))
+    return outfile
+
+
+class VariantIndex(object):
+    """
+    Holds the information from a vcf_parser index.
+
+    Use chunks() to get the offsets that has to be read to find all records
+    in a region.
+    """
+    def __init__(self, filename):
+        super(VariantIndex, self).__init__()
+        self.logger = getLogger(__name__)
+        self.filename = filename
+        self.format = 'vpi'
+        self.compression = None
+        self.bin_shift = BIN_SHIFT
+        self.source_size = None
+        self.source_mtime = None
+        # Maps contig names to a tuple with (sorted bins, offsets)
+        self.contigs = {}
+
+        self.logger.debug("Reading index {0}".format(filename))
+        bins = {}
+        with gzip.open(filename, 'rt') as index_file:
+            first_line = index_file.readline()
+            if not first_line.startswith('##vcf_parser_index='):
+                raise IOError("{0} is not a vcf_parser index".format(filename))
+            for line in index_file:
+                line = line.rstrip()
+                if line.startswith('##'):
+                    key, value = line[2:].split('=', 1)
+                    if key == 'compression':
+                        self.compression = value
+                    elif key == 'bin_shift':
+                        self.bin_shift = int(value)
+                    elif key == 'source_size':
+                        self.source_size = int(value)
+                    elif key == 'source_mtime':
+                        self.source_mtime = float(value)
+                elif line and not line.startswith('#'):
+                    contig, bin_number, offset = line.split('\t')
+                    if contig not in bins:
+                        bins[contig] = ([], [])
+                    bins[contig][0].append(int(bin_number))
+                    bins[contig][1].append(int(offset))
+
+        self.contigs = bins
+
+    def is_valid(self, vcf_file):
+        """
+        Check that the index was built from a file with the same size and
+        modification time.
+
+        Arguments:
+            vcf_file (str): Path to the indexed vcf
+
+        Returns:
+            bool: True if the index is up to date
+        """
+        stat = os.stat(vcf_file)
+        return ((self.source_size is None or
+                 self.source_size == stat.st_size) and
+                (self.source_mtime is None or
+                 self.source_mtime == stat.st_mtime))
+
+    def chunks(self, chrom, beg, end):
+        """
+        Return the chunks that may hold records overlapping a region.
+
+        The end of the chunk is allways None since we do not know where the
+        region ends, reading has to stop when the region is passed.
+
+        Arguments:
+            chrom (str): The contig name
+            beg (int): 0-based start of the region
+            end (int): 0-based, exclusive, end of the region
+
+        Returns:
+            chunks (list): A list with zero or one (offset, None) tuple
+        """
+        if chrom not in self.contigs or end <= beg:
+            return []
+
+        bins, offsets = self.contigs[chrom]
+        position = bisect_left(bins, beg >> self.bin_shift)
+        if position == len(bins) or bins[position] > (end - 1) >> self.bin_shift:
+            return []
+
+        return [(offsets[position], None)]
+
+    def contig_names(self):
+        """Return the names of the contigs in the index"""
+        return list(self.contigs)
+
+    def __repr__(self):
+        return "VariantIndex(filename={0},compression={1})".format(
+            self.filename, self.compression
+        )
+
+
+def find_index(filename):
+    """
+    Find and load an index for a vcf.
+
+    The vcf_parser index is used if it exists and is up to date, otherwise we
+    look for a tabix or csi index.
+
+    Arguments:
+        filename (str): Path to a vcf or bgzipped vcf
+
+    Returns:
+        index: A VariantIndex or TabixIndex, None if no index was found
+    """
+    logger = getLogger(__name__)
+    index_file = get_index_path(filename)
+    if os.path.exists(index_file):
+        index = VariantIndex(index_file)
+        if index.is_valid(filename):
+            return index
+        logger.warning("Index {0} is out of date, rebuild it with "
+                       "'vcf_parser index'".format(index_file))
+
+    index_file = find_tabix_index(filename)
+    if index_file:
+        return TabixIndex(index_file)
+
+    return None
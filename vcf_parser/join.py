@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+join.py
+
+Join single sample vcf files to a multi sample vcf.
+
+The files are walked at the same time with the heap from merge.py, so only
+the records at the current position are held in memory. Records with the
+same CHROM, POS, REF and ALT are joined to one record with the individuals
+of all files, in the order of the files. Individuals that has no record are
+filled with no calls.
+
+The ID is the first ID that is not '.', QUAL, FILTER and INFO are taken from
+the first file with the record. The FORMAT is the FORMAT keys of all joined
+records, with GT first.
+
+With regions only the records in the regions are joined, this requires that
+all files are indexed. With workers the contigs (split in windows of
+JOIN_WINDOW bases if the contig lengths are known) are joined by a pool of
+processes, only a few windows are handed to the pool at a time.
+
+The files are only open while they are read. If there are more than
+max_open_files files they are joined in groups of max_open_files files to
+temporary files, that are then joined, so that the limit of open files is
+not reached.
+"""
+
+import os
+import shutil
+
+from collections import OrderedDict
+from logging import getLogger
+from multiprocessing import Pool
+from tempfile import mkdtemp
+
+from vcf_parser.batches import (iter_batches, BATCH_SIZE)
+from vcf_parser.index import find_index
+from vcf_parser.merge import (merge_lines, merge_meta_lines)
+from vcf_parser.parallel import imap_bounded
+from vcf_parser.parser import VCFParser
+from vcf_parser.regions import RegionSet
+from vcf_parser.writer import VCFWriter
+
+# The number of bases in the windows that are joined by the workers
+JOIN_WINDOW = 10000000
+# The largest number of files that are open at the same time
+MAX_OPEN_FILES = 256
+
+_inputs = None
+
+
+def missing_value(key):
+    """Return the value for a FORMAT key that is missing"""
+    if key == 'GT':
+        return './.'
+    return '.'
+
+
+def join_records(records, sample_counts):
+    """
+    Join the records of one variant from several files.
+
+    Arguments:
+        records (list): The splitted variant line from each file, None for
+                        the files without the variant
+        sample_counts (list): The number of individuals in each file
+
+    Returns:
+        columns (list): The columns of the joined variant line
+    """
+    present = [columns for columns in records if columns is not None]
+    gt_formats = []
+    for columns in present:
+        if len(columns) > 8 and columns[8] not in gt_formats:
+            gt_formats.append(columns[8])
+
+    keys = ['GT']
+    for gt_format in gt_formats:
+        for key in gt_format.split(':'):
+            if key not in keys:
+                keys.append(key)
+    gt_format = ':'.join(keys)
+    # If all records have the same FORMAT the calls can be used as they are
+    same_format = gt_formats == [gt_format]
+    missing_call = ':'.join(missing_value(key) for key in keys)
+
+    first = present[0]
+    columns = list(first[:8])
+    for other in present:
+        if other[2] != '.':
+            columns[2] = other[2]
+            break
+    columns.append(gt_format)
+
+    for record, sample_count in zip(records, sample_counts):
+        if record is None:
+            columns.extend([missing_call] * sample_count)
+        elif same_format:
+            columns.extend(record[9:])
+        else:
+            record_keys = record[8].split(':') if len(record) > 8 else []
+            for call in record[9:]:
+                values = dict(zip(record_keys, call.split(':')))
+                columns.append(':'.join(
+                    values.get(key, missing_value(key)) for key in keys))
+
+    return columns
+
+
+def join_lines(merged_lines, sample_counts):
+    """
+    Join the merged variant lines of some files.
+
+    Arguments:
+        merged_lines (iterable): (file index, variant line) tuples sorted
+                                 on position, like from merge_lines
+        sample_counts (list): The number of individuals in each file
+
+    Yields:
+        line (str): The joined variant lines
+    """
+    logger = getLogger(__name__)
+    number_of_files = len(sample_counts)
+    position = None
+    # The records at the current position, (REF, ALT) as keys
+    records = OrderedDict()
+    for index, line in merged_lines:
+        columns = line.split('\t')
+        if (columns[0], columns[1]) != position:
+            for row in records.values():
+                yield '\t'.join(join_records(row, sample_counts))
+            records = OrderedDict()
+            position = (columns[0], columns[1])
+
+        key = (columns[3], columns[4])
+        row = records.get(key)
+        if row is None:
+            row = records[key] = [None] * number_of_files
+        if row[index] is not None:
+            logger.warning("Variant {0} is found more than once in the same "\
+                           "file, only the first is used".format(
+                               '_'.join(columns[:2] + list(key))))
+            continue
+        row[index] = columns
+
+    for row in records.values():
+        yield '\t'.join(join_records(row, sample_counts))
+
+
+def region_lines(parser, chrom, start, end, after=0):
+    """
+    Yield the variant lines of a file that overlap a region.
+
+    Arguments:
+        parser (VCFParser): The parser for a indexed file
+        chrom (str): The contig
+        start (int): First position of the region
+        end (int): Last position of the region
+        after (int): Only lines with a larger position are yielded
+
+    Yields:
+        line (str)
+    """
+    for line in parser._fetch_lines(chrom, start, end):
+        if int(line.split('\t', 2)[1]) > after:
+            yield line
+
+
+def input_lines(path):
+    """
+    Yield the variant lines of a file.
+
+    The file is opened when the first line is asked for and closed when all
+    lines are read.
+
+    Arguments:
+        path (str): Path to a vcf
+
+    Yields:
+        line (str)
+    """
+    parser = VCFParser(infile=path, threads=1)
+    try:
+        for line in parser._variant_lines():
+            yield line
+    finally:
+        parser.vcf.close()
+
+
+def init_worker(paths, sample_counts, contigs):
+    """Read the headers of the files in a worker process"""
+    global _inputs
+    parsers = []
+    for path in paths:
+        parser = VCFParser(infile=path, threads=1)
+        # The files are opened again for each region
+        parser.vcf.close()
+        parsers.append(parser)
+    _inputs = (parsers, sample_counts, contigs)
+
+
+def join_region(region):
+    """
+    Join the records in a region, used by the workers.
+
+    Arguments:
+        region (tuple): (chrom, start, end, after), see region_lines
+
+    Returns:
+        lines (list): The joined variant lines
+    """
+    parsers, sample_counts, contigs = _inputs
+    chrom, start, end, after = region
+    merged = merge_lines(
+        [region_lines(parser, chrom, start, end, after) for parser in parsers],
+        contigs, [parser.infile for parser in parsers])
+    return list(join_lines(merged, sample_counts))
+
+
+def join_group(group):
+    """
+    Join a group of files to a vcf, used when there are more files than
+    max_open_files.
+
+    Arguments:
+        group (tuple): (paths, regions, outfile)
+
+    Returns:
+        outfile (str): The path to the joined vcf
+    """
+    paths, regions, outfile = group
+    joiner = CohortJoiner(paths, regions=regions, max_open_files=len(paths))
+    with VCFWriter(outfile, joiner.metadata) as writer:
+        writer.write_header(joiner.header_lines)
+        for line in joiner._variant_lines():
+            writer.write_variant_line(line)
+    return outfile
+
+
+class CohortJoiner(VCFParser):
+    """
+    Join sorted vcf files with different individuals.
+
+    The joiner works like a VCFParser for the joined vcf, iterate over it to
+    get the variant dictionaries or use iter_batches to get the genotype
+    matrices.
+
+    Arguments:
+        paths (list): Paths to sorted vcf files
+        regions (list): (chrom, start, end) tuples, if given only the
+                        variants in these regions are joined. The regions
+                        can be unsorted and overlapping. The files must be
+                        indexed.
+        workers (int): Number of processes that joins the contigs, all
+                       files must be indexed
+        max_open_files (int): The largest number of files that are open at
+                              the same time, if there are more files they
+                              are joined in groups
+
+    The other arguments are the same as for VCFParser.
+    """
+    def __init__(self, paths, split_variants=False, check_info=False,
+                 allele_symbol='0', lazy=False, info_fields=None,
+                 format_fields=None, genotype_cache_size=None, regions=None,
+                 workers=None, max_open_files=MAX_OPEN_FILES):
+        if not paths:
+            raise IOError("There are no files to join")
+        self.paths = list(paths)
+        self.inputs = []
+        for path in self.paths:
+            parser = VCFParser(infile=path, threads=1)
+            # The files are opened again when they are read
+            parser.vcf.close()
+            self.inputs.append(parser)
+        super(CohortJoiner, self).__init__(
+            fileformat=self.inputs[0].metadata.fileformat,
+            split_variants=split_variants,
+            check_info=check_info,
+            allele_symbol=allele_symbol,
+            lazy=lazy,
+            info_fields=info_fields,
+            format_fields=format_fields,
+            genotype_cache_size=genotype_cache_size
+        )
+        self.workers = workers
+        self.max_open_files = max(max_open_files, 2)
+        self.join_regions = regions
+        self.sample_counts = [len(parser.individuals) for parser in self.inputs]
+
+        individuals = []
+        for parser in self.inputs:
+            for individual in parser.individuals:
+                if individual in individuals:
+                    raise IOError("Individual {0} is found in more than one "\
+                                  "file".format(individual))
+                individuals.append(individual)
+        column_line = '#' + '\t'.join(self.inputs[0].header[:8] + ['FORMAT'] +
+                                      individuals)
+        self.header_lines = merge_meta_lines(self.inputs) + [column_line]
+        for line in self.header_lines:
+            if line.startswith('##'):
+                self.metadata.parse_meta_data(line)
+            else:
+                self.metadata.parse_header_line(line)
+        self.individuals = self.metadata.individuals
+        self.header = self.metadata.header
+        self.vep_header = self.metadata.vep_columns
+        self.contigs = list(self.metadata.contig_dict)
+
+    def _use_workers(self):
+        """Check if the files can be joined with a pool of processes"""
+        if not (self.workers and self.workers > 1):
+            return False
+        if self.lazy:
+            self.logger.warning("Lazy variants can not be joined with "\
+                                "workers, joining in one process")
+            return False
+        for parser in self.inputs:
+            if not parser.index:
+                parser.index = find_index(parser.infile)
+            if not parser.index:
+                self.logger.warning("{0} is not indexed, joining in one "\
+                                    "process".format(parser.infile))
+                return False
+        return True
+
+    def _regions(self):
+        """
+        Return the regions to join as (chrom, start, end, after) tuples.
+
+        after is used so that a variant that overlaps two regions is only
+        joined in the first.
+        """
+        if self.join_regions is not None:
+            # The regions are sorted and merged so that no region is
+            # skipped by the after of an earlier region
+            region_set = RegionSet(self.join_regions)
+            contigs = [contig for contig in self.contigs 
+                       if contig in region_set.starts]
+            for chrom, start, end in self.join_regions:
+                chrom = str(chrom)
+                if chrom in region_set.starts and chrom not in contigs:
+                    contigs.append(chrom)
+            regions = []
+            for chrom in contigs:
+                after = 0
+                for start, end in zip(region_set.starts[chrom], 
+                                      region_set.ends[chrom]):
+                    if end == float('inf'):
+                        end = None
+                    regions.append((chrom, start, end, after))
+                    after = end
+            return regions
+
+        contigs = list(self.contigs)
+        for parser in self.inputs:
+            for contig in parser.index.contig_names():
+                if contig not in contigs:
+                    contigs.append(contig)
+        lengths = dict(
+            (contig_line['ID'], int(contig_line['length']))
+            for contig_line in self.metadata.contig_lines
+        )
+        regions = []
+        for contig in contigs:
+            if contig not in lengths:
+                regions.append((contig, 1, None, 0))
+                continue
+            for start in range(1, lengths[contig] + 1, JOIN_WINDOW):
+                end = start + JOIN_WINDOW - 1
+                regions.append((contig, start, end, start - 1))
+        return regions
+
+    def _variant_lines(self):
+        """
+        Yield the joined variant lines.
+
+        Yields:
+            line (str): A joined variant line
+        """
+        if len(self.paths) > self.max_open_files:
+            for line in self._group_lines():
+                yield line
+
+        elif self._use_workers():
+            regions = self._regions()
+            self.logger.info("Joining {0} regions with {1} processes".format(
+                len(regions), self.workers))
+            pool = Pool(
+                processes=self.workers,
+                initializer=init_worker,
+                initargs=(self.paths, self.sample_counts, self.contigs)
+            )
+            try:
+                for lines in imap_bounded(pool, join_region, regions,
+                                          2 * self.workers):
+                    for line in lines:
+                        yield line
+            finally:
+                pool.terminate()
+
+        elif self.join_regions is not None:
+            names = [parser.infile for parser in self.inputs]
+            for chrom, start, end, after in self._regions():
+                merged = merge_lines(
+                    [region_lines(parser, chrom, start, end, after)
+                     for parser in self.inputs],
+                    self.contigs, names)
+                for line in join_lines(merged, self.sample_counts):
+                    yield line
+
+        else:
+            merged = merge_lines(
+                [input_lines(path) for path in self.paths],
+                self.contigs, self.paths)
+            for line in join_lines(merged, self.sample_counts):
+                yield line
+
+    def _group_lines(self):
+        """
+        Yield the joined variant lines when there are more files than
+        max_open_files.
+
+        The files are joined in groups of max_open_files files to temporary
+        files, by the workers if there are any, and the temporary files are
+        then joined.
+
+        Yields:
+            line (str): A joined variant line
+        """
+        tmp_dir = mkdtemp(prefix='vcf_parser_join_')
+        try:
+            groups = []
+            for start in range(0, len(self.paths), self.max_open_files):
+                groups.append((
+                    self.paths[start:start + self.max_open_files],
+                    self.join_regions,
+                    os.path.join(tmp_dir, 'group_{0}.vcf'.format(len(groups)))
+                ))
+            self.logger.info("Joining {0} files in {1} groups".format(
+                len(self.paths), len(groups)))
+            if self.workers and self.workers > 1:
+                pool = Pool(processes=self.workers)
+                try:
+                    group_paths = pool.map(join_group, groups)
+                finally:
+                    pool.terminate()
+            else:
+                group_paths = [join_group(group) for group in groups]
+
+            joiner = CohortJoiner(group_paths,
+                                  max_open_files=self.max_open_files)
+            for line in joiner._variant_lines():
+                yield line
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def __iter__(self):
+        for line in self._variant_lines():
+            for variant in self._format_line(line):
+                yield variant
+
+    def iter_batches(self, size=BATCH_SIZE, fields=()):
+        """
+        Yield the joined variants in batches of numpy arrays.
+
+        See VCFParser.iter_batches.
+        """
+        for batch in iter_batches(self._variant_lines(), self.metadata,
+                                  size=size, fields=fields):
+            yield batch
+
+    def __repr__(self):
+        return "CohortJoiner(files={0})".format(len(self.paths))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+merge.py
+
+Merge coordinate sorted vcf files.
+
+Callers often produce one vcf per chromosome or per interval. The files are
+merged by keeping the next variant line of each file in a heap, so only one
+line per file is held in memory no matter how large the files are.
+
+The contigs are ordered as in the contig lines of the headers. Contigs that
+are not found in any header are put last, in the order they are found.
+All files must have the same individuals and be sorted.
+"""
+
+import heapq
+
+from logging import getLogger
+
+from vcf_parser.header_parser import HeaderParser
+from vcf_parser.parser import VCFParser
+from vcf_parser.writer import VCFWriter
+
+# The meta data lines that are merged on their ID
+MERGED_LINES = {
+    'INFO': 'info_dict',
+    'FORMAT': 'format_dict',
+    'FILTER': 'filter_dict',
+    'contig': 'contig_dict',
+    'ALT': 'alt_dict',
+}
+
+
+def merge_meta_lines(parsers):
+    """
+    Merge the meta data lines of some vcf files.
+
+    The meta data lines of the first file are used and the INFO, FORMAT,
+    FILTER, contig and ALT lines with new IDs from the other files are
+    added to them. The header of the first parser is updated with the
+    added lines.
+
+    Arguments:
+        parsers (list): VCFParsers for the files
+
+    Returns:
+        meta_lines (list): The merged lines that starts with '##'
+    """
+    header_parser = parsers[0].metadata
+    meta_lines = [line for line in parsers[0].header_lines
+                  if line.startswith('##')]
+
+    for parser in parsers[1:]:
+        for line in parser.header_lines:
+            key = line[2:].split('=')[0]
+            if key not in MERGED_LINES or line in meta_lines:
+                continue
+            line_parser = HeaderParser()
+            line_parser.parse_meta_data(line)
+            line_id = list(getattr(line_parser, MERGED_LINES[key]))[0]
+            if line_id not in getattr(header_parser, MERGED_LINES[key]):
+                header_parser.parse_meta_data(line)
+                meta_lines.append(line)
+
+    return meta_lines
+
+
+def merge_headers(parsers):
+    """
+    Merge the headers of some vcf files with the same individuals.
+
+    See merge_meta_lines for how the lines are merged.
+
+    Arguments:
+        parsers (list): VCFParsers for the files
+
+    Returns:
+        header_lines (list): The merged header lines
+
+    Raises:
+        IOError: If the files have different individuals
+    """
+    for parser in parsers[1:]:
+        if parser.individuals != parsers[0].individuals:
+            raise IOError("{0} and {1} have different individuals".format(
+                parsers[0].infile, parser.infile))
+    return merge_meta_lines(parsers) + [parsers[0].header_lines[-1]]
+
+
+def merge_lines(line_iterators, contigs=(), names=None):
+    """
+    Merge the variant lines of some sorted vcf files.
+
+    Arguments:
+        line_iterators (list): Iterators with the variant lines of each file
+        contigs (iterable): The contigs in the order they should come
+        names (list): The names of the files, used in the error messages
+
+    Yields:
+        (index, line) (tuple): The index of the file and a variant line
+
+    Raises:
+        SyntaxError: If one of the files is not sorted
+    """
+    logger = getLogger(__name__)
+    ranks = dict((contig, rank) for rank, contig in enumerate(contigs))
+
+    def get_key(line):
+        """Return the (contig rank, position) of a variant line"""
+        variant_info = line.split('\t', 2)
+        rank = ranks.get(variant_info[0])
+        if rank is None:
+            logger.warning("Contig {0} is not found in the header, it is "\
+                           "put after the known contigs".format(
+                               variant_info[0]))
+            rank = ranks[variant_info[0]] = len(ranks)
+        return (rank, int(variant_info[1]))
+
+    iterators = [iter(lines) for lines in line_iterators]
+    names = names or list(range(len(iterators)))
+    heap = []
+    for index, lines in enumerate(iterators):
+        for line in lines:
+            heap.append((get_key(line), index, line))
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        key, index, line = heap[0]
+        yield index, line
+        for next_line in iterators[index]:
+            next_key = get_key(next_line)
+            if next_key < key:
+                raise SyntaxError("{0} is not sorted, {1} comes after "\
+                                  "{2}".format(
+                                      names[index],
+                                      ':'.join(next_line.split('\t', 2)[:2]),
+                                      ':'.join(line.split('\t', 2)[:2])))
+            heapq.heapreplace(heap, (next_key, index, next_line))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def open_parsers(paths, **kwargs):
+    """
+    Open a VCFParser for each file.
+
+    Arguments:
+        paths (list): Paths to the vcf files
+        **kwargs: Options for the VCFParsers
+
+    Returns:
+        parsers (list)
+    """
+    if not paths:
+        raise IOError("There are no files to merge")
+    return [VCFParser(infile=path, **kwargs) for path in paths]
+
+
+def merge_sorted(paths, **kwargs):
+    """
+    Yield the variants of some sorted vcf files in genomic order.
+
+    Each file is parsed by its own VCFParser, variants at the same position
+    are yielded in the order of the files.
+
+    Arguments:
+        paths (list): Paths to sorted vcf files with the same individuals
+        **kwargs: Options for the VCFParsers, like split_variants
+
+    Yields:
+        variant (dict): The variants in genomic order
+    """
+    parsers = open_parsers(paths, **kwargs)
+    try:
+        merge_headers(parsers)
+        contigs = list(parsers[0].metadata.contig_dict)
+        for index, line in merge_lines(
+                [parser._variant_lines() for parser in parsers], contigs,
+                paths):
+            for variant in parsers[index]._format_line(line):
+                yield variant
+    finally:
+        for parser in parsers:
+            parser.vcf.close()
+
+
+def write_merged(paths, outfile):
+    """
+    Write the merged variant lines of some sorted vcf files.
+
+    The variant lines are written as they are, without being parsed, with a
+    VCFWriter. If outfile is a path that ends with '.gz' the merged vcf is
+    compressed with BGZF and indexed with tabix.
+
+    Arguments:
+        paths (list): Paths to sorted vcf files with the same individuals
+        outfile (str or file): A path or a file opened for writing text
+
+    Returns:
+        number_of_variants (int): The number of variant lines written
+    """
+    parsers = open_parsers(paths, binary=True)
+    try:
+        header_lines = merge_headers(parsers)
+        with VCFWriter(outfile, parsers[0].metadata) as writer:
+            writer.write_header(header_lines)
+            contigs = list(parsers[0].metadata.contig_dict)
+            for index, line in merge_lines(
+                    [parser._variant_lines() for parser in parsers], contigs,
+                    paths):
+                writer.write_variant_line(line)
+    finally:
+        for parser in parsers:
+            parser.vcf.close()
+    return writer.number_of_variants
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+parallel.py
+
+Parse one vcf file with a pool of processes.
+
+The variant part of the file is cut into ranges that start and end at line
+boundaries. For uncompressed files the ranges are byte offsets, for bgzipped
+files they are virtual offsets that start in the block where the range
+begins. Each range is read by a worker process that decompresses the lines
+and checks the regions and the filter. The lines that are left are sent 
+back and the variants are built by the parent process, since variant 
+dictionaries with Genotype objects are more expensive to pickle than to 
+build. The results are used in the same order as the ranges, so the 
+variants come out in the order they are written in the file. Only a few
+ranges are handed to the pool at a time so a slow consumer does not make
+the results pile up in memory.
+"""
+
+import os
+
+from collections import deque
+from logging import getLogger
+from multiprocessing import Pool
+
+from vcf_parser.filters import VariantFilter
+from vcf_parser.genotype import GenotypeCache
+from vcf_parser.bgzf import (BgzfReader, block_offsets, make_virtual_offset)
+from vcf_parser.index import open_raw_vcf
+from vcf_parser.utils import (format_variant, split_variants, SplitPlan)
+
+# Approximate size of the ranges, compressed size for bgzipped files
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# These are set in each worker process by init_worker
+_filter = None
+_regions = None
+
+
+def find_data_start(handle):
+    """
+    Find where the first variant line starts.
+
+    Arguments:
+        handle: A BgzfReader or a file opened in binary mode
+
+    Returns:
+        offset (int): The (virtual) offset of the first variant line
+    """
+    handle.seek(0)
+    offset = 0
+    for line in iter(handle.readline, b''):
+        if not line.startswith(b'#'):
+            break
+        offset = handle.tell()
+
+    return offset
+
+
+def _plain_ranges(filename, data_start, number_of_ranges):
+    """Split an uncompressed file in ranges of byte offsets"""
+    file_size = os.path.getsize(filename)
+    step = max((file_size - data_start) // number_of_ranges, 1)
+    boundaries = [data_start]
+    with open(filename, 'rb') as handle:
+        for number in range(1, number_of_ranges):
+            target = data_start + number * step
+            if target <= boundaries[-1]:
+                continue
+            # Step back one byte so that a target on a line start is kept
+            handle.seek(target - 1)
+            handle.readline()
+            boundary = handle.tell()
+            if boundary >= file_size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _bgzf_ranges(filename, data_start, number_of_ranges):
+    """Split a BGZF file in ranges of virtual offsets"""
+    offsets = list(block_offsets(filename))
+    file_size = os.path.getsize(filename)
+    step = max(file_size // number_of_ranges, 1)
+
+    boundaries = [data_start]
+    with BgzfReader(filename, threads=1) as reader:
+        position = 0
+        for number in range(1, number_of_ranges):
+            target = number * step
+            # Find the first block after the target
+            while position < len(offsets) and offsets[position] < target:
+                position += 1
+            if position >= len(offsets) - 1:
+                break
+            block_offset = offsets[position]
+            if make_virtual_offset(block_offset, 0) <= boundaries[-1]:
+                continue
+            # Read from the previous block to find the first line that
+            # starts in this block
+            reader.seek(make_virtual_offset(offsets[position - 1], 0))
+            while True:
+                if not reader.readline():
+                    boundary = None
+                    break
+                boundary = reader.tell()
+                if boundary >> 16 >= block_offset:
+                    break
+            if boundary is None:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+
+        # Everything after the last boundary goes to the last range
+        boundaries.append(None)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def split_file(filename, number_of_ranges):
+    """
+    Split the variant lines of a file in ranges.
+
+    Arguments:
+        filename (str): Path to a vcf or bgzipped vcf
+        number_of_ranges (int): Number of ranges wanted, fewer ranges could
+                                be returned for small files
+
+    Returns:
+        ranges (list): A list of (start, end) offsets. end is None if the
+                       range reaches to the end of the file
+    """
+    handle = open_raw_vcf(filename)
+    try:
+        data_start = find_data_start(handle)
+        is_compressed = isinstance(handle, BgzfReader)
+    finally:
+        handle.close()
+
+    if is_compressed:
+        return _bgzf_ranges(filename, data_start, number_of_ranges)
+    return _plain_ranges(filename, data_start, number_of_ranges)
+
+
+def init_worker(header_parser, filter, regions):
+    """Store the filter and the regions in the worker process"""
+    global _filter, _regions
+    _filter = None
+    if filter:
+        _filter = VariantFilter(filter, header_parser)
+    _regions = regions
+
+
+def read_range(file_range):
+    """
+    Read the variant lines in a range of a file.
+
+    Only the lines inside the regions that matches the filter are returned.
+    The variants are built by the parent process, strings are much cheaper
+    to send between processes than variant dictionaries with Genotype 
+    objects.
+
+    Arguments:
+        file_range (tuple): (filename, start, end)
+
+    Returns:
+        lines (list): The variant lines without trailing whitespace
+    """
+    filename, start, end = file_range
+    lines = []
+    handle = open_raw_vcf(filename)
+    try:
+        handle.seek(start)
+        while end is None or handle.tell() < end:
+            line = handle.readline()
+            if not line:
+                break
+            if line.startswith(b'#') or line.count(b'\t') < 7:
+                continue
+            line = line.decode('utf-8', 'replace').rstrip()
+            if _regions is not None and not _regions(line):
+                continue
+            if _filter is not None and not _filter(line):
+                continue
+            lines.append(line)
+    finally:
+        handle.close()
+
+    return lines
+
+
+def imap_bounded(pool, function, iterable, max_pending):
+    """
+    Like Pool.imap but only max_pending items are handed to the pool at once.
+
+    Pool.imap hands all items to the pool and keeps the results until they
+    are used, so a slow consumer makes the results pile up in memory.
+
+    Arguments:
+        pool (Pool): The pool of processes
+        function (callable): The function to call in the processes
+        iterable (iterable): The arguments to the function
+        max_pending (int): The largest number of items that are handed to 
+                           the pool, or waiting to be used, at once
+
+    Yields:
+        result: The results in the same order as the arguments
+    """
+    pending = deque()
+    for argument in iterable:
+        pending.append(pool.apply_async(function, (argument,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def parallel_lines(filename, header_parser, workers, chunk_size=CHUNK_SIZE,
+                   filter=None, regions=None, max_pending=None):
+    """
+    Read the variant lines of a vcf file with a pool of processes.
+
+    The ranges are handed to the pool a few at a time so that only 
+    max_pending ranges are read, or waiting to be consumed, at once.
+
+    Arguments:
+        filename (str): Path to a vcf or bgzipped vcf
+        header_parser (HeaderParser): The parsed header of the file
+        workers (int): Number of processes
+        chunk_size (int): Approximate size of the ranges in bytes
+        filter (str): If given, only lines that matches this filter 
+                      expression are returned
+        regions (RegionSet): If given, only lines inside the regions are
+                             returned
+        max_pending (int): The number of ranges that are handed to the pool 
+                           at once, defaults to two per process
+
+    Yields:
+        line (str): The variant lines in the same order as in the file
+    """
+    logger = getLogger(__name__)
+    number_of_ranges = max(workers, os.path.getsize(filename) // chunk_size)
+    ranges = split_file(filename, number_of_ranges)
+    logger.info("Reading {0} in {1} ranges with {2} processes".format(
+        filename, len(ranges), workers))
+    max_pending = max_pending or 2 * workers
+
+    pool = Pool(
+        processes=workers,
+        initializer=init_worker,
+        initargs=(header_parser, filter, regions)
+    )
+    try:
+        file_ranges = [(filename, start, end) for start, end in ranges]
+        for lines in imap_bounded(pool, read_range, file_ranges, max_pending):
+            for line in lines:
+                yield line
+    finally:
+        pool.terminate()
+
+
+def build_variants(line, header_parser, parser_options, genotype_cache=None,
+                   split_plan=None):
+    """
+    Build the variants of a line.
+
+    Arguments:
+        line (str): A variant line
+        header_parser (HeaderParser): The parsed header of the file
+        parser_options (dict): The options for format_variant and 
+                               split_variants
+        genotype_cache (GenotypeCache): If given, genotypes are reused for 
+                                        identical calls
+        split_plan (SplitPlan): The split plan for the header
+
+    Returns:
+        variants (list): A list with variant dictionaries
+    """
+    variant = format_variant(
+        line = line,
+        header_parser = header_parser,
+        check_info = parser_options['check_info'],
+        info_fields = parser_options['info_fields'],
+        format_fields = parser_options['format_fields'],
+        genotype_cache = genotype_cache
+    )
+    if not (parser_options['split_variants'] and 
+            len(variant['ALT'].split(',')) > 1):
+        return [variant]
+
+    return list(split_variants(
+        variant_dict=variant,
+        header_parser=header_parser,
+        allele_symbol=parser_options['allele_symbol'],
+        info_fields=parser_options['info_fields'],
+        format_fields=parser_options['format_fields'],
+        genotype_cache=genotype_cache,
+        split_plan=split_plan))
+
+
+def parse_parallel(filename, header_parser, workers, split_variants=False,
+                   check_info=False, allele_symbol='0', chunk_size=CHUNK_SIZE,
+                   info_fields=None, format_fields=None,
+                   genotype_cache_size=None, filter=None, regions=None):
+    """
+    Parse a vcf file with a pool of processes.
+
+    The lines are read and filtered by the processes, see parallel_lines, 
+    and the variants are built in this process.
+
+    Arguments:
+        filename (str): Path to a vcf or bgzipped vcf
+        header_parser (HeaderParser): The parsed header of the file
+        workers (int): Number of processes
+        split_variants (bool): If multiallelic variants should be splitted
+        check_info (bool): If the info fields should be checked
+        allele_symbol (str): Symbol for unobserved alleles when splitting
+        chunk_size (int): Approximate size of the ranges in bytes
+        info_fields (set): If given, only these INFO keys are parsed
+        format_fields (set): If given, only these FORMAT keys are used
+        genotype_cache_size (int): If given, genotypes are reused for 
+                                   identical calls
+        filter (str): If given, only lines that matches this filter 
+                      expression are parsed
+        regions (RegionSet): If given, only lines inside the regions are
+                             parsed
+
+    Yields:
+        variant (dict): The variants in the same order as in the file
+    """
+    parser_options = {
+        'split_variants': split_variants,
+        'check_info': check_info,
+        'allele_symbol': allele_symbol,
+        'info_fields': info_fields,
+        'format_fields': format_fields,
+    }
+    genotype_cache = None
+    if genotype_cache_size:
+        genotype_cache = GenotypeCache(maxsize=genotype_cache_size)
+    split_plan = SplitPlan(header_parser)
+
+    for line in parallel_lines(filename, header_parser, workers,
+                               chunk_size=chunk_size, filter=filter,
+                               regions=regions):
+        for variant in build_variants(line, header_parser, parser_options,
+                                      genotype_cache, split_plan):
+            yield variant
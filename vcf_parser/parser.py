@@ -79,15 +79,28 @@ import logging
 from codecs import open, getreader
 
 
-from vcf_parser import (Genotype, HeaderParser)
-from vcf_parser.utils import (format_variant, split_variants)
+from vcf_parser import (GenotypeCache, HeaderParser, LazyVariant)
+from vcf_parser.bgzf import (BgzfReader, is_bgzf)
+from vcf_parser.cache import (VariantCache, CACHE_SIZE)
+from vcf_parser.filters import VariantFilter
+from vcf_parser.index import (find_index, open_raw_vcf)
+from vcf_parser.parallel import parallel_lines
+from vcf_parser.batches import (iter_batches, BATCH_SIZE)
+from vcf_parser.readers import (read_lines, MmapReader, decode_record)
+from vcf_parser.regions import RegionSet
+from vcf_parser.utils import (format_variant, build_variant, split_variants,
+                              SplitPlan)
 
 ####            Parser:         ####
 
 class VCFParser(object):
     """docstring for VCFParser"""
     def __init__(self, infile=None, fsock=None, split_variants=False, 
-                check_info=False, allele_symbol='0', fileformat = None):
+                check_info=False, allele_symbol='0', fileformat = None,
+                threads=None, workers=None, binary=False, lazy=False,
+                info_fields=None, format_fields=None, samples=None,
+                genotype_cache_size=None, cache_dir=None, cache_size=CACHE_SIZE,
+                filter=None, regions=None):
         super(VCFParser, self).__init__()
         self.logger = logging.getLogger(__name__)
         
@@ -106,12 +119,62 @@ class VCFParser(object):
         self.allele_symbol = allele_symbol
         self.logger.info("Allele symbol = {0}".format(self.allele_symbol))
         
+        # Number of threads used to decompress BGZF files
+        self.threads = threads
+        # The index used for region queries, loaded on the first fetch
+        self.index = None
+        # A reader for random access, opened on the first use
+        self._random_access = None
+        # Number of processes used to parse the variants
+        self.workers = workers
+        self.logger.info("Workers = {0}".format(self.workers))
+        # If the file should be read as bytes instead of through a codec
+        self.binary = binary
+        self.logger.info("Binary = {0}".format(self.binary))
+        # If the variants should be LazyVariants that are parsed on demand
+        self.lazy = lazy
+        self.logger.info("Lazy = {0}".format(self.lazy))
+        # The INFO and FORMAT keys that should be parsed, None means all
+        self.info_fields = None
+        if info_fields is not None:
+            self.info_fields = frozenset(info_fields)
+        self.logger.info("Info fields = {0}".format(info_fields))
+        self.format_fields = None
+        if format_fields is not None:
+            self.format_fields = frozenset(format_fields)
+        self.logger.info("Format fields = {0}".format(format_fields))
+        # Genotypes are reused for identical calls if a cache size is given
+        self.genotype_cache_size = genotype_cache_size
+        self.genotype_cache = None
+        if genotype_cache_size:
+            self.genotype_cache = GenotypeCache(maxsize=genotype_cache_size)
+        self.logger.info("Genotype cache size = {0}".format(
+            genotype_cache_size))
+        # Parsed variants are stored in and loaded from a cache directory
+        self.cache = None
+        if cache_dir:
+            if not infile or lazy:
+                self.logger.warning("Only files that are not parsed lazy "\
+                                    "can be cached, not using the cache")
+            else:
+                self.cache = VariantCache(cache_dir, max_size=cache_size)
+        self.logger.info("Cache = {0}".format(self.cache))
+        
         self.logger.info("Initializing HeaderParser")
         self.metadata = HeaderParser()
+        # How multiallelic variants are splitted, made from the header when
+        # the first variant is splitted
+        self.split_plan = None
+        # If only some of the individuals should be parsed
+        if samples is not None:
+            self.metadata.samples = list(samples)
+            self.logger.info("Samples = {0}".format(self.metadata.samples))
         # These are the individuals described in the header
         self.individuals = []
         # This is the header line of the vcf
         self.header = []
+        # The header lines as they are found in the vcf
+        self.header_lines = []
         
         # If there are no file or stream the user can add variants manually.
         # These will be added to self.variants
@@ -122,26 +185,42 @@ class VCFParser(object):
             if fsock:
                 if not infile and hasattr(fsock, 'name'):
                     self.logger.info("Reading vcf form stdin")
-                    if sys.version_info < (3, 0):
-                        self.logger.info("Using codecs to read stdin")
-                        sys.stdin = getreader('utf-8')(fsock)
-                    
-                    self.vcf = sys.stdin
+                    if self.binary:
+                        self.vcf = getattr(fsock, 'buffer', fsock)
+                    else:
+                        if sys.version_info < (3, 0):
+                            self.logger.info("Using codecs to read stdin")
+                            sys.stdin = getreader('utf-8')(fsock)
+                        
+                        self.vcf = sys.stdin
             
             else:
                 self.logger.info("Reading vcf form file {0}".format(infile))
                 file_name, file_extension = os.path.splitext(infile)
                 if file_extension == '.gz':
                     self.logger.debug("Vcf is zipped")
-                    self.vcf = getreader('utf-8')(gzip.open(infile), errors='replace')
+                    if is_bgzf(infile):
+                        self.logger.debug("Vcf is compressed with bgzip")
+                        if self.binary:
+                            self.vcf = BgzfReader(infile, threads=self.threads)
+                        else:
+                            self.vcf = BgzfReader(infile, threads=self.threads,
+                                              encoding='utf-8', errors='replace')
+                    elif self.binary:
+                        self.vcf = gzip.open(infile, 'rb')
+                    else:
+                        self.vcf = getreader('utf-8')(gzip.open(infile), errors='replace')
                 elif file_extension == '.vcf':
-                    self.vcf = open(infile, mode='r', encoding='utf-8', errors='replace')
+                    if self.binary:
+                        self.vcf = MmapReader(infile)
+                    else:
+                        self.vcf = open(infile, mode='r', encoding='utf-8', errors='replace')
                 else:
                     raise IOError("File is not in a supported format!\n"
                                         " Or use correct ending(.vcf or .vcf.gz)")
             
             self.logger.debug("Reading first line.")
-            self.next_line = self.vcf.readline().rstrip()
+            self.next_line = self._readline()
             self.current_line = self.next_line
            
             # First line is allways a metadata line
@@ -151,11 +230,12 @@ class VCFParser(object):
             
             # Parse the metadata lines
             while self.next_line.startswith('#'):
+                self.header_lines.append(self.next_line)
                 if self.next_line.startswith('##'):
                     self.metadata.parse_meta_data(self.next_line)
                 elif self.next_line.startswith('#'):
                     self.metadata.parse_header_line(self.next_line)
-                self.next_line = self.vcf.readline().rstrip()
+                self.next_line = self._readline()
             
             self.individuals = self.metadata.individuals
             self.logger.info("Setting self.individuals to {0}".format(
@@ -169,6 +249,29 @@ class VCFParser(object):
                 raise IOError("Please initialize with a fileformat.")
             else:
                 self.metadata.fileformat = self.fileformat
+        
+        # Lines that does not match the filter are skipped before they are 
+        # parsed, the filter is compiled for the header of the vcf
+        self.filter = None
+        if filter is not None:
+            if not isinstance(filter, VariantFilter):
+                filter = VariantFilter(filter, self.metadata)
+            self.filter = filter
+        self.logger.info("Filter = {0}".format(self.filter))
+        # Only the lines where POS is inside the regions are parsed
+        self.regions = None
+        if regions is not None:
+            if not isinstance(regions, RegionSet):
+                regions = RegionSet(regions)
+            self.regions = regions
+        self.logger.info("Regions = {0}".format(self.regions))
+    
+    def _readline(self):
+        """Read the next line from the vcf as text without trailing whitespace"""
+        line = self.vcf.readline()
+        if self.binary:
+            line = line.decode('utf-8', 'replace')
+        return line.rstrip()
     
     def add_variant(self, chrom, pos, rs_id, ref, alt, qual, filt, info, form=None, genotypes=[]):
         """
@@ -184,84 +287,343 @@ class VCFParser(object):
             variant_info.append(individual)
         
         variant_line = '\t'.join(variant_info)
-        variant = format_variant(
-            line = variant_line, 
-            header_parser = self.metadata, 
-            check_info = self.check_info
-        )
+        for variant in self._format_line(variant_line):
+            self.variants.append(variant)
+    
+    def _format_line(self, line):
+        """
+        Return the variant(s) found in one line of the vcf.
+        
+        If there are multiple alternatives and self.split_variants
+        there can be more than one variant in one line.
+        
+        Arguments:
+            line (str): A variant line
+        
+        Returns:
+            variants (list): A list with variant dictionaries, empty if the 
+                             line is outside the regions or does not match 
+                             the filter
+        """
+        if self.regions is not None and not self.regions(line):
+            return []
+        if self.filter is not None and not self.filter(line):
+            return []
+        
+        return self._build_variants(line)
+    
+    def _build_variants(self, line, variant_line=None):
+        """
+        Return the variant(s) of a line that is inside the regions and 
+        matches the filter.
+        
+        Arguments:
+            line (str): A variant line
+            variant_line (list): The columns of the line in the same order
+                                 as the header. If given the line is not 
+                                 splitted again, it is only needed for lazy
+                                 variants
+        
+        Returns:
+            variants (list): A list with variant dictionaries
+        """
+        if self.lazy:
+            variant = LazyVariant(
+                line = line, 
+                header_parser = self.metadata, 
+                check_info = self.check_info,
+                info_fields = self.info_fields,
+                format_fields = self.format_fields,
+                genotype_cache = self.genotype_cache
+            )
+        elif variant_line is not None:
+            variant = build_variant(
+                variant_line = variant_line, 
+                header_parser = self.metadata, 
+                check_info = self.check_info,
+                info_fields = self.info_fields,
+                format_fields = self.format_fields,
+                genotype_cache = self.genotype_cache,
+                line = line
+            )
+        else:
+            variant = format_variant(
+                line = line, 
+                header_parser = self.metadata, 
+                check_info = self.check_info,
+                info_fields = self.info_fields,
+                format_fields = self.format_fields,
+                genotype_cache = self.genotype_cache
+            )
         
         if not (self.split_variants and len(variant['ALT'].split(',')) > 1):
-            self.variants.append(variant)
-            
-        # If multiple alternative and split_variants we must split the variant                 
+            return [variant]
+        
+        if self.split_plan is None:
+            self.split_plan = SplitPlan(self.metadata)
+        # If multiple alternative and split_variants we must split the variant
+        return list(split_variants(
+                    variant_dict=variant, 
+                    header_parser=self.metadata, 
+                    allele_symbol=self.allele_symbol,
+                    info_fields=self.info_fields,
+                    format_fields=self.format_fields,
+                    genotype_cache=self.genotype_cache,
+                    split_plan=self.split_plan))
+    
+    def _use_workers(self):
+        """Check if the variants can be parsed with a pool of processes"""
+        if not (self.workers and self.workers > 1):
+            return False
+        if not self.infile or not self.beginning:
+            self.logger.warning("Only files can be parsed with workers, "\
+                                "parsing variants in one process")
+            return False
+        if self.infile.endswith('.gz') and not is_bgzf(self.infile):
+            self.logger.warning("Only files compressed with bgzip can be "\
+                                "parsed with workers, parsing variants in "\
+                                "one process")
+            return False
+        return True
+    
+    def _variant_lines(self):
+        """
+        Yield the variant lines that are left in the vcf.
+        
+        Yields:
+            line (str): A variant line without trailing whitespace
+        """
+        # We need to treat the first case as an exception
+        if self.beginning:
+            if self.next_line:
+                yield self.next_line
+
+                self.beginning = False
+
+        if isinstance(self.vcf, MmapReader):
+            # The lines are decoded straight from the memory map
+            for offset, record in self.vcf.records(self.vcf.tell()):
+                line = decode_record(record)
+                if not line.startswith('#') and line.count('\t') >= 7:
+                    yield line
+        
+        elif self.binary:
+            for line in read_lines(self.vcf):
+                # Only the lines that are used are decoded
+                if not line.startswith(b'#') and line.count(b'\t') >= 7:
+                    yield line.decode('utf-8', 'replace').rstrip()
+        
         else:
-            for splitted_variant in split_variants(
-                                                    variant_dict=variant, 
-                                                    header_parser=self.metadata, 
-                                                    allele_symbol=self.allele_symbol):
-                self.variants.append(splitted_variant)
+            for line in self.vcf:
+                line = line.rstrip()
+                
+                if not line.startswith('#') and len(line.split('\t')) >= 8:
+                    yield line
+    
+    def _cache_options(self):
+        """Return the options that change how the variants are parsed"""
+        def sorted_fields(fields):
+            if fields is None:
+                return None
+            return sorted(fields)
+        
+        return {
+            'split_variants': self.split_variants,
+            'check_info': self.check_info,
+            'allele_symbol': self.allele_symbol,
+            'info_fields': sorted_fields(self.info_fields),
+            'format_fields': sorted_fields(self.format_fields),
+            'samples': self.metadata.samples,
+            'filter': self._filter_expression(),
+            'regions': (self.regions.key() if self.regions is not None
+                        else None),
+        }
+    
+    def _filter_expression(self):
+        """Return the expression of the filter, None if there is no filter"""
+        if self.filter is None:
+            return None
+        return self.filter.expression
+    
+    def _filtered_lines(self):
+        """
+        Yield the variant lines that are left, inside the regions and 
+        matches the filter
+        """
+        for line in self._variant_lines():
+            if self.regions is not None and not self.regions(line):
+                continue
+            if self.filter is None or self.filter(line):
+                yield line
     
     def __iter__(self):
         
         if not self.metadata.fileformat:
             raise SyntaxError("Vcf must have fileformat defined")
         
-        if self.vcf:
-
-            # We need to treat the first case as an exception
-            if self.beginning:
-                variants = []
-                if self.next_line:
-                    first_variant = format_variant(
-                        line = self.next_line, 
-                        header_parser = self.metadata, 
-                        check_info = self.check_info
-                    )
-
-                    if not (self.split_variants and len(first_variant['ALT'].split(',')) > 1):
-                        variants.append(first_variant)
-                    else:
-                        for splitted_variant in split_variants(
-                                                                variant_dict=first_variant, 
-                                                                header_parser=self.metadata, 
-                                                                allele_symbol=self.allele_symbol):
-                            variants.append(splitted_variant)
+        if self.vcf and self.cache is not None and self.beginning:
+            key = self.cache.get_key(self.infile, self.header_lines, 
+                                     self._cache_options())
+            if key in self.cache:
+                self.beginning = False
+                variants = self.cache.load(key)
+            else:
+                variants = self.cache.store(key, self._parse())
+            for variant in variants:
+                yield variant
+        
+        else:
+            for variant in self._parse():
+                yield variant
+    
+    def _parse(self):
+        """Yield the parsed variants"""
+        if self.vcf and self._use_workers():
+            # The lines are read and filtered by the workers
+            for line in parallel_lines(
+                                filename=self.infile, 
+                                header_parser=self.metadata, 
+                                workers=self.workers, 
+                                filter=self._filter_expression(),
+                                regions=self.regions):
+                for variant in self._build_variants(line):
+                    yield variant
+        
+        elif self.vcf:
+            for line in self._variant_lines():
+                for variant in self._format_line(line):
+                    yield variant
+        
+        else:
+            for variant in self.variants:
+                yield variant
 
-                    for variant in variants:
-                        yield variant
+    def iter_batches(self, size=BATCH_SIZE, fields=()):
+        """
+        Yield the variants in batches of numpy arrays.
+        
+        The arrays are filled straight from the vcf lines without creating
+        any Genotype objects, see vcf_parser.batches. numpy has to be 
+        installed. Multiallelic variants are not splitted in the batches.
+        
+        Arguments:
+            size (int): The maximum number of variants in a batch
+            fields (iterable): FORMAT fields to include, any of DP, GQ and AD
+        
+        Yields:
+            batch (VariantBatch)
+        """
+        if not self.vcf:
+            raise IOError("Batches can only be read from a file or a stream")
+        
+        for batch in iter_batches(self._filtered_lines(), self.metadata, 
+                                  size=size, fields=fields):
+            yield batch
 
-                    self.beginning = False
+    def fetch(self, chrom, start=None, end=None):
+        """
+        Yield the variants that overlap a region.
+        
+        The vcf needs an index next to it. This could be a index built with
+        'vcf_parser index', which works for both uncompressed and bgzipped
+        files, or a tabix (.tbi) or csi (.csi) index for bgzipped files.
+        Coordinates are 1-based and inclusive, like the POS column. If start
+        or end is left out the region will reach to the start or end of the
+        contig.
+        
+        Arguments:
+            chrom (str): The contig name
+            start (int): First position of the region
+            end (int): Last position of the region
+        
+        Yields:
+            variant (dict): Variant dictionaries in the same format as when
+                            iterating over the parser
+        """
+        for line in self._fetch_lines(chrom, start, end):
+            for variant in self._format_line(line):
+                yield variant
 
-            for line in self.vcf:
-                line = line.rstrip()
-                # These are the variant(s) found in one line of the vcf
-                # If there are multiple alternatives and self.split_variants
-                # There can be more than one variant in one line
-                variants = []
-                
-                if not line.startswith('#') and len(line.split('\t')) >= 8:
-                    variant = format_variant(
-                        line = line, 
-                        header_parser = self.metadata, 
-                        check_info = self.check_info
-                        )
+    def _fetch_lines(self, chrom, start=None, end=None):
+        """
+        Yield the variant lines that overlap a region.
+        
+        See fetch for the arguments.
+        
+        Yields:
+            line (str): A variant line without trailing whitespace
+        """
+        if not self.infile:
+            raise IOError("Region queries are only possible on indexed files")
+        
+        if not self.index:
+            self.index = find_index(self.infile)
+            if not self.index:
+                raise IOError("Could not find any index for {0}".format(
+                    self.infile))
+            self.logger.info("Using index {0}".format(self.index.filename))
+        
+        start = max(int(start or 1), 1)
+        end = int(end) if end else 2**31 - 1
+        
+        reader = open_raw_vcf(self.infile, threads=self.threads)
+        try:
+            for chunk_begin, chunk_end in self.index.chunks(chrom, start - 1, end):
+                reader.seek(chunk_begin)
+                # If the end of the chunk is unknown we read until the 
+                # region is passed
+                while chunk_end is None or reader.tell() < chunk_end:
+                    line = reader.readline().decode('utf-8', 'replace')
+                    if not line:
+                        break
+                    if line.startswith('#'):
+                        continue
                     
-                    if not (self.split_variants and len(variant['ALT'].split(',')) > 1):
-                        variants.append(variant)
+                    variant_info = line.split('\t', 4)
+                    if variant_info[0] != chrom:
+                        if chunk_end is None:
+                            return
+                        continue
+                    position = int(variant_info[1])
+                    # The file is sorted so we are done
+                    if position > end:
+                        return
+                    # Variants that starts before the region can still overlap
+                    if position + len(variant_info[3]) - 1 < start:
+                        continue
                     
-                    else:
-                        for splitted_variant in split_variants(
-                                    variant_dict=variant, 
-                                    header_parser=self.metadata, 
-                                    allele_symbol=self.allele_symbol):
-                            variants.append(splitted_variant)
-                
-                for variant in variants:
-                    yield variant
+                    yield line.rstrip()
+        finally:
+            reader.close()
+
+    def variants_at(self, offset):
+        """
+        Return the variant(s) from the line that starts at an offset.
         
-        else:
-            for variant in self.variants:
-                yield variant
+        For uncompressed files the offset is a byte offset and the line is 
+        read through a memory map, for bgzipped files it is a virtual offset.
+        The offsets can be found in the index.
+        
+        Arguments:
+            offset (int): The offset of the start of a variant line
+        
+        Returns:
+            variants (list): The variant dictionaries from the line, more
+                             than one if split_variants is used
+        """
+        if not self.infile:
+            raise IOError("Random access is only possible on files")
+        
+        if not self._random_access:
+            self._random_access = open_raw_vcf(self.infile, threads=1)
+        self._random_access.seek(offset)
+        line = self._random_access.readline().decode('utf-8', 'replace')
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            raise IOError("There is no variant line at offset {0}".format(
+                offset))
+        
+        return self._format_line(line)
 
     def __repr__(self):
         return "Parser(infile={0},fsock={1},split_variants={2})".format(
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+predicates.py
+
+Simple predicates and zone maps for converted vcf files.
+
+A predicate is a tuple (field, operator, value) like ('AF', '<', 0.001) or
+('FILTER', '==', 'PASS'). The field is one of CHROM, POS, QUAL, FILTER,
+NON_REF (True if any individual has a alternative allele) or a INFO key.
+A list of predicates means that all of them have to be true.
+
+When a vcf is converted summary statistics (a zone map) is stored for each
+chunk of variants:
+
+    {
+        "start": 0, "end": 8192,     # The rows of the chunk
+        "contigs": [0],              # Contig codes
+        "pos": [10551, 2512011],     # min and max POS
+        "qual": [3.0, 99.0],         # min and max QUAL, null if all missing
+        "filters": [0, 1],           # FILTER codes
+        "non_ref": [false, true],    # The NON_REF values of the variants
+        "info": {"AF": [0.0, 0.99]}  # min and max of numeric INFO keys
+    }
+
+Before any record is read the chunks whose statistics shows that no variant
+can match are skipped. Missing values never match a predicate.
+"""
+
+import operator
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+def check_predicates(predicates):
+    """
+    Check that the predicates are on the right form.
+
+    Arguments:
+        predicates (list): A list with (field, operator, value) tuples
+
+    Returns:
+        predicates (list): The predicates as a list of tuples
+
+    Raises:
+        ValueError: If a predicate is malformed
+    """
+    checked = []
+    for predicate in predicates:
+        if len(predicate) != 3:
+            raise ValueError("A predicate should be (field, operator, value),"
+                             " not {0}".format(predicate))
+        field, op, value = predicate
+        if op not in OPERATORS:
+            raise ValueError("Unknown operator {0}, use one of {1}".format(
+                op, ', '.join(sorted(OPERATORS))))
+        if field in ('CHROM', 'FILTER', 'NON_REF') and op not in ('==', '!='):
+            raise ValueError("{0} can only be compared with == and !=".format(
+                field))
+        checked.append((field, op, value))
+    return checked
+
+
+def is_number(value):
+    """Check if a value is a int or a float, bools are not numbers here"""
+    return (isinstance(value, (int, float)) and
+            not isinstance(value, bool))
+
+
+def parse_number(value):
+    """Return a INFO value as a float, None if it is missing or not a number"""
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    if number != number:
+        return None
+    return number
+
+
+def min_max(values):
+    """Return [min, max] of the values that are not missing, None if empty"""
+    values = [value for value in values if value == value]
+    if not values:
+        return None
+    return [min(values), max(values)]
+
+
+def range_may_match(value_range, op, value):
+    """
+    Check if any value in a range could fulfill a comparison.
+
+    Arguments:
+        value_range (list): [min, max], None if there are no values
+        op (str): The operator
+        value: The value to compare with
+
+    Returns:
+        bool: False if no value in the range can match
+    """
+    if value_range is None:
+        return False
+    low, high = value_range
+    if op == '<':
+        return low < value
+    if op == '<=':
+        return low <= value
+    if op == '>':
+        return high > value
+    if op == '>=':
+        return high >= value
+    if op == '==':
+        return low <= value <= high
+    # '!=' only fails if all values are equal to value
+    return not low == high == value
+
+
+def set_may_match(codes, op, code):
+    """Check if a set of codes could fulfill a == or != comparison"""
+    if op == '==':
+        return code in codes
+    return any(other != code for other in codes)
+
+
+def info_matches(info_dict, field, op, value):
+    """
+    Check if a INFO annotation fulfills a predicate.
+
+    If value is a bool the predicate checks if the key is present, this is
+    how flags are compared. For keys with several values it is enough that
+    one of the values matches.
+
+    Arguments:
+        info_dict (dict): A parsed INFO field
+        field (str): The INFO key
+        op (str): The operator
+        value: The value to compare with
+
+    Returns:
+        bool: True if the annotation matches
+    """
+    compare = OPERATORS[op]
+    if isinstance(value, bool):
+        return compare(field in info_dict, value)
+    for raw_value in info_dict.get(field) or []:
+        if raw_value == '.':
+            continue
+        if is_number(value):
+            raw_value = parse_number(raw_value)
+            if raw_value is None:
+                continue
+        if compare(raw_value, value):
+            return True
+    return False
+
+
+def chunk_may_match(chunk, predicates, contigs, filters):
+    """
+    Check if any variant in a chunk could match all predicates.
+
+    Arguments:
+        chunk (dict): The statistics of a chunk
+        predicates (list): The predicates
+        contigs (list): The contig names, the contig codes are indexes here
+        filters (list): The FILTER values, the FILTER codes are indexes here
+
+    Returns:
+        bool: False if the chunk can be skipped
+    """
+    for field, op, value in predicates:
+        if field == 'CHROM':
+            code = contigs.index(value) if value in contigs else None
+            if not set_may_match(chunk['contigs'], op, code):
+                return False
+        elif field == 'FILTER':
+            code = filters.index(value) if value in filters else None
+            if not set_may_match(chunk['filters'], op, code):
+                return False
+        elif field == 'NON_REF':
+            if not set_may_match(chunk['non_ref'], op, bool(value)):
+                return False
+        elif field == 'POS':
+            if not range_may_match(chunk['pos'], op, value):
+                return False
+        elif field == 'QUAL':
+            if not range_may_match(chunk['qual'], op, value):
+                return False
+        elif field in chunk['info'] and is_number(value):
+            if not range_may_match(chunk['info'][field], op, value):
+                return False
+    return True
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+readers.py
+
+Read the lines of a vcf as bytes.
+
+Most vcf files are pure ASCII so there is no need to run every byte through
+a codec stream. These readers read large buffers of bytes and split them in
+lines, the lines are decoded later when they are used. Uncompressed files
+are read through a memory map.
+"""
+
+import io
+import os
+import mmap
+import codecs
+
+# Number of bytes that are read at a time
+BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def read_lines(handle, buffer_size=BUFFER_SIZE):
+    """
+    Yield the lines from a binary stream.
+
+    The stream is read in large buffers that are splitted on newlines, this
+    is a lot faster than reading one line at a time.
+
+    Arguments:
+        handle: A stream opened in binary mode, anything with a read method
+        buffer_size (int): Number of bytes to read at a time
+
+    Yields:
+        line (bytes): The lines without the trailing newline
+    """
+    remainder = b''
+    while True:
+        data = handle.read(buffer_size)
+        if not data:
+            break
+        if remainder:
+            data = remainder + data
+        lines = data.split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield line
+
+    if remainder:
+        yield remainder
+
+
+def decode_record(record):
+    """
+    Decode a line from MmapReader.records to a string.
+    
+    The string is decoded straight from the memory map without first 
+    copying the line to a bytes object.
+    
+    Arguments:
+        record (memoryview): A line
+    
+    Returns:
+        line (str): The line without trailing whitespace
+    """
+    return codecs.decode(record, 'utf-8', 'replace').rstrip()
+
+
+def release_views(views):
+    """Release memoryviews, the last one first"""
+    while views:
+        views.pop().release()
+
+
+class MmapReader(object):
+    """
+    Read an uncompressed file through a memory map.
+
+    The file is mapped into memory so the pages are shared with all other
+    processes that reads the same file, for example the workers when a vcf
+    is parsed in parallel. Lines can be read from any byte offset without
+    reading what comes before.
+
+    The reader works like a file opened in binary mode (read, readline, seek
+    and tell) and can also hand out the lines as memoryview slices of the 
+    file that does not copy any data, this is how VCFParser reads the 
+    variant lines.
+    """
+    def __init__(self, filename):
+        super(MmapReader, self).__init__()
+        self.filename = filename
+        self._handle = open(filename, 'rb')
+        # The memoryviews that records has handed out and not yet released
+        self._views = []
+        self.size = os.fstat(self._handle.fileno()).st_size
+        if self.size:
+            self._map = mmap.mmap(
+                self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # It is not possible to map an empty file
+            self._map = io.BytesIO(b'')
+
+    def read(self, size=-1):
+        """Read at most size bytes, all remaining bytes if size < 0"""
+        return self._map.read(size)
+
+    def readline(self):
+        """Return the next line including the newline"""
+        return self._map.readline()
+
+    def tell(self):
+        """Return the current byte offset"""
+        return self._map.tell()
+
+    def seek(self, offset):
+        """Move to a byte offset"""
+        self._map.seek(offset)
+        return offset
+
+    def _memoryview(self):
+        """Return a memoryview of the whole file"""
+        if self.size:
+            return memoryview(self._map)
+        return memoryview(b'')
+
+    def line_end(self, offset):
+        """Return the offset of the newline that ends the line at offset"""
+        end = self._map.find(b'\n', offset)
+        if end == -1:
+            return self.size
+        return end
+
+    def record_at(self, offset):
+        """
+        Return the line that starts at a byte offset.
+
+        Arguments:
+            offset (int): The byte offset of the start of a line
+
+        Returns:
+            line (bytes): The line without the newline
+        """
+        return self._map[offset:self.line_end(offset)]
+
+    def records(self, start=0, end=None):
+        """
+        Yield the lines between two offsets as memoryviews.
+
+        Arguments:
+            start (int): The offset of the first line
+            end (int): Stop at lines that starts at or after this offset
+
+        Yields:
+            record (tuple): (offset, memoryview of the line without newline)
+        
+        The memoryviews point straight into the memory map and are only 
+        valid until the next record is read, use decode_record or bytes() 
+        to keep a line. They are released when the reader is closed.
+        """
+        end = self.size if end is None else min(end, self.size)
+        views = [self._memoryview()]
+        self._views.append(views)
+        try:
+            while start < end:
+                line_end = self.line_end(start)
+                record = views[0][start:line_end]
+                views.append(record)
+                yield (start, record)
+                views.pop().release()
+                start = line_end + 1
+                # Keep the position like readline would
+                self._map.seek(min(start, self.size))
+        finally:
+            release_views(views)
+            if views in self._views:
+                self._views.remove(views)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self):
+        """Close the memory map and the file"""
+        for views in self._views:
+            release_views(views)
+        self._views = []
+        self._map.close()
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "MmapReader(filename={0})".format(self.filename)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+regions.py
+
+Restrict the variants to a set of regions.
+
+A RegionSet holds the regions as sorted arrays of start and end positions
+for each contig, overlapping regions are merged. To check a variant line only
+the first two fields, CHROM and POS, are looked at, so lines outside the
+regions can be skipped before they are splitted and parsed:
+
+    regions = RegionSet('exome_targets.bed')
+    lines = [line for line in lines if regions(line)]
+
+A variant is inside the regions if its POS is inside one of them. The
+regions can be given as (chrom, start, end) tuples with 1-based, inclusive
+coordinates, like the POS column, or as a path to a BED file, where the
+coordinates are 0-based and the end is exclusive.
+"""
+
+import gzip
+import hashlib
+
+from bisect import bisect_right
+from logging import getLogger
+
+
+def read_bed(bed_file):
+    """
+    Read the regions of a BED file.
+
+    Arguments:
+        bed_file (str): Path to a BED file, can be gzipped
+
+    Returns:
+        regions (list): (chrom, start, end) tuples with 1-based, inclusive
+                        coordinates
+
+    Raises:
+        SyntaxError: If a line of the file is malformed
+    """
+    if bed_file.endswith('.gz'):
+        handle = gzip.open(bed_file, 'rb')
+    else:
+        handle = open(bed_file, 'rb')
+
+    regions = []
+    with handle:
+        for line in handle:
+            line = line.decode('utf-8', 'replace').rstrip()
+            if (not line or line.startswith('#') or
+                    line.startswith('track') or line.startswith('browser')):
+                continue
+            fields = line.split('\t')
+            if len(fields) < 3:
+                fields = line.split()
+            try:
+                regions.append((fields[0], int(fields[1]) + 1, int(fields[2])))
+            except (IndexError, ValueError):
+                raise SyntaxError("One of the lines in {0} is malformed: "\
+                                  "{1}".format(bed_file, line))
+    return regions
+
+
+def parse_region(region):
+    """
+    Parse a region string like '1:10000-20000', '1:10000' or '1'.
+
+    Arguments:
+        region (str): The region, the positions are 1-based and inclusive
+
+    Returns:
+        region (tuple): (chrom, start, end), start and end are None if they
+                        are not given
+    """
+    chrom, separator, positions = region.strip().rpartition(':')
+    if not separator:
+        return (positions, None, None)
+    start, separator, end = positions.replace(',', '').partition('-')
+    try:
+        return (chrom, int(start), int(end) if end else None)
+    except ValueError:
+        raise SyntaxError("Region {0} is malformed, use chrom:start-end".format(
+            region))
+
+
+class RegionSet(object):
+    """
+    A set of regions on the contigs.
+
+    Call the region set with a variant line to check if the variant is
+    inside the regions.
+
+    Arguments:
+        regions (list or str): (chrom, start, end) tuples with 1-based,
+                               inclusive coordinates or a path to a BED file.
+                               A start or end that is None means the start
+                               or the end of the contig.
+    """
+    def __init__(self, regions):
+        super(RegionSet, self).__init__()
+        self.logger = getLogger(__name__)
+        self.bed_file = None
+        if isinstance(regions, str):
+            self.bed_file = regions
+            self.logger.info("Reading regions from {0}".format(regions))
+            regions = read_bed(regions)
+
+        contig_regions = {}
+        for chrom, start, end in regions:
+            start = int(start) if start is not None else 1
+            end = int(end) if end is not None else float('inf')
+            if end < start:
+                self.logger.warning("Skipping region {0}:{1}-{2} that ends "\
+                                    "before it starts".format(chrom, start, end))
+                continue
+            contig_regions.setdefault(str(chrom), []).append((start, end))
+
+        # The sorted start and end positions of the merged regions
+        self.starts = {}
+        self.ends = {}
+        for chrom, intervals in contig_regions.items():
+            starts = []
+            ends = []
+            for start, end in sorted(intervals):
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.starts[chrom] = starts
+            self.ends[chrom] = ends
+        self.logger.info("{0} regions on {1} contigs".format(
+            len(self), len(self.starts)))
+
+        # The intervals of the last contig that was looked up
+        self._chrom = None
+        self._starts = None
+        self._ends = None
+
+    def contains(self, chrom, pos):
+        """
+        Check if a position is inside the regions.
+
+        Arguments:
+            chrom (str): The contig
+            pos (int): 1-based position
+
+        Returns:
+            bool
+        """
+        if chrom != self._chrom:
+            self._chrom = chrom
+            self._starts = self.starts.get(chrom)
+            self._ends = self.ends.get(chrom)
+        if self._starts is None:
+            return False
+        index = bisect_right(self._starts, pos) - 1
+        return index >= 0 and pos <= self._ends[index]
+
+    def __call__(self, line):
+        """
+        Check if the variant of a line is inside the regions.
+
+        Only the CHROM and POS fields of the line are looked at.
+
+        Arguments:
+            line (str): A variant line
+
+        Returns:
+            bool
+        """
+        chrom_end = line.find('\t')
+        pos_end = line.find('\t', chrom_end + 1)
+        try:
+            pos = int(line[chrom_end + 1:pos_end])
+        except ValueError:
+            raise SyntaxError("One of the variant lines is malformed: {0}".format(
+                line))
+        return self.contains(line[:chrom_end], pos)
+
+    def contigs(self):
+        """Return the contigs that has regions"""
+        return sorted(self.starts)
+
+    def key(self):
+        """Return a hash of the merged regions, used for the cache"""
+        regions = hashlib.sha1()
+        for chrom in self.contigs():
+            for start, end in zip(self.starts[chrom], self.ends[chrom]):
+                regions.update("{0}:{1}-{2};".format(chrom, start, end).encode(
+                    'utf-8'))
+        return regions.hexdigest()[:16]
+
+    def __len__(self):
+        return sum(len(starts) for starts in self.starts.values())
+
+    def __repr__(self):
+        if self.bed_file:
+            return "RegionSet(bed_file={0})".format(self.bed_file)
+        return "RegionSet(regions={0})".format(len(self))
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+tabix.py
+
+Read tabix (.tbi) and coordinate sorted index (.csi) files, and build .tbi
+files while a BGZF file is written.
+
+Both formats split each contig into a hierarchy of bins. Every bin holds a
+list of chunks, that is pairs of virtual offsets into the BGZF file where
+records that overlap the bin are stored. To find the records in a region we
+collect the chunks of all bins that could overlap the region.
+
+The .tbi format uses a fixed bin layout (14 bit minimal intervals and 5
+levels) and has a linear index with the first offset for each 16 kb window.
+The .csi format has a configurable layout and stores the smallest offset
+directly in every bin.
+
+Specification: https://samtools.github.io/hts-specs/tabix.pdf and
+https://samtools.github.io/hts-specs/CSIv1.pdf
+"""
+
+import os
+import gzip
+import struct
+
+from logging import getLogger
+
+from vcf_parser.bgzf import BgzfWriter
+
+TABIX_MAGIC = b'TBI\x01'
+CSI_MAGIC = b'CSI\x01'
+
+# The bin layout that is allways used by .tbi files
+TABIX_MIN_SHIFT = 14
+TABIX_DEPTH = 5
+
+# The tabix configuration for vcf files: format, sequence column, begin
+# column, end column (0 means that the end is taken from REF), meta
+# character and number of lines to skip
+TABIX_VCF_CONFIG = (2, 1, 2, 0, ord('#'), 0)
+
+
+def reg2bins(beg, end, min_shift=TABIX_MIN_SHIFT, depth=TABIX_DEPTH):
+    """
+    Return all bins that may overlap a region.
+
+    Arguments:
+        beg (int): 0-based start of the region
+        end (int): 0-based, exclusive, end of the region
+        min_shift (int): Number of bits for the smallest bins
+        depth (int): Number of levels in the bin hierarchy
+
+    Returns:
+        bins (list): A list with bin numbers
+    """
+    if end <= beg:
+        return []
+    end -= 1
+    bins = []
+    shift = min_shift + depth * 3
+    level_offset = 0
+    for level in range(depth + 1):
+        bins.extend(
+            range(level_offset + (beg >> shift), level_offset + (end >> shift) + 1)
+        )
+        shift -= 3
+        level_offset += 1 << (level * 3)
+
+    return bins
+
+
+def reg2bin(beg, end, min_shift=TABIX_MIN_SHIFT, depth=TABIX_DEPTH):
+    """
+    Return the smallest bin that contains a region.
+
+    Arguments:
+        beg (int): 0-based start of the region
+        end (int): 0-based, exclusive, end of the region
+        min_shift (int): Number of bits for the smallest bins
+        depth (int): Number of levels in the bin hierarchy
+
+    Returns:
+        bin (int): The bin number
+    """
+    end -= 1
+    shift = min_shift
+    level_offset = ((1 << (depth * 3)) - 1) // 7
+    for level in range(depth, 0, -1):
+        if beg >> shift == end >> shift:
+            return level_offset + (beg >> shift)
+        shift += 3
+        level_offset -= 1 << ((level - 1) * 3)
+
+    return 0
+
+
+def find_tabix_index(filename):
+    """
+    Look for a .tbi or .csi index next to a file.
+
+    Arguments:
+        filename (str): Path to a BGZF compressed file
+
+    Returns:
+        index_file (str): Path to the index or None if no index was found
+    """
+    for suffix in ('.tbi', '.csi'):
+        index_file = filename + suffix
+        if os.path.exists(index_file):
+            return index_file
+
+    return None
+
+
+def merge_chunks(chunks):
+    """
+    Sort and merge chunks that overlap or are adjacent.
+
+    Arguments:
+        chunks (list): A list of (begin, end) tuples
+
+    Returns:
+        merged_chunks (list): A sorted list of non overlapping (begin, end)
+    """
+    merged_chunks = []
+    for begin, end in sorted(chunks):
+        if merged_chunks and begin <= merged_chunks[-1][1]:
+            if end > merged_chunks[-1][1]:
+                merged_chunks[-1] = (merged_chunks[-1][0], end)
+        else:
+            merged_chunks.append((begin, end))
+
+    return merged_chunks
+
+
+class TabixIndex(object):
+    """
+    Holds the information from a .tbi or .csi index file.
+
+    Use chunks() to get the virtual offsets that has to be read to find all
+    records in a region.
+    """
+    def __init__(self, filename):
+        super(TabixIndex, self).__init__()
+        self.logger = getLogger(__name__)
+        self.filename = filename
+        self.min_shift = TABIX_MIN_SHIFT
+        self.depth = TABIX_DEPTH
+        # The contig names in the order they are stored in the index
+        self.names = []
+        # Maps contig names to their position in self.references
+        self.name_to_id = {}
+        # One dictionary per contig with bin numbers as keys and a tuple
+        # (smallest offset, list of chunks) as values
+        self.references = []
+        # One list of offsets per contig, only present for .tbi
+        self.linear_indexes = []
+
+        self.logger.debug("Reading index {0}".format(filename))
+        with gzip.open(filename, 'rb') as handle:
+            data = handle.read()
+
+        magic = data[:4]
+        if magic == TABIX_MAGIC:
+            self.format = 'tbi'
+            self._parse_tabix(data)
+        elif magic == CSI_MAGIC:
+            self.format = 'csi'
+            self._parse_csi(data)
+        else:
+            raise IOError("{0} is not a tabix or csi index".format(filename))
+
+        self.name_to_id = dict(
+            (name, number) for number, name in enumerate(self.names))
+
+    def _parse_names(self, data, position):
+        """
+        Parse the tabix configuration and the contig names.
+
+        Returns:
+            position (int): The position after the names
+        """
+        (self.file_format, self.col_seq, self.col_beg, self.col_end,
+         self.meta, self.skip, names_length) = struct.unpack_from(
+            '<7i', data, position)
+        position += 28
+        names = data[position:position + names_length].split(b'\x00')
+        self.names = [name.decode('utf-8') for name in names if name]
+        return position + names_length
+
+    def _parse_tabix(self, data):
+        """Parse the content of a .tbi file"""
+        number_of_references = struct.unpack_from('<i', data, 4)[0]
+        position = self._parse_names(data, 8)
+
+        for _ in range(number_of_references):
+            bins = {}
+            number_of_bins = struct.unpack_from('<i', data, position)[0]
+            position += 4
+            for _ in range(number_of_bins):
+                bin_number, number_of_chunks = struct.unpack_from(
+                    '<Ii', data, position)
+                position += 8
+                chunks = struct.unpack_from(
+                    '<{0}Q'.format(number_of_chunks * 2), data, position)
+                position += 16 * number_of_chunks
+                bins[bin_number] = (0, list(zip(chunks[::2], chunks[1::2])))
+
+            number_of_intervals = struct.unpack_from('<i', data, position)[0]
+            position += 4
+            linear_index = struct.unpack_from(
+                '<{0}Q'.format(number_of_intervals), data, position)
+            position += 8 * number_of_intervals
+
+            self.references.append(bins)
+            self.linear_indexes.append(linear_index)
+
+    def _parse_csi(self, data):
+        """Parse the content of a .csi file"""
+        self.min_shift, self.depth, aux_length = struct.unpack_from(
+            '<3i', data, 4)
+        position = 16
+        if aux_length >= 28:
+            self._parse_names(data, position)
+        position += aux_length
+
+        number_of_references = struct.unpack_from('<i', data, position)[0]
+        position += 4
+        for _ in range(number_of_references):
+            bins = {}
+            number_of_bins = struct.unpack_from('<i', data, position)[0]
+            position += 4
+            for _ in range(number_of_bins):
+                bin_number, smallest_offset, number_of_chunks = struct.unpack_from(
+                    '<IQi', data, position)
+                position += 16
+                chunks = struct.unpack_from(
+                    '<{0}Q'.format(number_of_chunks * 2), data, position)
+                position += 16 * number_of_chunks
+                bins[bin_number] = (
+                    smallest_offset, list(zip(chunks[::2], chunks[1::2])))
+
+            self.references.append(bins)
+
+    def _smallest_offset(self, reference_id, beg):
+        """Return the smallest virtual offset of records that end after beg"""
+        if self.format == 'tbi':
+            linear_index = self.linear_indexes[reference_id]
+            if not linear_index:
+                return 0
+            window = beg >> TABIX_MIN_SHIFT
+            if window >= len(linear_index):
+                return linear_index[-1]
+            return linear_index[window]
+
+        # For csi we use the offset of the smallest bin that contains beg
+        bins = self.references[reference_id]
+        bin_number = (((1 << (self.depth * 3)) - 1) // 7) + (beg >> self.min_shift)
+        while bin_number > 0 and bin_number not in bins:
+            bin_number = (bin_number - 1) >> 3
+        if bin_number in bins:
+            return bins[bin_number][0]
+        return 0
+
+    def chunks(self, chrom, beg, end):
+        """
+        Return the chunks that may hold records overlapping a region.
+
+        Arguments:
+            chrom (str): The contig name
+            beg (int): 0-based start of the region
+            end (int): 0-based, exclusive, end of the region
+
+        Returns:
+            chunks (list): A sorted list of (begin, end) virtual offsets
+        """
+        reference_id = self.name_to_id.get(chrom)
+        if reference_id is None or reference_id >= len(self.references):
+            self.logger.info("Contig {0} is not in the index".format(chrom))
+            return []
+
+        bins = self.references[reference_id]
+        smallest_offset = self._smallest_offset(reference_id, beg)
+        chunks = []
+        for bin_number in reg2bins(beg, end, self.min_shift, self.depth):
+            if bin_number in bins:
+                for chunk in bins[bin_number][1]:
+                    if chunk[1] > smallest_offset:
+                        chunks.append(chunk)
+
+        return merge_chunks(chunks)
+
+    def contig_names(self):
+        """Return the names of the contigs in the index"""
+        return list(self.names)
+
+    def __repr__(self):
+        return "TabixIndex(filename={0},format={1})".format(
+            self.filename, self.format
+        )
+
+
+class TabixIndexBuilder(object):
+    """
+    Build a .tbi index for records that are written to a BGZF file.
+
+    The records are added in the order they are written with their
+    uncompressed offsets in the file, since the compressed offsets are not
+    known until the blocks are compressed. When the file is closed the index
+    is written with write(), which translates the offsets to virtual
+    offsets.
+
+    If the records are not sorted the index can not be built, a warning is
+    logged and valid is set to False.
+    """
+    def __init__(self):
+        super(TabixIndexBuilder, self).__init__()
+        self.logger = getLogger(__name__)
+        self.names = []
+        # One dictionary per contig with bin numbers as keys and lists of
+        # [begin, end] offsets as values
+        self.references = []
+        # One list per contig with the first offset of each 16 kb window
+        self.linear_indexes = []
+        self.valid = True
+        self._last_bin = None
+        self._last_beg = 0
+
+    def add(self, chrom, beg, end, offset, next_offset):
+        """
+        Add a record to the index.
+
+        Arguments:
+            chrom (str): The contig
+            beg (int): 0-based start of the record
+            end (int): 0-based, exclusive, end of the record
+            offset (int): The uncompressed offset of the record
+            next_offset (int): The uncompressed offset after the record
+        """
+        if not self.valid:
+            return
+        if not self.names or chrom != self.names[-1]:
+            if chrom in self.names:
+                self._invalidate("contig {0} is found in more than one "\
+                                 "place".format(chrom))
+                return
+            self.names.append(chrom)
+            self.references.append({})
+            self.linear_indexes.append([])
+            self._last_bin = None
+            self._last_beg = 0
+        if beg < self._last_beg:
+            self._invalidate("position {0}:{1} comes after {0}:{2}".format(
+                chrom, beg + 1, self._last_beg + 1))
+            return
+        if end >= 1 << (TABIX_MIN_SHIFT + TABIX_DEPTH * 3):
+            self._invalidate("position {0}:{1} is too large for a tabix "\
+                             "index".format(chrom, end))
+            return
+        self._last_beg = beg
+        end = max(end, beg + 1)
+
+        bin_number = reg2bin(beg, end)
+        chunks = self.references[-1].setdefault(bin_number, [])
+        if bin_number == self._last_bin and chunks[-1][1] == offset:
+            chunks[-1][1] = next_offset
+        else:
+            chunks.append([offset, next_offset])
+        self._last_bin = bin_number
+
+        linear_index = self.linear_indexes[-1]
+        last_window = (end - 1) >> TABIX_MIN_SHIFT
+        if len(linear_index) <= last_window:
+            linear_index.extend(
+                [None] * (last_window + 1 - len(linear_index)))
+        for window in range(beg >> TABIX_MIN_SHIFT, last_window + 1):
+            if linear_index[window] is None:
+                linear_index[window] = offset
+
+    def _invalidate(self, reason):
+        """Stop building the index"""
+        self.logger.warning("Vcf is not sorted, {0}. No index is "\
+                            "written".format(reason))
+        self.valid = False
+        self.references = []
+        self.linear_indexes = []
+
+    def write(self, filename, virtual_offset):
+        """
+        Write the index.
+
+        Arguments:
+            filename (str): Path to the index, usually <vcf>.tbi
+            virtual_offset (function): Translates an uncompressed offset to
+                                       a virtual offset, like
+                                       BgzfWriter.virtual_offset
+        """
+        names = b''.join(name.encode('utf-8') + b'\x00' for name in self.names)
+        data = [
+            TABIX_MAGIC,
+            struct.pack('<i', len(self.names)),
+            struct.pack('<6i', *TABIX_VCF_CONFIG),
+            struct.pack('<i', len(names)),
+            names,
+        ]
+        for bins, linear_index in zip(self.references, self.linear_indexes):
+            data.append(struct.pack('<i', len(bins)))
+            for bin_number in sorted(bins):
+                chunks = bins[bin_number]
+                data.append(struct.pack('<Ii', bin_number, len(chunks)))
+                data.append(struct.pack(
+                    '<{0}Q'.format(2 * len(chunks)),
+                    *[virtual_offset(offset) for chunk in chunks
+                      for offset in chunk]))
+            # Windows without records get the offset of the previous window
+            offsets = []
+            previous = 0
+            for offset in linear_index:
+                if offset is not None:
+                    previous = virtual_offset(offset)
+                offsets.append(previous)
+            data.append(struct.pack('<i', len(offsets)))
+            data.append(struct.pack('<{0}Q'.format(len(offsets)), *offsets))
+
+        with BgzfWriter(filename, threads=1) as index_file:
+            index_file.write(b''.join(data))
+        self.logger.info("Index written to {0}".format(filename))
+
+    def __repr__(self):
+        return "TabixIndexBuilder(contigs={0})".format(len(self.names))
@@ -7,5 +7,6 @@ from .build_compounds import build_compounds_dict
 from .build_models import build_models_dict
 from .build_vep import (build_vep_string, build_vep_annotation)
 from .split_genotype import split_genotype
-from .format_variant import format_variant
-from .split_variants import split_variants
+from .format_variant import (format_variant, build_variant, build_genotype,
+    build_genotype_dict, check_info_dict, split_variant_line)
+from .split_variants import (split_variants, SplitPlan)
@@ -32,7 +32,7 @@ def build_info_string(info):
     
     return ';'.join(info_list)
 
-def build_info_dict(vcf_info):
+def build_info_dict(vcf_info, info_fields=None):
     """
     Build a dictionary from the info of a vcf line
     
@@ -41,6 +41,7 @@ def build_info_dict(vcf_info):
     
     Arguments:
         vcf_info (str): A string with vcf info
+        info_fields (set): If given, only these info keys are included
     
     Returns:
         info_dict (OrderedDict): A ordered dictionary with the vcf info keys as 
@@ -51,13 +52,13 @@ def build_info_dict(vcf_info):
     info_dict = OrderedDict()
     
     for info in vcf_info.split(';'):
-        info = info.split('=')
-        if len(info) > 1:
+        key, separator, value = info.partition('=')
+        if info_fields is not None and key not in info_fields:
+            continue
+        if separator:
             # If the INFO entry is like key=value, we store the value as a list
-            info[1] = '='.join(info[1:])
-            info_dict[info[0]] = info[1].split(',')
+            info_dict[key] = value.split(',')
         else:
-            info_dict[info[0]] = []
+            info_dict[key] = []
     
     return info_dict
-    
\ No newline at end of file
@@ -1,13 +1,139 @@
 from __future__ import absolute_import
 from logging import getLogger
 
-from vcf_parser import Genotype
+from vcf_parser import get_genotype_decoder
 from . import (build_info_dict, build_vep_annotation, check_info_annotation,
 build_compounds_dict, build_rank_score_dict, build_models_dict)
 
     
 
-def format_variant(line, header_parser, check_info=False):
+def check_info_dict(info_dict, header_parser, alternatives, line):
+    """
+    Check that the INFO annotations follows the specification in the header.
+    
+    Arguments:
+        info_dict (dict): The parsed INFO field of a variant
+        header_parser (HeaderParser): A HeaderParser object
+        alternatives (list): The alternative alleles of the variant
+        line (str): The variant line, used in the error messages
+    
+    Raises:
+        SyntaxError: If an annotation does not follow the header
+    """
+    logger = getLogger(__name__)
+    individuals = header_parser.individuals
+    for info in info_dict:
+        annotation = info_dict[info]
+        extra_info = header_parser.extra_info.get(info, None)
+        
+        if not extra_info:
+            raise SyntaxError("The INFO field {0} is not specified in vcf"\
+            " header. {1}".format(info, line))
+        try:
+            check_info_annotation(annotation, info, extra_info, alternatives, individuals)
+        except SyntaxError as e:
+            logger.critical(e)
+            logger.info("Line:{0}".format(line))
+            raise e
+
+def split_variant_line(line, header_parser):
+    """
+    Split a variant line in the columns that should be parsed.
+    
+    If only some individuals are parsed (header_parser.columns is set) the 
+    line is only splitted up to the last choosen column.
+    
+    Arguments:
+        line (str): A variant line
+        header_parser (HeaderParser): A HeaderParser object
+    
+    Returns:
+        variant_line (list): The columns in the same order as the header
+    
+    Raises:
+        SyntaxError: If the line does not have the right number of columns
+    """
+    line = line.rstrip()
+    columns = header_parser.columns
+    if columns is None:
+        variant_line = line.split('\t')
+        is_malformed = len(variant_line) != len(header_parser.header)
+    else:
+        variant_line = line.split('\t', max(columns) + 1)
+        # Count the columns without splitting the rest of the line
+        is_malformed = line.count('\t') + 1 != header_parser.number_of_columns
+        if not is_malformed:
+            variant_line = [variant_line[column] for column in columns]
+    
+    if is_malformed:
+        raise SyntaxError("One of the variant lines is malformed: {0}".format(
+            line
+        ))
+    
+    return variant_line
+
+def build_genotype(gt_format, gt_info, format_fields=None, genotype_cache=None):
+    """
+    Build a Genotype object from the FORMAT and the genotype call.
+    
+    Arguments:
+        gt_format (str): The FORMAT column of a variant, like 'GT:AD:GQ'
+        gt_info (str): The genotype call of an individual, like '0/1:10,10:60'
+        format_fields (set): If given, only these FORMAT keys are used
+        genotype_cache (GenotypeCache): If given, genotypes are reused for
+                                        identical calls
+    
+    Returns:
+        genotype (Genotype): A Genotype object
+    """
+    if genotype_cache is not None:
+        if format_fields is not None:
+            format_fields = frozenset(format_fields)
+        key = (gt_format, gt_info, format_fields)
+        genotype = genotype_cache.get(key)
+        if genotype is None:
+            # The genotype is shared so it is frozen
+            genotype = build_genotype(gt_format, gt_info, format_fields)
+            genotype.freeze()
+            genotype_cache.add(key, genotype)
+        return genotype
+    
+    return get_genotype_decoder(gt_format, format_fields).decode(gt_info)
+
+def build_genotype_dict(variant, individuals, format_fields=None, 
+                        genotype_cache=None):
+    """
+    Build a dictionary with a Genotype object for each individual.
+    
+    Arguments:
+        variant (dict): A variant dictionary with the vcf columns
+        individuals (list): The individuals found in the header
+        format_fields (set): If given, only these FORMAT keys are used
+        genotype_cache (GenotypeCache): If given, genotypes are reused for
+                                        identical calls
+    
+    Returns:
+        genotype_dict (dict): A dictionary with individual ids as keys and
+                              Genotype objects as values
+    """
+    gt_format = variant.get('FORMAT', '')
+    
+    genotype_dict = {}
+    if genotype_cache is None:
+        # The decoder is the same for all individuals
+        decoder = get_genotype_decoder(gt_format, format_fields)
+        for individual in individuals:
+            genotype_dict[individual] = decoder.decode(variant[individual])
+    else:
+        for individual in individuals:
+            #Create a genotype object for this individual
+            genotype_dict[individual] = build_genotype(
+                gt_format, variant[individual], format_fields, genotype_cache)
+    
+    return genotype_dict
+
+def format_variant(line, header_parser, check_info=False, info_fields=None,
+                   format_fields=None, genotype_cache=None):
     """
     Yield the variant in the right format. 
     
@@ -18,6 +144,11 @@ def format_variant(line, header_parser, check_info=False):
         line (str): A string that represents a variant line in the vcf format
         header_parser (HeaderParser): A HeaderParser object
         check_info (bool): If the info fields should be checked
+        info_fields (set): If given, only these INFO keys are parsed
+        format_fields (set): If given, only these FORMAT keys are used when
+                             building the genotypes
+        genotype_cache (GenotypeCache): If given, genotypes are reused for
+                                        identical calls
     
     Yields:
         variant (dict): A dictionary with the variant information. The number
@@ -27,20 +158,33 @@ def format_variant(line, header_parser, check_info=False):
     """
     logger = getLogger(__name__)
 
-    individuals = []
+    logger.debug("Checking if variant line is malformed")
+    variant_line = split_variant_line(line, header_parser)
 
+    return build_variant(variant_line, header_parser, check_info, info_fields,
+                         format_fields, genotype_cache, line)
+
+def build_variant(variant_line, header_parser, check_info=False, 
+                  info_fields=None, format_fields=None, genotype_cache=None, 
+                  line=None):
+    """
+    Build a variant dictionary from the columns of a variant line.
+    
+    See format_variant for the arguments.
+    
+    Arguments:
+        variant_line (list): The columns in the same order as the header,
+                             like from split_variant_line
+        line (str): The variant line, used in the error messages. Built 
+                    from the columns if it is not given
+    
+    Returns:
+        variant (dict): A dictionary with the variant information
+    """
     vcf_header = header_parser.header
 
     individuals = header_parser.individuals
 
-    variant_line = line.rstrip().split('\t')
-
-    logger.debug("Checking if variant line is malformed")
-    if len(vcf_header) != len(variant_line):
-        raise SyntaxError("One of the variant lines is malformed: {0}".format(
-            line
-        ))
-
     variant = dict(zip(vcf_header, variant_line))
     
     
@@ -59,25 +203,15 @@ def format_variant(line, header_parser, check_info=False):
     
     alternatives = variant['ALT'].split(',')
     
-    info_dict = build_info_dict(variant.get('INFO', ''))
+    info_dict = build_info_dict(variant.get('INFO', ''), info_fields)
     
     #For testing
     
     # Check that the entry is on the proper format_
     if check_info:
-        for info in info_dict:
-            annotation = info_dict[info]
-            extra_info = header_parser.extra_info.get(info, None)
-            
-            if not extra_info:
-                raise SyntaxError("The INFO field {0} is not specified in vcf"\
-                " header. {1}".format(info, line))
-            try:
-                check_info_annotation(annotation, info, extra_info, alternatives, individuals)
-            except SyntaxError as e:
-                logger.critical(e)
-                logger.info("Line:{0}".format(line))
-                raise e
+        if line is None:
+            line = '\t'.join(variant_line)
+        check_info_dict(info_dict, header_parser, alternatives, line)
     
     variant['info_dict'] = info_dict
     
@@ -113,16 +247,8 @@ def format_variant(line, header_parser, check_info=False):
     
     ##### GENOTYPE ANNOTATIONS #####
     
-    gt_format = variant.get('FORMAT', '').split(':')
-    
-    genotype_dict = {}
-    for individual in individuals:
-        gt_info = variant[individual].split(':')
-        gt_call = dict(zip(gt_format, gt_info))
-        
-        #Create a genotype object for this individual
-        genotype_dict[individual] = Genotype(**gt_call)
-    
+    genotype_dict = build_genotype_dict(
+        variant, individuals, format_fields, genotype_cache)
     variant['genotypes'] = genotype_dict
     
     variant['variant_id'] = '_'.join(
@@ -1,5 +1,78 @@
 from logging import getLogger
 
+def split_gt(gt, phased, alternative_number, allele_symbol='0'):
+    """
+    Make a new GT call for one of the alternatives of a splitted variant
+    
+    Arguments:
+        gt (list): The alleles of the original GT call
+        phased (bool): If the alleles are separated by '|'
+        alternative_number (int): The alternative of the new variant
+        allele_symbol (str): How should the unobserved allele be represented
+                             when genotype is splitted
+    
+    Returns:
+        new_gt (str): The GT call of the splitted variant
+    """
+    ref_allele = '.'
+    alt_allele = '.'
+    try:
+        # Check the ref Allele
+        if len(gt) == 2 and gt[0] != '.' and gt[1] != '.':
+            ref_allele = allele_symbol
+            alt_allele = allele_symbol
+            if gt[0] == gt[1]:
+                # In this case we have a homozygous call:
+                if int(gt[0]) == alternative_number + 1:
+                    ref_allele = '1'
+                    alt_allele = '1'
+            else:
+                if (int(gt[0]) == alternative_number + 1 or 
+                    int(gt[1]) == alternative_number + 1):
+                    alt_allele = '1'                        
+        else:
+        # We now know that at least one of the alleles are uncalled
+            if gt[0] != '.':
+                if int(gt[0]) == alternative_number + 1:
+                    ref_allele = '1'
+                else:
+                    ref_allele = '0'
+            elif len(gt) == 2 and gt[1] != '.':
+                if int(gt[1]) == alternative_number + 1:
+                    alt_allele = '1'
+                else:
+                    alt_allele = '0'
+    except (ValueError, KeyError):
+        pass
+    
+    if len(gt) == 2:
+        if phased:
+            return '|'.join([ref_allele,alt_allele])
+        return '/'.join([ref_allele,alt_allele])
+    return ref_allele
+
+
+def split_allele_values(values, alternative_number):
+    """
+    Keep the reference value and the value of one alternative
+    
+    This is how the allele depths (AD) are splitted, if the value for the 
+    alternative is missing it is set to '0'.
+    
+    Arguments:
+        values (list): The original values, one per allele
+        alternative_number (int): The alternative of the new variant
+    
+    Returns:
+        new_values (str): The values of the splitted variant
+    """
+    # The reference value will allways be the original value
+    try:
+        return ','.join([values[0], values[alternative_number + 1]])
+    except IndexError:
+        return ','.join([values[0], '0'])
+
+
 def split_genotype(genotype, gt_format, alternative_number, allele_symbol = '0'):
     """
     Take a genotype call and make a new one that is working for the new
@@ -33,54 +106,12 @@ def split_genotype(genotype, gt_format, alternative_number, allele_symbol = '0')
             else:
                 gt = genotype_info.split('|')
                 phased = True
-            ref_allele = '.'
-            alt_allele = '.'
-            try:
-                # Check the ref Allele
-                if len(gt) == 2 and gt[0] != '.' and gt[1] != '.':
-                    ref_allele = allele_symbol
-                    alt_allele = allele_symbol
-                    if gt[0] == gt[1]:
-                        # In this case we have a homozygous call:
-                        if int(gt[0]) == alternative_number + 1:
-                            ref_allele = '1'
-                            alt_allele = '1'
-                    else:
-                        if (int(gt[0]) == alternative_number + 1 or 
-                            int(gt[1]) == alternative_number + 1):
-                            alt_allele = '1'                        
-                else:
-                # We now know that at least one of the alleles are uncalled
-                    if gt[0] != '.':
-                        if int(gt[0]) == alternative_number + 1:
-                            ref_allele = '1'
-                        else:
-                            ref_allele = '0'
-                    elif len(gt) == 2 and gt[1] != '.':
-                        if int(gt[1]) == alternative_number + 1:
-                            alt_allele = '1'
-                        else:
-                            alt_allele = '0'
-            except (ValueError, KeyError):
-                pass
-            
-            if len(gt) == 2:
-                if phased:
-                    new_genotype.append('|'.join([ref_allele,alt_allele]))
-                else:
-                    new_genotype.append('/'.join([ref_allele,alt_allele]))
-            else:
-                new_genotype.append(ref_allele)
+            new_genotype.append(
+                split_gt(gt, phased, alternative_number, allele_symbol))
         
         elif gt_info == 'AD':
-            ad = []
-            # The reference depth will allways be the original depth now
-            ad.append(genotype_info.split(',')[0])
-            try:
-                ad.append(genotype_info.split(',')[alternative_number+1])
-            except IndexError:
-                ad.append('0')
-            new_genotype.append(','.join(ad))
+            new_genotype.append(
+                split_allele_values(genotype_info.split(','), alternative_number))
         elif gt_info == 'DP':
             new_genotype.append(genotype_info)
         elif gt_info == 'PL':
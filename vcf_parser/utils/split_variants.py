@@ -7,18 +7,179 @@ if sys.version_info < (2, 7):
 else:
     from collections import OrderedDict
 
-from vcf_parser import Genotype
-from vcf_parser.utils import (build_vep_string, split_genotype, build_info_string)
+from vcf_parser.utils import (build_vep_string, split_genotype, build_info_string,
+    build_info_dict, build_vep_annotation, build_genotype)
+from vcf_parser.utils.split_genotype import (split_gt, split_allele_values)
 
-def split_variants(variant_dict, header_parser, allele_symbol='0'):
+# The numbers of values that are splitted, anything else is a fixed number 
+# of values that is copied to all splitted variants
+PER_ALTERNATIVE = 'A'
+PER_ALLELE = 'R'
+PER_GENOTYPE = 'G'
+FIXED = 'fixed'
+
+def get_split_number(number):
+    """Return how values with a Number from the header are splitted"""
+    if number in (PER_ALTERNATIVE, PER_ALLELE, PER_GENOTYPE):
+        return number
+    return FIXED
+
+class SplitPlan(object):
+    """
+    How the INFO and FORMAT values are splitted, built once from the header.
+    
+    Each INFO and FORMAT key is classified by the Number in the header as A 
+    (one value per alternative), R (one value per allele), G (one value 
+    per genotype) or fixed. Values with Number A and R are splitted, the 
+    others are copied to all splitted variants. AD is allways splitted as 
+    R since old headers often have Number=. for it.
+    
+    Arguments:
+        header_parser (HeaderParser): The header of the vcf
+    """
+    def __init__(self, header_parser):
+        super(SplitPlan, self).__init__()
+        self.header_parser = header_parser
+        self.info_numbers = dict(
+            (info, get_split_number(info_line['Number']))
+            for info, info_line in header_parser.extra_info.items()
+        )
+        self.format_numbers = dict(
+            (format_line['ID'], get_split_number(format_line['Number']))
+            for format_line in header_parser.format_lines
+        )
+        self.format_numbers['AD'] = PER_ALLELE
+        # The FORMAT keys that are changed when splitting, for each FORMAT
+        self._format_plans = {}
+    
+    def info_number(self, info):
+        """
+        Return how the values of an INFO key are splitted
+        
+        Raises a KeyError if the key is not in the header.
+        """
+        number = self.info_numbers.get(info)
+        if number is None:
+            # INFO lines can be added to the header after the plan is made
+            number = get_split_number(
+                self.header_parser.extra_info[info]['Number'])
+            self.info_numbers[info] = number
+        return number
+    
+    def format_plan(self, gt_format):
+        """
+        Return the FORMAT keys that are changed when splitting
+        
+        Arguments:
+            gt_format (str): The FORMAT column, like 'GT:AD:DP'
+        
+        Returns:
+            format_plan (tuple): The number of FORMAT keys and a list with 
+                                 (index, number) for the keys that are 
+                                 splitted, number is 'GT' for the genotype
+        """
+        format_plan = self._format_plans.get(gt_format)
+        if format_plan is None:
+            format_keys = gt_format.split(':')
+            splitted_keys = []
+            for index, key in enumerate(format_keys):
+                if key == 'GT':
+                    splitted_keys.append((index, 'GT'))
+                else:
+                    number = self.format_numbers.get(key, FIXED)
+                    if number in (PER_ALTERNATIVE, PER_ALLELE):
+                        splitted_keys.append((index, number))
+            format_plan = (len(format_keys), splitted_keys)
+            self._format_plans[gt_format] = format_plan
+        return format_plan
+    
+    def split_call(self, genotype, gt_format, alternatives, allele_symbol='0'):
+        """
+        Split a genotype call for all alternatives at once
+        
+        The call is only splitted on ':' and ',' one time, instead of one 
+        time per alternative.
+        
+        Arguments:
+            genotype (str): The original genotype call
+            gt_format (str): The FORMAT column
+            alternatives (int): The number of alternatives
+            allele_symbol (str): How should the unobserved allele be 
+                                 represented when genotype is splitted
+        
+        Returns:
+            new_genotypes (list): The genotype call for each alternative
+        """
+        number_of_keys, splitted_keys = self.format_plan(gt_format)
+        if genotype.count(':') >= number_of_keys:
+            # Let split_genotype handle the malformed call
+            return [split_genotype(genotype, gt_format, alternative_number, 
+                    allele_symbol) for alternative_number in range(alternatives)]
+        if not splitted_keys:
+            return [genotype] * alternatives
+        
+        fields = genotype.split(':')
+        splitted_fields = []
+        for index, number in splitted_keys:
+            if index >= len(fields):
+                break
+            if number == 'GT':
+                phased = '/' not in fields[index]
+                gt = fields[index].split('|' if phased else '/')
+                splitted_fields.append((index, number, gt, phased))
+            else:
+                splitted_fields.append(
+                    (index, number, fields[index].split(','), None))
+        
+        new_genotypes = []
+        for alternative_number in range(alternatives):
+            new_fields = list(fields)
+            for index, number, values, phased in splitted_fields:
+                if number == 'GT':
+                    new_fields[index] = split_gt(values, phased, 
+                                            alternative_number, allele_symbol)
+                elif number == PER_ALLELE:
+                    new_fields[index] = split_allele_values(values, 
+                                                            alternative_number)
+                elif alternative_number < len(values):
+                    new_fields[index] = values[alternative_number]
+                else:
+                    new_fields[index] = values[0]
+            new_genotypes.append(':'.join(new_fields))
+        return new_genotypes
+    
+    def __repr__(self):
+        return "SplitPlan(info={0},format={1})".format(
+            len(self.info_numbers), len(self.format_numbers))
+
+
+
+def split_variants(variant_dict, header_parser, allele_symbol='0',
+                   info_fields=None, format_fields=None, genotype_cache=None,
+                   split_plan=None):
     """
     Checks if there are multiple alternative alleles and splitts the 
     variant.
     If there are multiple alternatives the info fields, vep annotations 
     and genotype calls will be splitted in the correct way
     
+    If info_fields is used the INFO column of the splitted variants are 
+    still built from all annotations, only the info_dict and the vep_info 
+    are restricted to the choosen fields.
+    
+    The INFO values and the genotype calls are only splitted one time for
+    all alternatives, how they are splitted is looked up in the split_plan.
+    
     Args:
         variant_dict: a dictionary with the variant information
+        header_parser: a HeaderParser object
+        allele_symbol: the symbol for the alleles that are not observed
+        info_fields: if given, only these INFO keys are kept in info_dict
+        format_fields: if given, only these FORMAT keys are used in genotypes
+        genotype_cache: a GenotypeCache, if given genotypes are reused for 
+                        identical calls
+        split_plan: a SplitPlan built from the header_parser, one is made if
+                    not given
     
     Yields:
         variant: A variant dictionary with the splitted information for each
@@ -26,9 +187,41 @@ def split_variants(variant_dict, header_parser, allele_symbol='0'):
     """
     logger = getLogger(__name__)
     logger.info("Allele symbol {0}".format(allele_symbol))
+    if split_plan is None:
+        split_plan = SplitPlan(header_parser)
     alternatives = variant_dict['ALT'].split(',')
     reference = variant_dict['REF']
-    number_of_values = 1
+    ids = variant_dict['ID'].split(';')
+    
+    full_info = variant_dict['info_dict']
+    full_vep = variant_dict['vep_info']
+    if info_fields is not None:
+        # The info dict only holds some of the annotations so we parse the
+        # whole INFO field again
+        full_info = build_info_dict(variant_dict.get('INFO', ''))
+        if 'CSQ' in full_info and 'CSQ' not in variant_dict['info_dict']:
+            full_vep = build_vep_annotation(
+                full_info['CSQ'],
+                reference,
+                alternatives,
+                header_parser.vep_columns
+            )
+    
+    # How each INFO value is splitted, None for empty keys
+    info_numbers = [
+        (info, split_plan.info_number(info) if info and info != '.' else None)
+        for info in full_info
+    ]
+    
+    gt_format = variant_dict.get('FORMAT')
+    # The genotype calls of each individual for all alternatives
+    splitted_calls = {}
+    for individual in header_parser.individuals:
+        call = variant_dict[individual]
+        if call not in splitted_calls:
+            splitted_calls[call] = split_plan.split_call(
+                call, variant_dict['FORMAT'], len(alternatives), allele_symbol)
+    
     # Go through each of the alternative alleles:
     for alternative_number, alternative in enumerate(alternatives):
         variant = {}
@@ -38,11 +231,11 @@ def split_variants(variant_dict, header_parser, allele_symbol='0'):
         genotype_dict = {}
         variant['CHROM'] = variant_dict['CHROM']
         variant['POS'] = variant_dict['POS']
-        try:
+        if alternative_number < len(ids):
             # There will not allways be one rsID for each alternative
-            variant['ID'] = variant_dict['ID'].split(';')[alternative_number]
-        # If only one id is present for multiple alleles they all get the same ID
-        except IndexError:
+            variant['ID'] = ids[alternative_number]
+        else:
+            # If only one id is present for multiple alleles they all get the same ID
             variant['ID'] = variant_dict['ID']
         
         variant['REF'] = variant_dict['REF']
@@ -50,66 +243,59 @@ def split_variants(variant_dict, header_parser, allele_symbol='0'):
         variant['QUAL'] = variant_dict['QUAL']
         variant['FILTER'] = variant_dict['FILTER']
         
-
-        if 'FORMAT' in variant_dict:
-            gt_format = variant_dict['FORMAT']
+        if gt_format is not None:
             variant['FORMAT'] = gt_format
-
-        for info in variant_dict['info_dict']:
-            if info and info != '.':
-                # Check if the info field have one entry per allele:
-                number_of_values = header_parser.extra_info[info]['Number']
-                
-                if info == 'CSQ':
-                    vep_dict[alternative] = variant_dict['vep_info'][alternative]
-                    if vep_dict[alternative]:
-                        info_dict['CSQ'] = [
-                            build_vep_string(
-                                vep_dict[alternative], 
-                                header_parser.vep_columns
-                            )
-                        ]
-                # If there is one value per allele we need to split it in
-                # the proper way
-                elif number_of_values == 'A':
-                    try:
-                        # When we split the alleles we only want to annotate with the correct number
-                        info_dict[info] = [variant_dict['info_dict'][info][alternative_number]]
-                    except IndexError:
-                        # If there is only one annotation we choose that one
-                        info_dict[info] = [variant_dict['info_dict'][info][0]]
-                # Choose the right vep info from the old variant
-                elif number_of_values == 'R':
-                    reference_value = variant_dict['info_dict'][info][0]
-                    new_info = [reference_value]
-                    try:
-                        # When we split the alleles we only want to annotate with the correct number
-                        allele_value = variant_dict['info_dict'][info][alternative_number + 1]
-                        new_info.append(allele_value)
-                        info_dict[info] = new_info
-                    except IndexError:
-                        # If annotation is missing we keep the original annotation
-                        info_dict[info] = variant_dict['info_dict'][info]
-                    
+        
+        for info, number_of_values in info_numbers:
+            if number_of_values is None:
+                info_dict[info] = []
+            elif info == 'CSQ':
+                vep_dict[alternative] = full_vep[alternative]
+                if vep_dict[alternative]:
+                    info_dict['CSQ'] = [
+                        build_vep_string(
+                            vep_dict[alternative], 
+                            header_parser.vep_columns
+                        )
+                    ]
+            # If there is one value per allele we need to split it in
+            # the proper way
+            elif number_of_values == PER_ALTERNATIVE:
+                values = full_info[info]
+                if alternative_number < len(values):
+                    # When we split the alleles we only want to annotate with the correct number
+                    info_dict[info] = [values[alternative_number]]
                 else:
-                    info_dict[info] = variant_dict['info_dict'][info]
-                
+                    # If there is only one annotation we choose that one
+                    info_dict[info] = [values[0]]
+            # Choose the right vep info from the old variant
+            elif number_of_values == PER_ALLELE:
+                values = full_info[info]
+                if alternative_number + 1 < len(values):
+                    # When we split the alleles we only want to annotate with the correct number
+                    info_dict[info] = [values[0], values[alternative_number + 1]]
+                else:
+                    # If annotation is missing we keep the original annotation
+                    info_dict[info] = values
             else:
-                info_dict[info] = []
+                info_dict[info] = full_info[info]
         
         variant['INFO'] = build_info_string(info_dict)
         
-        for individual in variant_dict['genotypes']:
-            new_genotype = split_genotype(
-                            variant_dict[individual], 
-                            variant['FORMAT'], 
-                            alternative_number, 
-                            allele_symbol
-                        )
-            
-            variant[individual] = new_genotype
-            genotype_dict[individual] = Genotype(**dict(zip(gt_format.split(':'), variant[individual].split(':'))))
-            
+        for individual in header_parser.individuals:
+            variant[individual] = splitted_calls[variant_dict[individual]][
+                alternative_number]
+            genotype_dict[individual] = build_genotype(
+                gt_format, variant[individual], format_fields, genotype_cache)
+        
+        if info_fields is not None:
+            info_dict = OrderedDict(
+                (info, info_dict[info]) for info in info_dict 
+                if info in info_fields
+            )
+            if 'CSQ' not in info_fields:
+                vep_dict = {}
+        
         variant['info_dict'] = info_dict
         variant['vep_info'] = vep_dict
         variant['genotypes'] = genotype_dict
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+variant.py
+
+A variant record that parses the vcf line on demand.
+
+format_variant builds all the derived information (info_dict, vep_info,
+genotypes and so on) for every line. Many programs only look at a couple of
+the columns, for example when filtering on position and quality. A
+LazyVariant behaves like the dictionary from format_variant but the derived
+fields are built the first time they are accessed, and then kept.
+
+    variant = LazyVariant(line, header_parser)
+    variant['POS']                          # only splits the line
+    variant['info_dict']['AF']              # parses the INFO column
+    variant['genotypes']['proband']         # builds the Genotype objects
+"""
+
+import sys
+
+if sys.version_info < (3, 3):
+    from collections import MutableMapping
+else:
+    from collections.abc import MutableMapping
+
+from vcf_parser.utils import (build_info_dict, build_vep_annotation,
+    build_compounds_dict, build_rank_score_dict, build_models_dict,
+    build_genotype_dict, check_info_dict, split_variant_line)
+
+
+def _vep_info(variant):
+    """Build the vep annotations if there is a CSQ field"""
+    info_dict = variant['info_dict']
+    if 'CSQ' in info_dict:
+        return build_vep_annotation(
+            info_dict['CSQ'],
+            variant['REF'],
+            variant['ALT'].split(','),
+            variant.header_parser.vep_columns
+        )
+    return {}
+
+def _info_annotation(info_key, builder):
+    """Return a function that builds the dictionary for a INFO key"""
+    def build(variant):
+        info_dict = variant['info_dict']
+        if info_key in info_dict:
+            return builder(info_dict[info_key])
+        return {}
+    return build
+
+def _variant_id(variant):
+    """Build the variant id from the position and the first alternative"""
+    return '_'.join([
+        variant['CHROM'],
+        variant['POS'],
+        variant['REF'],
+        variant['ALT'].split(',')[0]
+    ])
+
+# The derived fields in the same order as format_variant adds them, with the
+# functions that builds them
+DERIVED_FIELDS = [
+    ('vep_info', _vep_info),
+    ('genetic_models', _info_annotation('GeneticModels', build_models_dict)),
+    ('genotypes', lambda variant: build_genotype_dict(
+        variant, variant.header_parser.individuals, variant.format_fields,
+        variant.genotype_cache)),
+    ('compound_variants', _info_annotation('Compounds', build_compounds_dict)),
+    ('rank_scores', _info_annotation('RankScore', build_rank_score_dict)),
+    ('individual_scores', _info_annotation(
+        'IndividualRankScore', build_rank_score_dict)),
+    ('info_dict', lambda variant: build_info_dict(
+        variant.get('INFO', ''), variant.info_fields)),
+    ('variant_id', _variant_id),
+]
+BUILDERS = dict(DERIVED_FIELDS)
+
+
+class LazyVariant(MutableMapping):
+    """
+    A variant that builds the derived fields when they are first used.
+
+    The columns of the vcf line are available directly, the derived fields
+    (info_dict, vep_info, genetic_models, compound_variants, rank_scores,
+    individual_scores, genotypes and variant_id) are built on first access.
+    All keys behaves like in the dictionary that format_variant returns, so
+    dict(variant) gives the same result as format_variant.
+    
+    info_fields, format_fields and genotype_cache works in the same way as 
+    for format_variant.
+    
+    modified is set when one of the columns is changed, a VCFWriter writes
+    the raw line of variants that are not modified.
+    """
+    def __init__(self, line, header_parser, check_info=False, info_fields=None,
+                 format_fields=None, genotype_cache=None):
+        super(LazyVariant, self).__init__()
+        self.header_parser = header_parser
+        self.raw_line = line
+        self.info_fields = info_fields
+        self.format_fields = format_fields
+        self.genotype_cache = genotype_cache
+        self.modified = False
+
+        variant_line = split_variant_line(line, header_parser)
+        self._fields = dict(zip(header_parser.header, variant_line))
+        # Derived fields that has been removed by the user
+        self._deleted = set()
+
+        if check_info:
+            check_info_dict(self['info_dict'], header_parser,
+                            self['ALT'].split(','), line)
+
+    def __getitem__(self, key):
+        try:
+            return self._fields[key]
+        except KeyError:
+            if key in BUILDERS and key not in self._deleted:
+                value = BUILDERS[key](self)
+                self._fields[key] = value
+                return value
+            raise
+
+    def __setitem__(self, key, value):
+        if key not in BUILDERS:
+            self.modified = True
+        self._deleted.discard(key)
+        self._fields[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            del self._fields[key]
+            if key in BUILDERS:
+                self._deleted.add(key)
+            else:
+                self.modified = True
+        elif key in BUILDERS and key not in self._deleted:
+            self._deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._fields or (
+            key in BUILDERS and key not in self._deleted)
+
+    def __iter__(self):
+        for key in self._fields:
+            yield key
+        for key, builder in DERIVED_FIELDS:
+            if key not in self._fields and key not in self._deleted:
+                yield key
+
+    def __len__(self):
+        return len(self._fields) + len([
+            key for key, builder in DERIVED_FIELDS
+            if key not in self._fields and key not in self._deleted
+        ])
+
+    def is_parsed(self, key):
+        """Check if a derived field has been built"""
+        return key in self._fields
+
+    def __repr__(self):
+        return "LazyVariant({0})".format(self.raw_line)
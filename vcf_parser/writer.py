@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+writer.py
+
+Write variants to a vcf.
+
+Building a line with '\\t'.join() for every variant and writing each line
+with its own call is slow when most variants are written as they were read.
+A VCFWriter writes the raw line of LazyVariants that has not been modified
+and only builds the line from the columns for other variants. The lines are
+collected in a buffer that is written in large chunks.
+
+If the path of the outfile ends with '.gz' the vcf is compressed with BGZF
+on a pool of threads and a tabix index (.tbi) is built while the variants
+are written, so the file can be queried for regions without running bgzip
+and tabix on it.
+
+    parser = VCFParser(infile='infile.vcf', lazy=True)
+    with VCFWriter('outfile.vcf', parser.metadata) as writer:
+        writer.write_header()
+        for variant in parser:
+            if variant['FILTER'] == 'PASS':
+                writer.write(variant)
+"""
+
+import io
+
+from logging import getLogger
+
+from vcf_parser.bgzf import BgzfWriter
+from vcf_parser.tabix import TabixIndexBuilder
+
+# The number of characters that are collected before they are written
+WRITE_BUFFER_SIZE = 2**20
+
+
+def build_variant_line(variant, header):
+    """
+    Build the vcf line of a variant from its columns.
+
+    Arguments:
+        variant (dict): A variant dictionary
+        header (list): The header columns
+
+    Returns:
+        line (str): The variant line without newline
+    """
+    return '\t'.join([variant[head] for head in header])
+
+
+class VCFWriter(object):
+    """
+    Write variants to a vcf with a buffer.
+
+    Arguments:
+        outfile (str or file): A path or a file opened for writing text
+        header_parser (HeaderParser): The header of the vcf
+        buffer_size (int): The number of characters that are collected
+                           before they are written
+        threads (int): Number of threads used to compress a BGZF file
+        index (bool): If a .tbi should be written for a BGZF file
+    """
+    def __init__(self, outfile, header_parser, buffer_size=WRITE_BUFFER_SIZE,
+                 threads=None, index=True):
+        super(VCFWriter, self).__init__()
+        self.logger = getLogger(__name__)
+        self.header_parser = header_parser
+        self.header = header_parser.header
+        self.buffer_size = buffer_size
+        self.close_file = False
+        # Only set when the vcf is compressed with BGZF
+        self.bgzf = None
+        self.index_builder = None
+        self.index_path = None
+        if hasattr(outfile, 'write'):
+            self.outfile = outfile
+        elif outfile.endswith('.gz'):
+            self.logger.info("Writing vcf compressed with BGZF to {0}".format(
+                outfile))
+            self.bgzf = self.outfile = BgzfWriter(outfile, threads=threads)
+            self.close_file = True
+            if index:
+                self.index_builder = TabixIndexBuilder()
+                self.index_path = outfile + '.tbi'
+        else:
+            self.logger.info("Writing vcf to {0}".format(outfile))
+            self.outfile = io.open(outfile, 'w', encoding='utf-8')
+            self.close_file = True
+        self._buffer = []
+        self._buffered = 0
+        # The number of uncompressed bytes written to a BGZF file
+        self._offset = 0
+        self.number_of_variants = 0
+        self.number_of_raw_lines = 0
+
+    def write_header(self, header_lines=None):
+        """
+        Write the header lines.
+
+        Arguments:
+            header_lines (list): The lines to write, default is the lines
+                                 from header_parser.print_header()
+        """
+        if header_lines is None:
+            header_lines = self.header_parser.print_header()
+        for line in header_lines:
+            self.write_line(line)
+
+    def variant_line(self, variant):
+        """
+        Return the vcf line of a variant.
+
+        The raw line is used for LazyVariants that are not modified and have
+        all columns of the header.
+
+        Arguments:
+            variant (dict): A variant dictionary or a LazyVariant
+
+        Returns:
+            line (str): The variant line without newline
+        """
+        raw_line = getattr(variant, 'raw_line', None)
+        if raw_line is not None and not variant.modified:
+            header_parser = variant.header_parser
+            if header_parser.columns is None and (
+                    header_parser.header is self.header or
+                    header_parser.header == self.header):
+                self.number_of_raw_lines += 1
+                return raw_line.rstrip()
+        return build_variant_line(variant, self.header)
+
+    def write(self, variant):
+        """
+        Write a variant.
+
+        Arguments:
+            variant (dict): A variant dictionary or a LazyVariant
+        """
+        self._write_variant(self.variant_line(variant), variant['CHROM'],
+                            variant['POS'], variant['REF'])
+
+    def write_variant_line(self, line):
+        """
+        Write a variant line as it is.
+
+        Arguments:
+            line (str): A variant line without newline
+        """
+        if self.index_builder is None:
+            self._write_variant(line)
+        else:
+            chrom, pos, _, ref = line.split('\t', 4)[:4]
+            self._write_variant(line, chrom, pos, ref)
+
+    def _write_variant(self, line, chrom=None, pos=None, ref=None):
+        """Write a variant line, chrom, pos and ref are used for the index"""
+        if self.index_builder is None:
+            self.write_line(line)
+        else:
+            data = (line + '\n').encode('utf-8')
+            beg = int(pos) - 1
+            self.index_builder.add(chrom, beg, beg + len(ref), self._offset,
+                                   self._offset + len(data))
+            self._append(data)
+        self.number_of_variants += 1
+
+    def write_line(self, line):
+        """
+        Write a line, a newline is added.
+
+        Arguments:
+            line (str): The line without newline
+        """
+        if self.bgzf is None:
+            self._append(line)
+            self._buffered += 1
+        else:
+            self._append((line + '\n').encode('utf-8'))
+
+    def _append(self, data):
+        """Add a line or encoded data to the buffer"""
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self._offset += len(data)
+        if self._buffered >= self.buffer_size:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        """Write the buffered lines to the file"""
+        if not self._buffer:
+            return
+        if self.bgzf is None:
+            self._buffer.append('')
+            self.outfile.write('\n'.join(self._buffer))
+        else:
+            self.bgzf.write(b''.join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    def flush(self):
+        """
+        Write the buffered lines to the file.
+
+        A BGZF file is only written in complete blocks, the last block is
+        written when the file is closed.
+        """
+        self._write_buffer()
+        if self.bgzf is None:
+            self.outfile.flush()
+
+    def close(self):
+        """
+        Write the buffered lines and close the file if it was opened here.
+
+        The index of a BGZF file is written when the file is closed.
+        """
+        self.flush()
+        if self.close_file:
+            self.outfile.close()
+        if self.index_builder is not None and self.index_builder.valid:
+            self.index_builder.write(self.index_path, self.bgzf.virtual_offset)
+            self.index_builder = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "VCFWriter(outfile={0})".format(self.outfile)